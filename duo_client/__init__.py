@@ -1,10 +1,14 @@
 from .accounts import Accounts
 from .admin import Admin
 from .auth import Auth
+from .async_client import AsyncAdmin, AsyncAuth, AsyncClient
 from .client import __version__
 
 __all__ = [
     'Accounts',
     'Admin',
+    'AsyncAdmin',
+    'AsyncAuth',
+    'AsyncClient',
     'Auth',
 ]
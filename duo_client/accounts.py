@@ -3,10 +3,44 @@ Duo Security Accounts API reference client implementation.
 
 <http://www.duosecurity.com/docs/accountsapi>
 """
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
 from . import client
+from .util import write_json_atomic
+
+DEFAULT_CHILD_HOST_TTL = 3600
+DEFAULT_CHILD_HOST_MISS_TTL = 60
+
+# Resolvers shared by every AccountAdmin of an integration, by
+# (ikey, skey, host).
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+# Client arguments a shared resolver's Accounts client is built with. The
+# others, e.g. rate_limiter or connection_pool, belong to the caller's own
+# client and host.
+_RESOLVER_CLIENT_KWARGS = (
+    'ca_certs',
+    'disable_ca_pinning',
+    'port',
+    'timeout',
+    'user_agent',
+)
+
+
+def _shared_resolver(accounts_api):
+    return _resolvers.get((getattr(accounts_api, 'ikey', None),
+                           getattr(accounts_api, 'skey', None),
+                           getattr(accounts_api, 'host', None)))
+
 
 class Accounts(client.Client):
     child_map = {}
+    _child_map_lock = threading.Lock()
 
     def get_child_accounts(self):
         """
@@ -17,11 +51,15 @@ class Accounts(client.Client):
                                       '/accounts/v1/account/list',
                                       params)
         if response and isinstance(response, list):
-            for account in response:
-                account_id = account.get('account_id', None)
-                api_hostname = account.get('api_hostname', None)
-                if account_id and api_hostname:
-                    Accounts.child_map[account_id] = api_hostname
+            with Accounts._child_map_lock:
+                for account in response:
+                    account_id = account.get('account_id', None)
+                    api_hostname = account.get('api_hostname', None)
+                    if account_id and api_hostname:
+                        Accounts.child_map[account_id] = api_hostname
+        resolver = _shared_resolver(self)
+        if resolver is not None and isinstance(response, list):
+            resolver.update(response, complete=True)
         return response
 
     def create_account(self, name):
@@ -34,6 +72,9 @@ class Accounts(client.Client):
         response = self.json_api_call('POST',
                                       '/accounts/v1/account/create',
                                       params)
+        resolver = _shared_resolver(self)
+        if resolver is not None and isinstance(response, dict):
+            resolver.update([response])
         return response
 
     def delete_account(self, account_id):
@@ -46,4 +87,197 @@ class Accounts(client.Client):
         response = self.json_api_call('POST',
                                       '/accounts/v1/account/delete',
                                       params)
+        resolver = _shared_resolver(self)
+        if resolver is not None:
+            resolver.discard(account_id)
         return response
+
+
+class ChildHostResolver(object):
+    """
+    Thread-safe map of child account id to API hostname, filled from
+    Accounts.get_child_accounts() and kept for a TTL.
+
+    Hostnames already in Accounts.child_map, from an earlier call to
+    get_child_accounts(), are used without listing again. Concurrent
+    lookups share a single listing: while one thread lists
+    the child accounts, others needing it wait for its result. An id not
+    found is remembered as missing for miss_ttl, and a miss shortly after
+    a listing is answered without listing again, so unknown ids cannot
+    cause a listing per lookup.
+    """
+
+    def __init__(self, accounts_api, ttl=DEFAULT_CHILD_HOST_TTL,
+                 miss_ttl=DEFAULT_CHILD_HOST_MISS_TTL, path=None):
+        """
+        accounts_api - Accounts client of the parent account.
+        ttl - Seconds a hostname is used for before listing again.
+        miss_ttl - Seconds an id not found, or a listing, is trusted for
+            before an unknown id lists again.
+        path - JSON file to keep the map in between runs and processes,
+            or None. Written atomically after each listing.
+        """
+        self.accounts_api = accounts_api
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.path = path
+        self.listings = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._hosts = {}
+        self._listed = None
+        self._misses = {}
+        self._listing = None
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+                self._listed = state['listed']
+                self._hosts = dict(
+                    (account_id, tuple(entry))
+                    for (account_id, entry) in state['hosts'].items())
+            except (ValueError, KeyError, TypeError):
+                # Only a cache: start over.
+                pass
+
+    def hosts(self):
+        """
+        Return a dict of every known child account id to its hostname.
+        """
+        with self._lock:
+            return dict((account_id, entry[0])
+                        for (account_id, entry) in self._hosts.items())
+
+    def resolve(self, account_id):
+        """
+        Return the API hostname of child account account_id, or None if
+        it is not a child account. Lists the child accounts only if the
+        hostname is unknown or older than ttl. If listing fails, a known
+        hostname is returned however old; otherwise the error is raised.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._hosts.get(account_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                return entry[0]
+            if entry is None:
+                # A caller may have listed the child accounts itself.
+                host = Accounts.child_map.get(account_id)
+                if host is not None:
+                    self._hosts[account_id] = (host, now)
+                    return host
+                missed = self._misses.get(account_id)
+                if missed is not None and now - missed < self.miss_ttl:
+                    return None
+                if self._listed is not None and now - self._listed < self.miss_ttl:
+                    self._misses[account_id] = now
+                    return None
+        try:
+            self.refresh()
+        except RuntimeError:
+            if entry is None:
+                raise
+            return entry[0]
+        with self._lock:
+            entry = self._hosts.get(account_id)
+            if entry is None:
+                self._misses[account_id] = time.time()
+                return None
+            return entry[0]
+
+    def refresh(self):
+        """
+        List the child accounts and replace the map with them. A call
+        while another thread is listing waits for and shares its result.
+        Returns the dict of account id to hostname.
+        """
+        with self._lock:
+            listing = self._listing
+            leader = listing is None
+            if leader:
+                listing = self._listing = concurrent.futures.Future()
+        if not leader:
+            return listing.result()
+        try:
+            self.listings += 1
+            accounts = self.accounts_api.get_child_accounts() or []
+            if _shared_resolver(self.accounts_api) is self:
+                # get_child_accounts() updated this shared resolver.
+                hosts = self.hosts()
+            else:
+                hosts = self.update(accounts, complete=True)
+        except BaseException as e:
+            listing.set_exception(e)
+            raise
+        else:
+            listing.set_result(hosts)
+            return hosts
+        finally:
+            with self._lock:
+                self._listing = None
+
+    def update(self, accounts, complete=False):
+        """
+        Record the hostnames of accounts, dicts with 'account_id' and
+        'api_hostname' keys as returned by the Accounts API.
+
+        complete - accounts is every child account: forget the others.
+
+        Returns the dict of account id to hostname.
+        """
+        now = time.time()
+        with self._lock:
+            if complete:
+                self._hosts = {}
+                self._misses = {}
+                self._listed = now
+            for account in accounts:
+                account_id = account.get('account_id')
+                api_hostname = account.get('api_hostname')
+                if account_id and api_hostname:
+                    self._hosts[account_id] = (api_hostname, now)
+                    self._misses.pop(account_id, None)
+            hosts = dict((account_id, entry[0])
+                         for (account_id, entry) in self._hosts.items())
+            state = self._state()
+        self._save(state)
+        return hosts
+
+    def discard(self, account_id):
+        """
+        Forget account_id, e.g. after it was deleted.
+        """
+        with self._lock:
+            self._hosts.pop(account_id, None)
+            state = self._state()
+        self._save(state)
+
+    def _state(self):
+        return {'listed': self._listed, 'hosts': dict(self._hosts)}
+
+    def _save(self, state):
+        if self.path is not None:
+            with self._save_lock:
+                write_json_atomic(self.path, state)
+
+
+def get_child_host_resolver(ikey, skey, host, **kwargs):
+    """
+    Return the ChildHostResolver shared by every AccountAdmin of the
+    Accounts API integration ikey with skey at host, creating it the
+    first time.
+
+    kwargs - Client arguments. Only those in _RESOLVER_CLIENT_KWARGS are
+        used, by the first caller, to build the resolver's Accounts
+        client; the rest are ignored.
+    """
+    key = (ikey, skey, host)
+    with _resolvers_lock:
+        resolver = _resolvers.get(key)
+        if resolver is None:
+            client_kwargs = dict(
+                (name, kwargs[name]) for name in _RESOLVER_CLIENT_KWARGS
+                if name in kwargs)
+            resolver = _resolvers[key] = ChildHostResolver(
+                Accounts(ikey=ikey, skey=skey, host=host, **client_kwargs))
+    return resolver
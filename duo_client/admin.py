@@ -181,7 +181,10 @@ import warnings
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 
-from . import Accounts, client
+from . import client
+from .accounts import get_child_host_resolver
+from .cache import MISS
+from .logs.sources import get_log_source
 
 USER_STATUS_ACTIVE = "active"
 USER_STATUS_BYPASS = "bypass"
@@ -216,6 +219,16 @@ VALID_ACTIVITY_REQUEST_PARAMS = ["mintime", "maxtime", "limit", "sort", "next_of
 class Admin(client.Client):
     account_id = None
 
+    def __init__(self, *args, entity_cache=None, **kwargs):
+        """
+        entity_cache - A duo_client.cache.EntityCache answering repeated
+                       lookups of the same entity, or None.
+
+        See the Client base class for other parameters.
+        """
+        super(Admin, self).__init__(*args, **kwargs)
+        self.entity_cache = entity_cache
+
     def api_call(self, method, path, params):
         if self.account_id is not None:
             params['account_id'] = self.account_id
@@ -226,6 +239,42 @@ class Admin(client.Client):
             params,
         )
 
+    def json_api_call(self, method, path, params):
+        cache = self.entity_cache
+        if cache is None:
+            return super(Admin, self).json_api_call(method, path, params)
+        (key, response) = cache.lookup(self, method, path, params)
+        if response is not MISS:
+            return response
+        try:
+            response = super(Admin, self).json_api_call(method, path, params)
+            return response
+        finally:
+            cache.finish(method, path, key, response)
+
+    def _collect(self, iterator):
+        """
+        Return the objects of iterator as a list. AsyncAdmin overrides
+        this to collect an async iterator.
+        """
+        return list(iterator)
+
+    def _stamp_log(self, response, log_type, records_key=None):
+        """
+        Stamp the events of response, or of response[records_key], with
+        the eventtype and host of log_type, and return response.
+        """
+        events = response if records_key is None else response[records_key]
+        self.get_log_source(log_type).stamp(events)
+        return response
+
+    @staticmethod
+    def _check_authentication_log_filters(filters):
+        for k in filters:
+            if k not in VALID_AUTHLOG_REQUEST_PARAMS or k in (
+                    'mintime', 'maxtime', 'api_version'):
+                raise ValueError(
+                    'Invalid authentication log parameter: {}'.format(k))
 
     @classmethod
     def _canonicalize_ip_whitelist(klass, ip_whitelist):
@@ -283,7 +332,7 @@ class Admin(client.Client):
         iterator = self.get_administrative_units_iterator(
             admin_id, group_id, integration_key)
 
-        return list(iterator)
+        return self._collect(iterator)
 
     def get_administrative_units_iterator(self, admin_id=None, group_id=None,
                                           integration_key=None, ):
@@ -347,10 +396,7 @@ class Admin(client.Client):
             '/admin/v1/logs/administrator',
             params,
         )
-        for row in response:
-            row['eventtype'] = 'administrator'
-            row['host'] = self.host
-        return response
+        return self._stamp_log(response, 'administrator')
 
     def get_offline_log(self,
                         mintime=0):
@@ -523,16 +569,43 @@ class Admin(client.Client):
             '/admin/v{}/logs/authentication'.format(api_version),
             params,
         )
+        return self._stamp_log(response, 'authentication',
+                               None if api_version == 1 else 'authlogs')
 
-        if api_version == 1:
-            for row in response:
-                row['eventtype'] = 'authentication'
-                row['host'] = self.host
-        else:
-            for row in response['authlogs']:
-                row['eventtype'] = 'authentication'
-                row['host'] = self.host
-        return response
+    def get_authentication_log_iterator(self, mintime, maxtime,
+                                        prefetch=None, **filters):
+        """
+        Provides a generator which produces v2 authentication log events
+        between mintime and maxtime, following metadata.next_offset across
+        pages. Only prefetch pages beyond the current one are held in
+        memory at a time.
+
+        mintime - Unix timestamp in ms; fetch records >= mintime
+        maxtime - Unix timestamp in ms; fetch records <= maxtime
+        prefetch - Number of pages to fetch in the background ahead of
+                   the caller. Defaults to the client's paging_prefetch.
+        filters - Any other v2 get_authentication_log parameters, such as
+                  limit, sort, users, applications or results. next_offset
+                  resumes from the cursor of an earlier response.
+
+        Returns: A generator which produces authentication log events, in
+        the format of the v2 get_authentication_log "authlogs".
+
+        Raises ValueError on an unknown filter, RuntimeError on error.
+        """
+        self._check_authentication_log_filters(filters)
+        return self.get_log_source('authentication').iter_events(
+            int(mintime), int(maxtime), prefetch=prefetch, **filters)
+
+    def get_log_source(self, log_type):
+        """
+        Returns the duo_client.logs.LogSource of log_type, one of
+        'authentication', 'activity', 'telephony', 'trust_monitor',
+        'administrator' or 'offline_enrollment'.
+
+        Raises ValueError for an unknown log type.
+        """
+        return get_log_source(self, log_type)
 
     def get_activity_logs(self, **kwargs):
         """
@@ -623,10 +696,7 @@ class Admin(client.Client):
             '/admin/v2/logs/activity',
             params,
         )
-        for row in response['items']:
-            row['eventtype'] = 'activity'
-            row['host'] = self.host
-        return response
+        return self._stamp_log(response, 'activity', 'items')
 
     def get_telephony_log(self, mintime: int = 0, api_version: int = 1, maxtime: Optional[int] = 0, 
                               limit: Optional[int] = 100, sort: Optional[str] = 'desc', 
@@ -715,17 +785,8 @@ class Admin(client.Client):
             if filters:
                 params["filters"] = filters
         response = self.json_api_call("GET", '/admin/v{}/logs/telephony'.format(api_version), params)
-
-        if api_version == 1:
-            for row in response:
-                row["eventtype"] = "telephony"
-                row["host"] = self.host
-        else:
-            for row in response["items"]:
-                row["eventtype"] = "telephony"
-                row["host"] = self.host
-        
-        return response
+        return self._stamp_log(response, "telephony",
+                               None if api_version == 1 else "items")
     
     def get_users_iterator(self):
         """
@@ -750,7 +811,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', '/admin/v1/users', {'limit': limit, 'offset': offset})
 
-        return list(self.get_users_iterator())
+        return self._collect(self.get_users_iterator())
 
     def get_user_by_id(self, user_id):
         """
@@ -1079,7 +1140,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_bypass_codes_iterator(user_id))
+        return self._collect(self.get_user_bypass_codes_iterator(user_id))
 
     def get_user_phones_iterator(self, user_id):
         """
@@ -1114,7 +1175,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_phones_iterator(user_id))
+        return self._collect(self.get_user_phones_iterator(user_id))
 
     def add_user_phone(self, user_id, phone_id):
         """
@@ -1184,7 +1245,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_tokens_iterator(user_id))
+        return self._collect(self.get_user_tokens_iterator(user_id))
 
     def add_user_token(self, user_id, token_id):
         """
@@ -1257,7 +1318,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_u2ftokens_iterator(user_id))
+        return self._collect(self.get_user_u2ftokens_iterator(user_id))
 
     def get_user_webauthncredentials_iterator(self, user_id):
         """ Returns an iterator of webauthncredentials associated with a user.
@@ -1297,7 +1358,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_webauthncredentials_iterator(user_id))
+        return self._collect(self.get_user_webauthncredentials_iterator(user_id))
 
     def get_user_groups_iterator(self, user_id):
         """
@@ -1332,7 +1393,7 @@ class Admin(client.Client):
             return self.json_api_call(
                 'GET', path, {'limit': limit, 'offset': offset})
 
-        return list(self.get_user_groups_iterator(user_id))
+        return self._collect(self.get_user_groups_iterator(user_id))
 
     def add_user_group(self, user_id, group_id):
         """
@@ -1404,7 +1465,7 @@ class Admin(client.Client):
             return self.json_api_call('GET', '/admin/v1/endpoints',
                                       {'limit': limit, 'offset': offset})
 
-        return list(self.get_endpoints_iterator())
+        return self._collect(self.get_endpoints_iterator())
 
     def get_phones_generator(self):
         """
@@ -1436,7 +1497,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset}
             )
 
-        return list(self.get_phones_generator())
+        return self._collect(self.get_phones_generator())
 
     def get_phone_by_id(self, phone_id):
         """
@@ -1700,7 +1761,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset}
             )
 
-        return list(self.get_desktoptokens_generator())
+        return self._collect(self.get_desktoptokens_generator())
 
     def get_desktoptoken_by_id(self, desktoptoken_id):
         """
@@ -1832,7 +1893,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset}
             )
 
-        return list(self.get_tokens_generator())
+        return self._collect(self.get_tokens_generator())
 
     def get_token_by_id(self, token_id):
         """
@@ -2401,7 +2462,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset}
             )
 
-        return list(self.get_groups_generator())
+        return self._collect(self.get_groups_generator())
 
     def get_group(self, group_id, api_version=1):
         """
@@ -2447,7 +2508,7 @@ class Admin(client.Client):
                     'limit': limit,
                     'offset': offset,
                 })
-        return list(self.get_group_users_iterator(group_id))
+        return self._collect(self.get_group_users_iterator(group_id))
 
     def get_group_users_iterator(self, group_id):
         """
@@ -2595,7 +2656,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset},
             )
 
-        return list(self.get_integrations_generator())
+        return self._collect(self.get_integrations_generator())
 
     def get_integration(self, integration_key):
         """
@@ -2748,7 +2809,7 @@ class Admin(client.Client):
         if limit:
             return self.json_api_call('GET', '/admin/v1/registered_devices', {'limit': limit, 'offset': offset})
 
-        return list(self.get_registered_devices_generator())
+        return self._collect(self.get_registered_devices_generator())
 
     def get_registered_device_by_id(self, registered_device_id):
         """
@@ -2960,7 +3021,7 @@ class Admin(client.Client):
 
         iterator = self.get_admins_iterator()
 
-        return list(iterator)
+        return self._collect(iterator)
 
     def get_admins_iterator(self):
         """
@@ -3156,7 +3217,7 @@ class Admin(client.Client):
         iterator = self.json_paging_api_call(
             'GET', '/admin/v1/admins/password_mgmt', {})
 
-        return list(iterator)
+        return self._collect(iterator)
 
     def get_external_password_mgmt_status_for_admin(self, admin_id):
         """
@@ -3255,7 +3316,7 @@ class Admin(client.Client):
                                       {'limit': limit, 'offset': offset})
 
         iterator = self.get_u2ftokens_iterator()
-        return list(iterator)
+        return self._collect(iterator)
 
     def get_u2ftokens_iterator(self):
         """
@@ -3289,7 +3350,7 @@ class Admin(client.Client):
                                       {'limit': limit, 'offset': offset})
 
         iterator = self.get_webauthncredentials_iterator()
-        return list(iterator)
+        return self._collect(iterator)
 
     def get_webauthncredentials_iterator(self):
         """
@@ -3403,7 +3464,7 @@ class Admin(client.Client):
                 {'limit': limit, 'offset': offset}
             )
 
-        return list(self.get_bypass_codes_generator())
+        return self._collect(self.get_bypass_codes_generator())
 
     def delete_bypass_code_by_id(self, bypass_code_id):
         """ Deletes a bypass code. If the bypass code is already
@@ -3578,7 +3639,7 @@ class Admin(client.Client):
                 "/admin/v2/policies",
                 {"limit": limit, "offset": offset},
             )
-        return list(self.get_policies_v2_iterator())
+        return self._collect(self.get_policies_v2_iterator())
 
     def delete_policy_v2(self, policy_key):
         """
@@ -3808,30 +3869,36 @@ class Admin(client.Client):
 class AccountAdmin(Admin):
     """AccountAdmin manages a child account using an Accounts API integration."""
 
-    def __init__(self, account_id, child_api_host=None, **kwargs):
+    def __init__(self, account_id, child_api_host=None,
+                 child_host_resolver=None, **kwargs):
         """Initializes an AccountAdmin for administering a child account.
            account_id is the account id of the child account.
            child_api_host is the api hostname of the child account.
            If this is not provided, this value will be calculated for correct API usage.
+           child_host_resolver is the accounts.ChildHostResolver used to
+           calculate it. By default, one resolver is shared by every
+           AccountAdmin of the same Accounts API integration, so the child
+           accounts are listed once rather than per AccountAdmin.
            See the Client base class for other parameters.
           """
         if not child_api_host:
-            child_api_host =  Accounts.child_map.get(account_id, None)
-            if child_api_host is None:
-                child_api_host = kwargs.get('host')
-                try:
-                    child_api_host =  self.get_child_api_host(account_id, **kwargs)
-                except RuntimeError:
-                    pass
+            child_api_host = kwargs.get('host')
+            try:
+                child_api_host = self.get_child_api_host(
+                    account_id, child_host_resolver=child_host_resolver,
+                    **kwargs)
+            except RuntimeError:
+                pass
         kwargs['host'] = child_api_host
-        
+
         super(AccountAdmin, self).__init__(**kwargs)
         self.account_id = account_id
 
-    def get_child_api_host(self, account_id, **kwargs):
-        accounts_api = Accounts(**kwargs)
-        accounts_api.get_child_accounts()
-        return Accounts.child_map.get(account_id, kwargs['host'])
+    def get_child_api_host(self, account_id, child_host_resolver=None,
+                           **kwargs):
+        if child_host_resolver is None:
+            child_host_resolver = get_child_host_resolver(**kwargs)
+        return child_host_resolver.resolve(account_id) or kwargs['host']
 
     def get_edition(self):
         """
@@ -0,0 +1,589 @@
+"""
+asyncio clients for the Duo Web APIs.
+
+AsyncClient signs requests exactly like Client, but sends them over
+asyncio streams instead of blocking http.client connections, so one
+thread can keep many requests in flight:
+
+    async with AsyncAuth(ikey, skey, host) as auth_api:
+        results = await asyncio.gather(*[
+            auth_api.preauth(username=username) for username in usernames
+        ])
+
+    async for user in admin_api.get_users_iterator():
+        ...
+"""
+import asyncio
+import http.client
+import socket
+import ssl
+import time
+
+from . import admin, auth, client
+from .https_wrapper import (
+    InvalidCertificateException,
+    get_default_ssl_context,
+    get_ssl_context,
+    validate_certificate_hostname,
+)
+from .cache import MISS
+from .instrumentation import RequestTiming, set_last_timing
+
+# Errors that mean a reused keep-alive stream was closed by the server.
+# The request is retried once on a new stream if it is replayable():
+# idempotent, or failed before it was sent.
+_STALE_STREAM_ERRORS = (
+    asyncio.IncompleteReadError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class AsyncHTTPResponse(object):
+    """
+    The parts of http.client.HTTPResponse that the client and response
+    parsing rely on.
+    """
+
+    def __init__(self, version, status, reason, headers):
+        self.version = version
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.will_close = False
+        # When the status line and headers had been read (time.monotonic).
+        self.headers_received = None
+
+    def getheader(self, name, default=None):
+        name = name.lower()
+        for (key, value) in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def getheaders(self):
+        return list(self.headers)
+
+
+class AsyncClient(client.Client):
+    """
+    Client whose request methods are coroutines.
+
+    api_call(), json_api_call() must be awaited. json_paging_api_call()
+    and json_cursor_api_call() return async generators. Connections are
+    kept alive and reused; at most max_connections requests are in flight
+    at once. CONNECT proxies are not supported.
+    """
+
+    def __init__(self, *args, max_connections=10, **kwargs):
+        super(AsyncClient, self).__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self._loop = None
+        self._slots = None
+        self._idle_streams = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close all idle connections.
+        """
+        streams = self._idle_streams
+        self._idle_streams = []
+        for stream in streams:
+            self._close_stream(stream)
+        for (_, writer) in streams:
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+    async def api_call(
+        self,
+        method,
+        path,
+        params,
+        additional_headers=None,
+        sig_version=None,
+    ):
+        """
+        Call a Duo API method. Return a (response, data) tuple.
+
+        See Client.api_call.
+        """
+        if self.request_hooks:
+            return await self._timed_api_call(
+                method, path, params, additional_headers, sig_version)
+        (uri, body, headers) = self._prepare_request(
+            method, path, params, additional_headers, sig_version)
+
+        def resign():
+            # Retries carry a fresh Date header and signature.
+            return self._prepare_request(
+                method, path, params, additional_headers, sig_version)[2]
+        return await self._make_request(
+            method, uri, body, headers, resign=resign)
+
+    async def _timed_api_call(self, method, path, params,
+                              additional_headers, sig_version):
+        timing = RequestTiming(method, path, self.host)
+        self._call_hooks('on_request_start', timing)
+
+        def prepare():
+            start = time.monotonic()
+            request = self._prepare_request(
+                method, path, params, additional_headers, sig_version)
+            timing.sign_time += time.monotonic() - start
+            return request
+
+        def resign():
+            return prepare()[2]
+        try:
+            (uri, body, headers) = prepare()
+            (response, data) = await self._make_request(
+                method, uri, body, headers, resign=resign, timing=timing)
+        except Exception as e:
+            timing.error = e
+            raise
+        finally:
+            timing.total_time = time.monotonic() - timing.start
+            self._call_hooks('on_request_end', timing)
+        set_last_timing(response, timing)
+        return (response, data)
+
+    async def json_api_call(self, method, path, params):
+        """
+        Call a Duo API method which is expected to return a JSON body
+        with a 200 status. Return the response data structure or raise
+        RuntimeError.
+        """
+        (response, data) = await self.api_call(method, path, params)
+        return self.parse_json_response(response, data)
+
+    async def json_paging_api_call(self, method, path, params):
+        """
+        Call a Duo API method which is expected to return a JSON body
+        with a 200 status. Return an async generator that can be used to
+        get response data or raise a RuntimeError.
+        """
+        next_offset = 0
+
+        if 'limit' not in params and self.paging_limit:
+            params['limit'] = str(self.paging_limit)
+
+        while next_offset is not None:
+            params['offset'] = str(next_offset)
+            (response, data) = await self.api_call(method, path, params)
+            (objects, metadata) = self.parse_json_response_and_metadata(response, data)
+            next_offset = metadata.get('next_offset', None)
+            for obj in objects:
+                yield obj
+
+    async def json_cursor_api_call(self, method, path, params, get_records_func,
+                                   offset_param='offset',
+                                   get_next_offset_func=None):
+        """
+        Async generator version of Client.json_cursor_api_call.
+        """
+        next_offset = None
+
+        if 'limit' not in params and self.paging_limit:
+            params['limit'] = str(self.paging_limit)
+
+        while True:
+            if next_offset is not None:
+                params[offset_param] = client.format_cursor(next_offset)
+            (http_resp, http_resp_data) = await self.api_call(method, path, params)
+            (response, metadata) = self.parse_json_response_and_metadata(
+                http_resp,
+                http_resp_data,
+            )
+            for record in get_records_func(response):
+                yield record
+            next_offset = client.next_cursor(
+                response, metadata, get_next_offset_func)
+            if next_offset is None:
+                break
+
+    def _timeout_secs(self):
+        if self.timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            return None
+        return self.timeout
+
+    def _bind_loop(self):
+        """
+        Streams and semaphores belong to one event loop. Start afresh if
+        the client is used from a different loop than last time.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            for stream in self._idle_streams:
+                self._close_stream(stream)
+            self._idle_streams = []
+            self._slots = asyncio.Semaphore(self.max_connections)
+            self._loop = loop
+
+    def _ssl_context(self):
+        if self.ca_certs == 'HTTP':
+            return None
+        if self.disable_ca_pinning:
+            return get_default_ssl_context()
+        if self.ca_certs == 'DISABLE':
+            return ssl._create_unverified_context()  # noqa: DUO122, explicitly disabled for testing scenarios
+        return get_ssl_context(self.ca_certs)
+
+    async def _open_connection(self):
+        if self.proxy_type is not None:
+            raise NotImplementedError(
+                'proxy_type=%s is not supported by AsyncClient' % (self.proxy_type,))
+        context = self._ssl_context()
+        kwargs = {}
+        if context is not None:
+            kwargs['ssl'] = context
+            kwargs['server_hostname'] = self.host
+        (reader, writer) = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self._api_port(), **kwargs),
+            self._timeout_secs())
+        if (context is not None and not context.check_hostname and
+                context.verify_mode == ssl.CERT_REQUIRED):
+            cert = writer.get_extra_info('peercert')
+            if not validate_certificate_hostname(cert, self.host):
+                writer.close()
+                raise InvalidCertificateException(self.host, cert, 'hostname mismatch')
+        return (reader, writer)
+
+    async def _get_connection(self):
+        while self._idle_streams:
+            (reader, writer) = self._idle_streams.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            return ((reader, writer), True)
+        return (await self._open_connection(), False)
+
+    def _release_connection(self, stream):
+        if len(self._idle_streams) < self.max_connections:
+            self._idle_streams.append(stream)
+        else:
+            self._close_stream(stream)
+
+    def _close_stream(self, stream):
+        (_, writer) = stream
+        try:
+            writer.close()
+        except RuntimeError:
+            # The stream's event loop has already been closed.
+            pass
+
+    async def _make_request(self, method, uri, body, headers, resign=None,
+                            timing=None):
+        self._bind_loop()
+        policy = self.get_retry_policy()
+        start = time.monotonic()
+        attempt = 0
+        async with self._slots:
+            stream = None
+            reused = False
+            try:
+                while True:
+                    attempt += 1
+                    if timing is not None:
+                        timing.attempts = attempt
+                        waited = time.monotonic()
+                    if (await self._wait_for_rate_limiter() and
+                            resign is not None):
+                        headers = resign()
+                    if timing is not None:
+                        timing.rate_limit_wait += time.monotonic() - waited
+                    # Take a concurrency slot before opening a stream, so
+                    # waiting requests do not hold connections open.
+                    controller = self.concurrency_controller
+                    if controller is not None:
+                        started = await controller.acquire_async()
+                    status = None
+                    try:
+                        if timing is not None:
+                            timing.connect_time = None
+                        if stream is None:
+                            connecting = time.monotonic()
+                            (stream, reused) = await self._get_connection()
+                            if timing is not None and not reused:
+                                timing.connect_time = (
+                                    time.monotonic() - connecting)
+                        try:
+                            (response, data) = await asyncio.wait_for(
+                                self._attempt_single_request(
+                                    stream, method, uri, body, headers,
+                                    timing),
+                                self._timeout_secs())
+                            status = response.status
+                            error = None
+                        except (OSError, EOFError, asyncio.TimeoutError,
+                                http.client.HTTPException) as e:
+                            self._close_stream(stream)
+                            stream = None
+                            if (reused and
+                                    isinstance(e, _STALE_STREAM_ERRORS) and
+                                    client.replayable(method, e)):
+                                # The server closed an idle keep-alive
+                                # stream. Send the request again on another.
+                                attempt -= 1
+                                continue
+                            (response, data, error) = (None, None, e)
+                    finally:
+                        if controller is not None:
+                            controller.release(started, status)
+                    if response is not None and response.will_close:
+                        self._close_stream(stream)
+                        stream = None
+                    delay = policy.get_delay(method, attempt,
+                                             time.monotonic() - start,
+                                             response=response, error=error)
+                    if delay is None:
+                        if error is not None:
+                            raise error
+                        break
+                    await asyncio.sleep(delay)
+                    if timing is not None:
+                        timing.backoff_time += delay
+                    if resign is not None:
+                        headers = resign()
+            except BaseException:
+                if stream is not None:
+                    self._close_stream(stream)
+                raise
+            if stream is not None:
+                self._release_connection(stream)
+            return (response, data)
+
+    async def _wait_for_rate_limiter(self):
+        if self.rate_limiter is None:
+            return False
+        waited = False
+        while True:
+            wait = self.rate_limiter.take()
+            if not wait:
+                return waited
+            waited = True
+            await asyncio.sleep(wait)
+
+    async def _attempt_single_request(self, stream, method, uri, body, headers,
+                                      timing=None):
+        (reader, writer) = stream
+        request = self._encode_request(method, uri, body, headers)
+        start = time.monotonic()
+        try:
+            writer.write(request)
+            await writer.drain()
+        except OSError as e:
+            e.request_sent = False
+            raise
+        (response, data) = await self._read_response(reader, method)
+        if timing is not None:
+            timing.ttfb = response.headers_received - start
+            timing.read_time += time.monotonic() - response.headers_received
+            timing.status = response.status
+            if response.status == self._RATE_LIMITED_RESP_CODE:
+                timing.rate_limited += 1
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            timing.request_bytes += len(body or b'')
+            timing.response_bytes += len(data)
+        return (response, data)
+
+    def _encode_request(self, method, uri, body, headers):
+        if self._api_port() in (80, 443):
+            host_header = self.host
+        else:
+            host_header = '%s:%d' % (self.host, self._api_port())
+        lines = [
+            ('%s %s HTTP/1.1' % (method, uri)).encode('ascii'),
+            b'Host: ' + host_header.encode('idna'),
+            b'Accept-Encoding: identity',
+        ]
+        for (k, v) in headers.items():
+            lines.append(k + b': ' + v)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if body is None and method in ('POST', 'PUT', 'PATCH'):
+            body = b''
+        if body is not None:
+            lines.append(b'Content-Length: ' + str(len(body)).encode('ascii'))
+        return b'\r\n'.join(lines) + b'\r\n\r\n' + (body or b'')
+
+    async def _read_response(self, reader, method):
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError(
+                    'Remote end closed connection without response')
+            line = status_line.decode('iso-8859-1')
+            parts = line.rstrip('\r\n').split(' ', 2)
+            # Checked as http.client does, so both clients raise the same
+            # error for a malformed status line.
+            if (len(parts) < 2 or not parts[0].startswith('HTTP/') or
+                    len(parts[1]) != 3 or not parts[1].isdigit() or
+                    not 100 <= int(parts[1]) <= 999):
+                raise http.client.BadStatusLine(line)
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                (name, _, value) = line.decode('iso-8859-1').partition(':')
+                headers.append((name.strip(), value.strip()))
+            status = int(parts[1])
+            # Skip informational responses such as 100 Continue.
+            if not 100 <= status < 200:
+                break
+        response = AsyncHTTPResponse(
+            parts[0], status, parts[2] if len(parts) > 2 else '', headers)
+        response.headers_received = time.monotonic()
+
+        connection = (response.getheader('Connection') or '').lower()
+        will_close = 'close' in connection or (
+            response.version == 'HTTP/1.0' and 'keep-alive' not in connection)
+        transfer_encoding = (response.getheader('Transfer-Encoding') or '').lower()
+        content_length = response.getheader('Content-Length')
+        if method == 'HEAD' or status in (204, 304):
+            data = b''
+        elif 'chunked' in transfer_encoding:
+            data = await self._read_chunked(reader)
+        elif content_length is not None:
+            data = await reader.readexactly(int(content_length))
+        else:
+            data = await reader.read()
+            will_close = True
+        response.will_close = will_close
+        return (response, data)
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                raise asyncio.IncompleteReadError(b''.join(chunks), None)
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # Discard any trailers.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class AsyncAuth(auth.Auth, AsyncClient):
+    """
+    asyncio version of Auth. Every API method is a coroutine.
+    """
+
+    async def logo(self):
+        """
+        Retrieve the user-supplied logo.
+
+        Returns the logo on success, raises RuntimeError on failure.
+        """
+        response, data = await self.api_call('GET', '/auth/v2/logo', {})
+        content_type = response.getheader('Content-Type')
+        if content_type and content_type.startswith('image/'):
+            return data
+        else:
+            return self.parse_json_response(response, data)
+
+    async def auth_status(self, txid):
+        """
+        Longpoll for the status of an asynchronous authentication call.
+
+        See Auth.auth_status.
+        """
+        status = await self.json_api_call('GET',
+                                          '/auth/v2/auth_status',
+                                          {'txid': txid})
+        response = {
+            'waiting': (status.get('result') == 'waiting'),
+            'success': (status.get('result') == 'allow'),
+            'status': status.get('status', ''),
+            'status_msg': status.get('status_msg', ''),
+        }
+
+        if 'trusted_device_token' in status:
+            response['trusted_device_token'] = status['trusted_device_token']
+
+        return response
+
+
+class AsyncAdmin(admin.Admin, AsyncClient):
+    """
+    asyncio version of Admin.
+
+    Admin methods that return API results, such as get_user_by_id(),
+    get_users() or get_authentication_log(), return a coroutine. Iterator
+    and generator methods, such as get_users_iterator() or
+    get_authentication_log_iterator(), return async generators for use
+    with "async for".
+
+    LogSource objects from get_log_source() fetch pages synchronously, and
+    so are only usable with an Admin.
+    """
+
+    async def json_api_call(self, method, path, params):
+        """
+        Async version of Admin.json_api_call, answering entity lookups
+        from entity_cache.
+        """
+        call = AsyncClient.json_api_call
+        cache = self.entity_cache
+        if cache is None:
+            return await call(self, method, path, params)
+        (key, response) = cache.lookup(self, method, path, params)
+        if response is not MISS:
+            return response
+        try:
+            response = await call(self, method, path, params)
+            return response
+        finally:
+            cache.finish(method, path, key, response)
+
+    async def _collect(self, iterator):
+        return [obj async for obj in iterator]
+
+    async def _stamp_log(self, response, log_type, records_key=None):
+        return admin.Admin._stamp_log(
+            self, await response, log_type, records_key)
+
+    def get_authentication_log_iterator(self, mintime, maxtime,
+                                        prefetch=None, **filters):
+        """
+        Async generator version of Admin.get_authentication_log_iterator.
+        Pages are fetched one at a time, so prefetch is ignored.
+        """
+        self._check_authentication_log_filters(filters)
+        source = self.get_log_source('authentication')
+        next_offset = filters.pop('next_offset', None)
+        params = source.build_params(int(mintime), int(maxtime), **filters)
+        if next_offset is not None:
+            params[source.offset_param] = client.format_cursor(next_offset)
+        return self.json_cursor_api_call(
+            'GET', source.path, params,
+            lambda response: source.stamp(source.get_records(response)),
+            offset_param=source.offset_param,
+            get_next_offset_func=source.get_next_offset)
+
+    async def get_logo(self):
+        """
+        Returns current logo's PNG data or raises an error if none is set.
+
+        Raises RuntimeError on error.
+        """
+        response, data = await self.api_call('GET', '/admin/v1/logo', {})
+        content_type = response.getheader('Content-Type')
+        if content_type and content_type.startswith('image/'):
+            return data
+        else:
+            return self.parse_json_response(response, data)
@@ -0,0 +1,236 @@
+"""
+Read-through cache of Admin API entity lookups.
+
+Pass an EntityCache to an Admin client to answer repeated lookups of the
+same user, group, phone, integration or admin from memory:
+
+    cache = duo_client.cache.EntityCache(ttls={'integrations': 3600})
+    admin_api = duo_client.Admin(..., entity_cache=cache)
+
+Only lookups of a single entity by id, such as get_user_by_id(), are
+cached. Any other call the client makes that changes an entity type
+(update_user(), delete_group(), add_user_phone(), ...) drops every
+cached entity of the types in its path. Changes made by other clients,
+or in the Admin Panel, are seen once entries expire.
+
+Give the cache a duo_client.sqlite_cache.SQLiteCache as its backend to
+also keep entities on disk, shared with other processes and later runs.
+"""
+import collections
+import copy
+import json
+import re
+import threading
+import time
+
+from .client import canon_params, normalize_params
+
+DEFAULT_TTL = 300
+
+# Entity types cached by default, by the collection name in their path.
+DEFAULT_ENTITY_TYPES = (
+    'admins',
+    'administrative_units',
+    'endpoints',
+    'groups',
+    'integrations',
+    'phones',
+    'tokens',
+    'u2ftokens',
+    'users',
+    'webauthncredentials',
+)
+
+_ENTITY_PATH = re.compile(r'^/admin/v\d+/([a-z_]+)/[^/]+$')
+
+MISS = object()
+
+
+class EntityCache(object):
+    """
+    Bounded LRU cache of entity lookups with a TTL per entity type. Safe
+    to share between threads and clients.
+    """
+
+    def __init__(self, max_entries=10000, ttl=DEFAULT_TTL, ttls=None,
+                 backend=None):
+        """
+        max_entries - Number of entities to hold. The least recently used
+            are evicted beyond this.
+        ttl - Seconds to cache each of DEFAULT_ENTITY_TYPES for.
+        ttls - Dict of entity type (e.g. 'users') to seconds, overriding
+            ttl or adding types. A TTL of 0 or None disables caching
+            that type.
+        backend - A duo_client.sqlite_cache.SQLiteCache consulted on a
+            miss and written through, or None. Entries there expire
+            after the same TTLs.
+        """
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        self.max_entries = max_entries
+        self.ttls = dict((entity_type, ttl)
+                         for entity_type in DEFAULT_ENTITY_TYPES)
+        self.ttls.update(ttls or {})
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._generations = collections.Counter()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, client, path, params):
+        """
+        Return the cache key of a GET of path with params by client, or
+        None if it is not a cacheable entity lookup.
+        """
+        match = _ENTITY_PATH.match(path)
+        if match is None:
+            return None
+        entity_type = match.group(1)
+        if not self.ttls.get(entity_type):
+            return None
+        with self._lock:
+            generation = self._generations[entity_type]
+        return (entity_type, generation, client.host,
+                getattr(client, 'account_id', None), path,
+                canon_params(normalize_params(params)))
+
+    def lookup(self, client, method, path, params):
+        """
+        Start a call by client. Return (key, response): the cache key of
+        the call, or None if it is not cached, and the cached response,
+        or MISS if the call must be made. Pass key to finish() once it
+        has been.
+        """
+        if method != 'GET':
+            return (None, MISS)
+        key = self.key(client, path, params)
+        if key is None:
+            return (None, MISS)
+        return (key, self.get(key))
+
+    def finish(self, method, path, key, response=MISS):
+        """
+        Record the outcome of a call started with lookup(): cache its
+        response, or MISS if it failed, or drop the entities a call
+        other than a GET may have changed, whether or not it failed.
+        """
+        if method != 'GET':
+            self.invalidate_path(path)
+        elif key is not None and response is not MISS:
+            self.put(key, response)
+
+    def get(self, key):
+        """
+        Return a copy of the cached response for key, or MISS.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+        if self.backend is not None:
+            stored = self.backend.get_entry(
+                self._namespace(key), self._backend_key(key))
+            if stored is not None:
+                (value, _, expires) = stored
+                ttl = self.ttls[key[0]]
+                if expires is not None:
+                    ttl = min(ttl, expires - time.time())
+                self._put(key, value, now + ttl)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return MISS
+
+    def _namespace(self, key):
+        return 'entities/' + key[0]
+
+    def _backend_key(self, key):
+        # Generations only order changes within this process.
+        return json.dumps(key[2:], separators=(',', ':'))
+
+    def _put(self, key, value, expires):
+        with self._lock:
+            if self._generations[key[0]] != key[1]:
+                return False
+            self._entries[key] = (expires, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def put(self, key, value):
+        """
+        Cache a copy of the response for key, unless its entity type has
+        been invalidated since the key was made.
+        """
+        ttl = self.ttls[key[0]]
+        if not self._put(key, value, time.monotonic() + ttl):
+            return
+        if self.backend is not None:
+            (namespace, backend_key) = (
+                self._namespace(key), self._backend_key(key))
+            self.backend.put(namespace, backend_key, value, ttl)
+            with self._lock:
+                stale = self._generations[key[0]] != key[1]
+            if stale:
+                # Invalidated while being written.
+                self.backend.delete(namespace, backend_key)
+
+    def invalidate(self, *entity_types):
+        """
+        Drop every cached entity of entity_types.
+        """
+        with self._lock:
+            for entity_type in entity_types:
+                self._generations[entity_type] += 1
+            stale = [key for key in self._entries if key[0] in entity_types]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if self.backend is not None:
+            for entity_type in entity_types:
+                self.backend.delete(self._namespace((entity_type,)))
+
+    def invalidate_path(self, path):
+        """
+        Drop every cached entity of the types a call to path may change.
+        """
+        entity_types = [segment for segment in path.split('/')
+                        if segment in self.ttls]
+        if entity_types:
+            self.invalidate(*entity_types)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            for entity_type in self.ttls:
+                self.backend.delete(self._namespace((entity_type,)))
+
+    def stats(self):
+        """
+        Return a dict of the cache's hits, misses, evictions,
+        invalidations and size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
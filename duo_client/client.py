@@ -5,18 +5,23 @@ __version__ = '5.6.1'
 
 import base64
 import collections
+import concurrent.futures
 import datetime
 import email.utils
+import functools
 import hashlib
 import hmac
 import http.client
 import json
 import os
-import random
+import queue
 from time import sleep
 import socket
 import ssl
+import string
 import sys
+import threading
+import time
 import urllib.parse
 
 try:
@@ -33,11 +38,77 @@ except ImportError as e:
     pytz = None
     pytz_error = e
 
-from .https_wrapper import CertValidatingHTTPSConnection
+from .json_codec import get_json_codec
+from .instrumentation import RequestTiming, pop_last_timing, set_last_timing
+from .retry import RetryPolicy
+from .https_wrapper import (
+    CertValidatingHTTPSConnection,
+    TLSSessionCache,
+    get_default_ssl_context,
+)
+
+# Errors that mean a reused keep-alive connection was closed by the
+# server. The request is retried once on a fresh connection if it is
+# replayable(): idempotent, or failed before it was sent.
+_STALE_CONNECTION_ERRORS = (
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+# Methods that may be sent again after the server might have processed
+# them.
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+def replayable(method, error):
+    """
+    Return True if a request that failed with error on a reused
+    keep-alive connection may be sent again on a new one: it is
+    idempotent, or it failed before it was completely written, so the
+    server cannot have acted on it.
+    """
+    return (method in _IDEMPOTENT_METHODS or
+            not getattr(error, 'request_sent', True))
 
 DEFAULT_CA_CERTS = os.path.join(os.path.dirname(__file__), 'ca_certs.pem')
 
 
+# Characters urllib.parse.quote(value, '~') leaves unchanged.
+_UNRESERVED = string.ascii_letters + string.digits + '_.-~'
+_UNRESERVED_BYTES = _UNRESERVED.encode('ascii')
+
+# Longer values are unlikely to repeat, and are not worth keeping.
+_MAX_CACHED_QUOTE_LEN = 256
+
+
+@functools.lru_cache(maxsize=4096)
+def _quote_cached(value):
+    return urllib.parse.quote(value, '~')
+
+
+def quote_param(value):
+    """
+    Return urllib.parse.quote(value, '~') for a parameter key or value.
+
+    Strings that need no escaping are returned as they are, and the
+    escaping of other short strings is memoized, since the same keys and
+    values (limit, offset, usernames...) are signed over and over.
+    """
+    if isinstance(value, str):
+        if not value.rstrip(_UNRESERVED):
+            return value
+    elif isinstance(value, bytes):
+        if not value.rstrip(_UNRESERVED_BYTES):
+            return value.decode('ascii')
+    else:
+        return urllib.parse.quote(value, '~')
+    if len(value) > _MAX_CACHED_QUOTE_LEN:
+        return urllib.parse.quote(value, '~')
+    return _quote_cached(value)
+
+
 def canon_params(params):
     """
     Return a canonical string version of the given request parameters.
@@ -46,8 +117,8 @@ def canon_params(params):
     # http://tools.ietf.org/html/rfc5849#section-3.4.1.3.2
     args = []
     for (key, vals) in sorted(
-        (urllib.parse.quote(key, '~'), vals) for (key, vals) in list(params.items())):
-        for val in sorted(urllib.parse.quote(val, '~') for val in vals):
+        (quote_param(key), vals) for (key, vals) in params.items()):
+        for val in sorted(quote_param(val) for val in vals):
             args.append('%s=%s' % (key, val))
     return '&'.join(args)
 
@@ -165,21 +236,154 @@ def sign(ikey, skey, method, host, uri, date, sig_version, params, body=None,
     """
     Return basic authorization header line with a Duo Web API signature.
     """
-    canonical = canonicalize(method, host, uri, params, date, sig_version, body=body, additional_headers=additional_headers)
-    if isinstance(skey, str):
-        skey = skey.encode('utf-8')
-    if isinstance(canonical, str):
-        canonical = canonical.encode('utf-8')
+    return Signer(ikey, skey).sign(
+        method, host, uri, date, sig_version, params, body=body,
+        digestmod=digestmod, additional_headers=additional_headers)
+
+
+class Signer(object):
+    """
+    Signs requests for one integration.
+
+    Signing is on the path of every request, so the work that does not
+    depend on the request is done once: the secret key is encoded and
+    an HMAC is keyed with it once per digest (each signature copies the
+    keyed state), sig_timezone is resolved once, and the Date header is
+    only formatted again when the second changes.
+    """
+
+    def __init__(self, ikey, skey, sig_timezone='UTC'):
+        self.ikey = ikey
+        self.skey = skey
+        self.sig_timezone = sig_timezone
+        if isinstance(skey, str):
+            skey = skey.encode('utf-8')
+        self._skey_bytes = skey
+        self._keyed_hmacs = {}
+        self._tz = None
+        # (second, Date header) for the last second a date was made for.
+        self._last_date = (None, None)
+
+    def date(self):
+        """
+        Return the current time, formatted for the Date header.
+        """
+        second = int(time.time())
+        (last_second, last_date) = self._last_date
+        if second == last_second:
+            return last_date
+        if self.sig_timezone == 'UTC':
+            date = email.utils.formatdate(second)
+        else:
+            if self._tz is None:
+                if pytz is None:
+                    raise pytz_error
+                self._tz = pytz.timezone(self.sig_timezone)
+            d = datetime.datetime.fromtimestamp(second, self._tz)
+            date = d.strftime("%a, %d %b %Y %H:%M:%S %z")
+        self._last_date = (second, date)
+        return date
+
+    def _hmac(self, digestmod):
+        keyed = self._keyed_hmacs.get(digestmod)
+        if keyed is None:
+            keyed = hmac.new(self._skey_bytes, digestmod=digestmod)
+            self._keyed_hmacs[digestmod] = keyed
+        return keyed.copy()
+
+    def sign(self, method, host, uri, date, sig_version, params, body=None,
+             digestmod=hashlib.sha512, additional_headers=None):
+        """
+        Return basic authorization header line with a Duo Web API
+        signature. Arguments are as for the sign() function.
+        """
+        canonical = canonicalize(method, host, uri, params, date, sig_version, body=body, additional_headers=additional_headers)
+        sig = self._hmac(digestmod)
+        sig.update(canonical.encode('utf-8'))
+        auth = '%s:%s' % (self.ikey, sig.hexdigest())
+        b64 = base64.b64encode(auth.encode('utf-8')).decode('utf-8')
+        return 'Basic %s' % b64
+
+
+def format_cursor(cursor):
+    """
+    Return a paging cursor as a request parameter value. Some endpoints
+    (e.g. v2 authentication logs) return the cursor as a list of values,
+    which is sent back comma separated.
+    """
+    if isinstance(cursor, (list, tuple)):
+        return ','.join(str(value) for value in cursor)
+    return str(cursor)
 
-    sig = hmac.new(skey, canonical, digestmod)
-    auth = '%s:%s' % (ikey, sig.hexdigest())
 
-    if isinstance(auth, str):
-        auth = auth.encode('utf-8')
-    b64 = base64.b64encode(auth)
-    if not isinstance(b64, str):
-        b64 = b64.decode('utf-8')
-    return 'Basic %s' % b64
+def next_cursor(response, metadata, get_next_offset_func=None):
+    """
+    Return the cursor for the page after response, or None if it was the
+    last page.
+    """
+    if get_next_offset_func is None:
+        cursor = metadata.get('next_offset', None)
+    else:
+        cursor = get_next_offset_func(response, metadata)
+    if cursor is None or cursor == [] or cursor == ():
+        return None
+    return cursor
+
+
+def prefetch_pages(pages, prefetch):
+    """
+    Yield items from the pages iterator, fetching up to prefetch items
+    ahead of the consumer in a background thread.
+
+    Network time for the next page then overlaps with the consumer's
+    processing of the current one. At most prefetch pages are buffered
+    beyond the one the consumer is working on. Errors raised while
+    fetching are re-raised to the consumer in order. Closing the returned
+    generator stops the background thread after its current request.
+    """
+    if not prefetch:
+        yield from pages
+        return
+
+    done = object()
+    results = queue.Queue()
+    slots = threading.Semaphore(prefetch)
+    stop = threading.Event()
+
+    def fetch():
+        try:
+            while True:
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                try:
+                    page = next(pages)
+                except StopIteration:
+                    results.put((done, None))
+                    return
+                results.put((page, None))
+        except BaseException as e:
+            results.put((None, e))
+        finally:
+            close = getattr(pages, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    try:
+        while True:
+            (page, error) = results.get()
+            if error is not None:
+                raise error
+            if page is done:
+                return
+            slots.release()
+            yield page
+    finally:
+        stop.set()
 
 
 def normalize_params(params):
@@ -221,7 +425,15 @@ class Client(object):
                  digestmod=hashlib.sha512,
                  sig_version=None,
                  port=None,
-                 disable_ca_pinning=False
+                 disable_ca_pinning=False,
+                 connection_pool=None,
+                 paging_prefetch=0,
+                 paging_concurrency=1,
+                 retry_policy=None,
+                 rate_limiter=None,
+                 concurrency_controller=None,
+                 request_hooks=None,
+                 json_codec=None,
                  ):
         """
         ca_certs - Path to CA pem file.
@@ -229,12 +441,44 @@ class Client(object):
             certificates instead of Duo's bundled CA certificates. TLS
             verification remains active. Cannot be used together with a
             custom ca_certs path.
+        connection_pool - Optional duo_client.connection_pool.ConnectionPool.
+            If set, HTTP/1.1 keep-alive connections are reused across
+            requests instead of being opened and closed for each one.
+            A pool may be shared between clients and threads.
+        paging_prefetch - Default number of pages that paginated calls
+            (json_paging_api_call, json_cursor_api_call and the iterators
+            built on them) fetch in the background ahead of the caller.
+            0 fetches each page only when it is needed.
+        paging_concurrency - Default number of pages that
+            json_paging_api_call fetches in parallel once the first page
+            has reported the total number of objects. 1 fetches pages one
+            after another.
+        retry_policy - Optional duo_client.retry.RetryPolicy deciding which
+            failed requests are retried and how long to wait in between.
+            By default rate limited responses are retried with
+            exponential backoff.
+        rate_limiter - Optional duo_client.ratelimit.TokenBucket that every
+            request waits on before it is sent. Share one limiter between
+            all clients (or, with FileTokenBucket, processes) using the
+            same account to stay under its rate limit.
+        concurrency_controller - Optional
+            duo_client.concurrency.AIMDController limiting how many
+            requests are in flight at once, adapting to 429 responses.
+            It only limits requests; pages are fetched in parallel only
+            as paging_concurrency allows.
+        request_hooks - Optional list of
+            duo_client.instrumentation.RequestHook objects, called with a
+            timing breakdown of every API call.
+        json_codec - How responses are parsed: None for the standard
+            library, 'auto' for the fastest installed of orjson and
+            ujson, a codec name, or a duo_client.json_codec.JSONCodec.
         """
         self.ikey = ikey
         self.skey = skey
         self.host = host
         self.port = port
         self.sig_timezone = sig_timezone
+        self._signer = None
         if disable_ca_pinning and ca_certs not in (None, DEFAULT_CA_CERTS):
             raise ValueError(
                 "Cannot both disable CA pinning and provide custom CA certificates"
@@ -246,7 +490,13 @@ class Client(object):
         self.user_agent = user_agent
         self.set_proxy(host=None, proxy_type=None)
         self.paging_limit = paging_limit
+        self.paging_prefetch = paging_prefetch
+        self.paging_concurrency = paging_concurrency
         self.digestmod = digestmod
+        self.connection_pool = connection_pool
+        # TLS sessions from earlier connections, offered for resumption
+        # when reconnecting to the same host.
+        self.tls_session_cache = TLSSessionCache()
         if sig_version is not None:
             self.sig_version = sig_version
 
@@ -255,6 +505,11 @@ class Client(object):
         self._INITIAL_BACKOFF_WAIT_SECS = 1
         self._BACKOFF_FACTOR = 2
         self._RATE_LIMITED_RESP_CODE = 429
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency_controller = concurrency_controller
+        self.request_hooks = list(request_hooks or ())
+        self.json_codec = get_json_codec(json_codec)
 
         # Default timeout is a sentinel object
         if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
@@ -297,6 +552,77 @@ class Client(object):
             or a dict to be converted to json.
         * sig_version: signature version integer
         """
+        if self.request_hooks:
+            return self._timed_api_call(
+                method, path, params, additional_headers, sig_version)
+        (uri, body, headers) = self._prepare_request(
+            method, path, params, additional_headers, sig_version)
+
+        def resign():
+            # Retries carry a fresh Date header and signature.
+            return self._prepare_request(
+                method, path, params, additional_headers, sig_version)[2]
+        return self._make_request(method, uri, body, headers, resign=resign)
+
+    def add_request_hook(self, hook):
+        """
+        Add a duo_client.instrumentation.RequestHook to the client.
+        """
+        self.request_hooks.append(hook)
+
+    def _call_hooks(self, name, timing):
+        for hook in self.request_hooks:
+            getattr(hook, name)(timing)
+
+    def _timed_api_call(self, method, path, params,
+                        additional_headers, sig_version):
+        """
+        api_call, collecting a RequestTiming for the request hooks.
+        """
+        timing = RequestTiming(method, path, self.host)
+        self._call_hooks('on_request_start', timing)
+
+        def prepare():
+            start = time.monotonic()
+            request = self._prepare_request(
+                method, path, params, additional_headers, sig_version)
+            timing.sign_time += time.monotonic() - start
+            return request
+
+        def resign():
+            return prepare()[2]
+        try:
+            (uri, body, headers) = prepare()
+            (response, data) = self._make_request(
+                method, uri, body, headers, resign=resign, timing=timing)
+        except Exception as e:
+            timing.error = e
+            raise
+        finally:
+            timing.total_time = time.monotonic() - timing.start
+            self._call_hooks('on_request_end', timing)
+        set_last_timing(response, timing)
+        return (response, data)
+
+    def get_signer(self):
+        """
+        Return the Signer for the client's current ikey, skey and
+        sig_timezone.
+        """
+        signer = self._signer
+        if (signer is None or signer.ikey != self.ikey or
+                signer.skey != self.skey or
+                signer.sig_timezone != self.sig_timezone):
+            signer = self._signer = Signer(
+                self.ikey, self.skey, self.sig_timezone)
+        return signer
+
+    def _prepare_request(self, method, path, params,
+                         additional_headers=None, sig_version=None):
+        """
+        Sign a request. Return a (uri, body, headers) tuple ready to send,
+        with headers encoded as bytes.
+        """
         params_go_in_body = method in ('POST', 'PUT', 'PATCH')
         digestmod = self.digestmod
         if additional_headers is None:
@@ -320,25 +646,17 @@ class Client(object):
         else:
             raise ValueError('unsupported sig_version {}'.format(sig_version))
 
-        if self.sig_timezone == 'UTC':
-            now = email.utils.formatdate()
-        elif pytz is None:
-            raise pytz_error
-        else:
-            d = datetime.datetime.now(pytz.timezone(self.sig_timezone))
-            now = d.strftime("%a, %d %b %Y %H:%M:%S %z")
-
-        auth = sign(self.ikey,
-                    self.skey,
-                    method,
-                    self.host,
-                    path,
-                    now,
-                    sig_version,
-                    params,
-                    body=body,
-                    digestmod=digestmod,
-                    additional_headers=additional_headers)
+        signer = self.get_signer()
+        now = signer.date()
+        auth = signer.sign(method,
+                           self.host,
+                           path,
+                           now,
+                           sig_version,
+                           params,
+                           body=body,
+                           digestmod=digestmod,
+                           additional_headers=additional_headers)
         headers = {
             'Authorization': auth,
             'Date': now,
@@ -370,16 +688,21 @@ class Client(object):
                 v = v.encode('ascii')
             encoded_headers[k] = v
 
-        return self._make_request(method, uri, body, encoded_headers)
+        return (uri, body, encoded_headers)
+
+    def _api_port(self):
+        """
+        Return the port of the API server.
+        """
+        if self.port is not None:
+            return self.port
+        if self.ca_certs == 'HTTP':
+            return 80
+        return 443
 
     def _connect(self):
         # Host and port for the HTTP(S) connection to the API server.
-        if self.ca_certs == 'HTTP':
-            api_port = 80
-        else:
-            api_port = 443
-        if self.port is not None:
-            api_port = self.port
+        api_port = self._api_port()
 
         # Host and port for outer HTTP(S) connection if proxied.
         if self.proxy_type is None:
@@ -393,7 +716,7 @@ class Client(object):
 
         # Create outer HTTP(S) connection.
         if self.disable_ca_pinning:
-            context = ssl.create_default_context()
+            context = get_default_ssl_context()
             conn = http.client.HTTPSConnection(host, port, context=context)
         elif self.ca_certs == 'HTTP':
             conn = http.client.HTTPConnection(host, port)
@@ -405,9 +728,11 @@ class Client(object):
                 kwargs['context'] = ssl._create_unverified_context()  # noqa: DUO122, explicitly disabled for testing scenarios
             conn = http.client.HTTPSConnection(host, port, **kwargs)
         else:
-            conn = CertValidatingHTTPSConnection(host,
-                                                 port,
-                                                 ca_certs=self.ca_certs)
+            conn = CertValidatingHTTPSConnection(
+                host,
+                port,
+                ca_certs=self.ca_certs,
+                session_cache=self.tls_session_cache)
 
         # Override default socket timeout if requested.
         conn.timeout = self.timeout
@@ -427,7 +752,57 @@ class Client(object):
 
         return conn
 
-    def _make_request(self, method, uri, body, headers):
+    def _connection_key(self):
+        """
+        Return a key identifying connections this client can reuse.
+        """
+        return (self.host, self.port, self.ca_certs, self.disable_ca_pinning,
+                self.proxy_type, self.proxy_host, self.proxy_port,
+                self.timeout)
+
+    def _get_connection(self):
+        """
+        Return a (connection, reused) tuple. The connection comes from
+        the pool when one is configured and has an idle connection.
+        """
+        if self.connection_pool is not None:
+            conn = self.connection_pool.get(self._connection_key())
+            if conn is not None:
+                return (conn, True)
+        return (self._connect(), False)
+
+    def _release_connection(self, conn, response):
+        """
+        Return conn to the pool if it can carry another request,
+        otherwise close it.
+        """
+        if (self.connection_pool is not None and
+                not getattr(response, 'will_close', False)):
+            self.connection_pool.put(self._connection_key(), conn)
+        else:
+            self._disconnect(conn)
+
+    def get_retry_policy(self):
+        """
+        Return the RetryPolicy used for requests. Without an explicit
+        retry_policy, one is built from the client's backoff constants.
+        """
+        if self.retry_policy is not None:
+            return self.retry_policy
+        return RetryPolicy(
+            max_backoff_wait_secs=self._MAX_BACKOFF_WAIT_SECS,
+            initial_backoff_wait_secs=self._INITIAL_BACKOFF_WAIT_SECS,
+            backoff_factor=self._BACKOFF_FACTOR,
+            retry_statuses=(self._RATE_LIMITED_RESP_CODE,),
+        )
+
+    def _make_request(self, method, uri, body, headers, resign=None,
+                      timing=None):
+        """
+        Send a request, retrying as the retry policy allows. resign, if
+        given, returns freshly signed headers for each retry. timing, if
+        given, is a RequestTiming to fill in.
+        """
         if self.proxy_type == 'CONNECT':
             # Ensure the request uses the correct protocol and Host.
             if self.ca_certs == 'HTTP':
@@ -435,30 +810,129 @@ class Client(object):
             else:
                 api_proto = 'https'
             uri = ''.join((api_proto, '://', self.host, uri))
-        conn = self._connect()
+        policy = self.get_retry_policy()
+        start = time.monotonic()
+        attempt = 0
+        (conn, reused) = self._get_connection()
 
-        # backoff on rate limited requests and retry. if a request is rate
-        # limited after MAX_BACKOFF_WAIT_SECS, return the rate limited response
-        wait_secs = self._INITIAL_BACKOFF_WAIT_SECS
-        while True:
-            response, data = self._attempt_single_request(
-                conn, method, uri, body, headers)
-            if (response.status != self._RATE_LIMITED_RESP_CODE or
-                    wait_secs > self._MAX_BACKOFF_WAIT_SECS):
-                break
-            random_offset = random.uniform(0.0, 1.0)  # noqa: DUO102, non-cryptographic random use
-            sleep(wait_secs + random_offset)
-            wait_secs = wait_secs * self._BACKOFF_FACTOR
+        try:
+            while True:
+                attempt += 1
+                if timing is not None:
+                    timing.attempts = attempt
+                    waited = time.monotonic()
+                if self._wait_for_rate_limiter() and resign is not None:
+                    headers = resign()
+                if timing is not None:
+                    timing.rate_limit_wait += time.monotonic() - waited
+                try:
+                    response, data = self._attempt_controlled_request(
+                        conn, method, uri, body, headers, timing)
+                    error = None
+                except (OSError, http.client.HTTPException) as e:
+                    self._disconnect(conn)
+                    if (reused and isinstance(e, _STALE_CONNECTION_ERRORS)
+                            and replayable(method, e)):
+                        # The server closed an idle pooled connection.
+                        # Reconnect and send the request again.
+                        (conn, reused) = (self._connect(), False)
+                        attempt -= 1
+                        continue
+                    (response, data, error) = (None, None, e)
+                delay = policy.get_delay(method, attempt,
+                                         time.monotonic() - start,
+                                         response=response, error=error)
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    break
+                sleep(delay)
+                if timing is not None:
+                    timing.backoff_time += delay
+                if error is not None:
+                    (conn, reused) = (self._connect(), False)
+                else:
+                    reused = True
+                if resign is not None:
+                    headers = resign()
+        except BaseException:
+            self._disconnect(conn)
+            raise
+
+        self._release_connection(conn, response)
+        return (response, data)
 
-        self._disconnect(conn)
+    def _wait_for_rate_limiter(self):
+        """
+        Block until the rate limiter, if any, allows another request.
+        Returns True if that meant waiting, in which case the request
+        should be signed again.
+        """
+        if self.rate_limiter is None:
+            return False
+        waited = False
+        while True:
+            wait = self.rate_limiter.take()
+            if not wait:
+                return waited
+            waited = True
+            sleep(wait)
+
+    def _attempt_controlled_request(self, conn, method, uri, body, headers,
+                                    timing=None):
+        controller = self.concurrency_controller
+        if controller is None:
+            return self._attempt_single_request(
+                conn, method, uri, body, headers, timing)
+        started = controller.acquire()
+        status = None
+        try:
+            (response, data) = self._attempt_single_request(
+                conn, method, uri, body, headers, timing)
+            status = response.status
+        finally:
+            controller.release(started, status)
         return (response, data)
 
-    def _attempt_single_request(self, conn, method, uri, body, headers):
-        conn.request(method, uri, body, headers)
+    def _attempt_single_request(self, conn, method, uri, body, headers,
+                                timing=None):
+        if timing is None:
+            self._send_request(conn, method, uri, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+            return (response, data)
+        # http.client connects on the first request. A connection without
+        # a socket yet reports how long connecting took once it has one.
+        connecting = getattr(conn, 'sock', None) is None
+        start = time.monotonic()
+        self._send_request(conn, method, uri, body, headers)
         response = conn.getresponse()
+        first_byte = time.monotonic()
         data = response.read()
+        timing.read_time += time.monotonic() - first_byte
+        timing.ttfb = first_byte - start
+        (timing.connect_time, timing.tls_time) = (None, None)
+        if connecting:
+            timing.connect_time = getattr(conn, 'connect_time', None)
+            timing.tls_time = getattr(conn, 'tls_time', None)
+            timing.ttfb -= (timing.connect_time or 0) + (timing.tls_time or 0)
+        timing.status = response.status
+        if response.status == self._RATE_LIMITED_RESP_CODE:
+            timing.rate_limited += 1
+        if isinstance(body, str):
+            timing.request_bytes += len(body.encode('utf-8'))
+        elif body is not None:
+            timing.request_bytes += len(body)
+        timing.response_bytes += len(data)
         return (response, data)
 
+    def _send_request(self, conn, method, uri, body, headers):
+        try:
+            conn.request(method, uri, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            e.request_sent = False
+            raise
+
     def _disconnect(self, conn):
         conn.close()
 
@@ -489,27 +963,131 @@ class Client(object):
         (response, data) = self.api_call(method, path, params)
         return self.parse_json_response(response, data)
 
-    def json_paging_api_call(self, method, path, params):
+    def json_paging_api_call(self, method, path, params, prefetch=None,
+                             concurrency=None, ordered=True):
         """
         Call a Duo API method which is expected to return a JSON body
         with a 200 status. Return a generator that can be used to get
         response data or raise a RuntimeError.
+
+        prefetch - Number of pages to fetch in the background ahead of the
+                   caller. Defaults to the client's paging_prefetch.
+        concurrency - Number of pages to fetch in parallel. Defaults to the
+                      client's paging_concurrency. When greater than 1, the
+                      first page is fetched alone; if it reports
+                      total_objects, the remaining offsets are fetched by a
+                      pool of that many threads.
+        ordered - With concurrency, yield objects in offset order (True)
+                  or page by page as requests complete (False).
         """
-        objects = []
-        next_offset = 0
+        if prefetch is None:
+            prefetch = self.paging_prefetch
+        if concurrency is None:
+            concurrency = self.paging_concurrency
+        if concurrency > 1:
+            pages = self._json_parallel_paging_pages(
+                method, path, params, concurrency, ordered)
+        else:
+            pages = prefetch_pages(
+                self._json_paging_pages(method, path, params), prefetch)
+        for objects in pages:
+            for obj in objects:
+                yield obj
 
+    def _json_paging_pages(self, method, path, params, next_offset=0):
+        """
+        Generator of the lists of objects in each page of an offset-paged
+        API response.
+        """
         if 'limit' not in params and self.paging_limit:
             params['limit'] = str(self.paging_limit)
 
         while next_offset is not None:
             params['offset'] = str(next_offset)
-            (response, data) = self.api_call(method, path, params)
-            (objects, metadata) = self.parse_json_response_and_metadata(response, data)
+            (objects, metadata) = self._fetch_page(method, path, params)
             next_offset = metadata.get('next_offset', None)
-            for obj in objects:
-                yield obj
+            yield objects
 
-    def json_cursor_api_call(self, method, path, params, get_records_func):
+    def _fetch_page(self, method, path, params):
+        """
+        Fetch one page. Return an (objects, metadata) tuple.
+        """
+        (response, data) = self.api_call(method, path, params)
+        return self.parse_json_response_and_metadata(response, data)
+
+    def _json_parallel_paging_pages(self, method, path, params, concurrency,
+                                    ordered):
+        """
+        Generator of pages of an offset-paged API response, fetching pages
+        after the first one concurrently.
+
+        The first page gives the page size actually used by the server
+        (its next_offset) and the total number of objects, from which all
+        remaining offsets follow. At most twice concurrency pages are in
+        flight or buffered at a time. If the collection grew while it was
+        being read, the rest is read sequentially from the last page's
+        next_offset. Endpoints without a numeric total_objects are read
+        sequentially.
+        """
+        if 'limit' not in params and self.paging_limit:
+            params['limit'] = str(self.paging_limit)
+        params['offset'] = '0'
+        (objects, metadata) = self._fetch_page(method, path, params)
+        yield objects
+
+        next_offset = metadata.get('next_offset', None)
+        total = metadata.get('total_objects', None)
+        if next_offset is None:
+            return
+        if not isinstance(total, int) or isinstance(total, bool):
+            yield from self._json_paging_pages(method, path, params, next_offset)
+            return
+
+        step = int(next_offset)
+        offsets = iter(range(step, total, step))
+        window = 2 * concurrency
+
+        def fetch(offset):
+            page_params = dict(params)
+            page_params['offset'] = str(offset)
+            return (offset,) + self._fetch_page(method, path, page_params)
+
+        last = (0, objects, metadata)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        pending = collections.deque()
+        try:
+            def submit():
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(executor.submit(fetch, offset))
+
+            for _ in range(window):
+                submit()
+            while pending:
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    (done, _) = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+                page = future.result()
+                submit()
+                if page[0] > last[0]:
+                    last = page
+                yield page[1]
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        next_offset = last[2].get('next_offset', None)
+        if next_offset is not None and int(next_offset) >= total:
+            yield from self._json_paging_pages(method, path, params, next_offset)
+
+    def json_cursor_api_call(self, method, path, params, get_records_func,
+                             prefetch=None, offset_param='offset',
+                             get_next_offset_func=None):
         """
         Call a Duo API endpoint which utilizes a cursor in some responses to
         page through a set of data. This cursor is supplied through the optional
@@ -526,26 +1104,52 @@ class Client(object):
         :param get_records_func: Function that can be called to extract an
                                  iterable of records from the parsed response
                                  json.
+        :param prefetch: Number of pages to fetch in the background ahead of
+                         the caller. Defaults to the client's
+                         paging_prefetch.
+        :param offset_param: Name of the request parameter carrying the
+                             cursor.
+        :param get_next_offset_func: Function called with the parsed
+                                     response and metadata to extract the
+                                     cursor for the next page, for
+                                     endpoints that do not return it as
+                                     metadata "next_offset". A list cursor
+                                     is sent comma separated.
 
         :returns: Generator which will yield records from the api response(s).
         """
+        if prefetch is None:
+            prefetch = self.paging_prefetch
+        pages = self._json_cursor_pages(
+            method, path, params, get_records_func,
+            offset_param, get_next_offset_func)
+        for (records, _) in prefetch_pages(pages, prefetch):
+            for record in records:
+                yield record
 
-        next_offset = None
+    def _json_cursor_pages(self, method, path, params, get_records_func,
+                           offset_param='offset', get_next_offset_func=None,
+                           next_offset=None, fetch_page=None):
+        """
+        Generator of (records, next_offset) for each page of a
+        cursor-paged API response. next_offset resumes after the page
+        when passed back in, and is None on the last page.
+
+        fetch_page - Called with params to fetch a page, returning
+                     (response, metadata). Defaults to an api_call.
+        """
+        if fetch_page is None:
+            fetch_page = functools.partial(self._fetch_page, method, path)
 
         if 'limit' not in params and self.paging_limit:
             params['limit'] = str(self.paging_limit)
 
         while True:
             if next_offset is not None:
-                params['offset'] = str(next_offset)
-            (http_resp, http_resp_data) = self.api_call(method, path, params)
-            (response, metadata) = self.parse_json_response_and_metadata(
-                http_resp,
-                http_resp_data,
-            )
-            for record in get_records_func(response):
-                yield record
-            next_offset = metadata.get('next_offset', None)
+                params[offset_param] = format_cursor(next_offset)
+            (response, metadata) = fetch_page(params)
+            next_offset = next_cursor(response, metadata, get_next_offset_func)
+            yield (get_records_func(response), next_offset)
             if next_offset is None:
                 break
 
@@ -561,17 +1165,29 @@ class Client(object):
         """
         Return the parsed data structure and metadata as a tuple or raise RuntimeError.
         """
+        timing = pop_last_timing(response)
+        if timing is None:
+            return self._parse_json_response_and_metadata(response, data)
+        start = time.monotonic()
+        try:
+            return self._parse_json_response_and_metadata(response, data)
+        finally:
+            timing.parse_time = time.monotonic() - start
+            self._call_hooks('on_response_parsed', timing)
+
+    def _parse_json_response_and_metadata(self, response, data):
         def raise_error(msg):
             error = RuntimeError(msg)
             error.status = response.status
             error.reason = response.reason
             error.data = data
             raise error
-        if not isinstance(data, str):
-            data = data.decode('utf-8')
+        loads = self.json_codec.loads
         if response.status != 200:
+            if not isinstance(data, str):
+                data = data.decode('utf-8')
             try:
-                data = json.loads(data)
+                data = loads(data)
                 if data['stat'] == 'FAIL':
                     if 'message_detail' in data:
                         raise_error('Received %s %s (%s)' % (
@@ -591,7 +1207,9 @@ class Client(object):
                     response.reason,
             ))
         try:
-            data = json.loads(data)
+            # Parse the bytes directly, without decoding them to a str
+            # first. Large log pages make that a second full pass.
+            data = loads(data)
             if data['stat'] != 'OK':
                 raise_error('Received error response: %s' % data)
             response = data['response']
@@ -601,6 +1219,8 @@ class Client(object):
 
             return (response, metadata)
         except (ValueError, KeyError, TypeError):
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
             raise_error('Received bad response: %s' % data)
 
     @classmethod
@@ -0,0 +1,146 @@
+"""
+Adaptive concurrency control for Duo API requests.
+"""
+import asyncio
+import threading
+import time
+
+
+class AIMDController(object):
+    """
+    Limits the number of requests in flight to a window that adapts to
+    how the service responds, using additive increase, multiplicative
+    decrease (AIMD).
+
+    Each successful response grows the window by increase / window, so
+    a full window of successes grows it by about increase. A rate
+    limited (429) response, or one slower than latency_threshold,
+    multiplies the window by decrease. Requests that were already in
+    flight when the window was cut cannot cut it again, so a burst of
+    429s from one window only counts once.
+
+    The controller can be shared between threads and asyncio tasks, and
+    between several clients using the same account.
+    """
+
+    def __init__(self,
+                 initial_window=4,
+                 min_window=1,
+                 max_window=32,
+                 increase=1,
+                 decrease=0.5,
+                 latency_threshold=None,
+                 backoff_statuses=(429,)):
+        """
+        initial_window - Requests allowed in flight to begin with.
+        min_window, max_window - Bounds on the window.
+        increase - Window growth per window of successful responses.
+        decrease - Factor applied to the window on a 429 or slow response.
+        latency_threshold - Seconds after which a response counts as a
+            latency spike. None ignores latency.
+        backoff_statuses - HTTP statuses that shrink the window.
+        """
+        if not 1 <= min_window <= initial_window <= max_window:
+            raise ValueError(
+                'windows must satisfy 1 <= min <= initial <= max')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        self.min_window = min_window
+        self.max_window = max_window
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.backoff_statuses = frozenset(backoff_statuses)
+        self._window = float(initial_window)
+        self._in_flight = 0
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    @property
+    def window(self):
+        """
+        Number of requests currently allowed in flight.
+        """
+        return int(self._window)
+
+    @property
+    def in_flight(self):
+        """
+        Number of requests currently in flight.
+        """
+        return self._in_flight
+
+    def _try_acquire_locked(self):
+        if self._in_flight < int(self._window):
+            self._in_flight += 1
+            return time.monotonic()
+        return None
+
+    def acquire(self, timeout=None):
+        """
+        Block until a request may be sent. Returns a token to pass to
+        release() once it completes, or None on timeout.
+        """
+        with self._cond:
+            started = self._try_acquire_locked()
+            deadline = None
+            if timeout is not None:
+                deadline = time.monotonic() + timeout
+            while started is None:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                self._cond.wait(remaining)
+                started = self._try_acquire_locked()
+            return started
+
+    async def acquire_async(self):
+        """
+        Like acquire(), for asyncio tasks.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                started = self._try_acquire_locked()
+                if started is not None:
+                    return started
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, started, status=None):
+        """
+        Record that a request acquired at started has finished, with
+        status as its HTTP status, or None if it failed without one.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            slow = (self.latency_threshold is not None and
+                    now - started > self.latency_threshold)
+            if status in self.backoff_statuses or slow:
+                if started >= self._last_decrease:
+                    self._window = max(
+                        self.min_window, self._window * self.decrease)
+                    self._last_decrease = now
+            elif status is not None and status < 500:
+                self._window = min(
+                    self.max_window,
+                    self._window + self.increase / self._window)
+            self._cond.notify_all()
+            waiters = self._async_waiters
+            self._async_waiters = []
+        for (loop, waiter) in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiter's event loop has been closed.
+                pass
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
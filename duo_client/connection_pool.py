@@ -0,0 +1,104 @@
+"""
+Keep-alive connection pooling for Duo API clients.
+"""
+import collections
+import select
+import threading
+import time
+
+
+def is_connection_dropped(conn):
+    """
+    Return True if an idle connection can no longer be used.
+
+    An idle HTTP/1.1 connection should never have data waiting to be
+    read. If the socket is readable, the server has either closed it or
+    sent something unexpected, and it must not be reused.
+    """
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        # Not connected (or closed by http.client after a
+        # "Connection: close" response). The next request reconnects.
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of idle HTTP(S) connections, kept per host.
+
+    A single pool may be shared by several clients. Connections are
+    keyed by everything that affects how they were established (host,
+    port, proxy and certificate settings), so a client only gets back
+    connections it could have made itself.
+    """
+
+    def __init__(self, max_size=10, idle_timeout=60):
+        """
+        max_size - Maximum number of idle connections kept per host.
+        idle_timeout - Seconds an idle connection may sit in the pool
+            before it is considered stale and closed.
+        """
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(collections.deque)
+
+    def get(self, key):
+        """
+        Return an idle connection for key, or None if there is none.
+
+        Stale connections found along the way are closed and discarded.
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                (conn, released_at) = idle.pop()
+            if (self.idle_timeout is not None and
+                    time.monotonic() - released_at > self.idle_timeout):
+                conn.close()
+                continue
+            if is_connection_dropped(conn):
+                conn.close()
+                continue
+            return conn
+
+    def put(self, key, conn):
+        """
+        Return a connection to the pool. If the pool for key is full the
+        connection is closed instead.
+        """
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.max_size:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def idle_count(self, key=None):
+        """
+        Return the number of idle connections for key, or for all hosts.
+        """
+        with self._lock:
+            if key is not None:
+                return len(self._idle.get(key, ()))
+            return sum(len(idle) for idle in self._idle.values())
+
+    def clear(self):
+        """
+        Close every idle connection in the pool.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = collections.defaultdict(collections.deque)
+        for connections in idle.values():
+            for (conn, _) in connections:
+                conn.close()
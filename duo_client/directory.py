@@ -0,0 +1,423 @@
+"""
+Local mirror of an account's users, groups, phones and tokens.
+
+DirectoryMirror downloads the directory once with the Admin API
+iterators and answers lookups and joins from in-memory indexes:
+
+    mirror = duo_client.directory.DirectoryMirror(admin_api)
+    mirror.refresh()
+    for user in mirror.get_group_members(group_id):
+        print(user['username'], mirror.get_user_aliases(user['user_id']))
+
+A mirror can be saved to and loaded from a compressed snapshot file, so
+short-lived jobs can reuse a recent download:
+
+    mirror = DirectoryMirror.load(admin_api, 'directory.json.gz')
+    mirror.refresh(max_age=3600)
+
+or share collections through a duo_client.sqlite_cache.SQLiteCache:
+
+    mirror = DirectoryMirror(admin_api, store=store)
+    mirror.refresh(max_age=3600)
+
+Lookups never make API calls. They return the entities as the API
+returned them, so callers should not modify them.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .util import write_file_atomic
+
+COLLECTIONS = ('users', 'groups', 'phones', 'tokens', 'integrations')
+
+# Collections mirrored by default. Integrations need an extra permission.
+DEFAULT_COLLECTIONS = ('users', 'groups', 'phones', 'tokens')
+
+DEFAULT_STORE_TTL = 24 * 3600
+
+_ID_KEYS = {
+    'users': 'user_id',
+    'groups': 'group_id',
+    'phones': 'phone_id',
+    'tokens': 'token_id',
+    'integrations': 'integration_key',
+}
+
+_NOT_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone_number(number):
+    """
+    Return number with everything but digits and a leading + removed,
+    for matching numbers written differently.
+    """
+    if not number:
+        return ''
+    number = str(number).strip()
+    prefix = '+' if number.startswith('+') else ''
+    return prefix + _NOT_DIGITS.sub('', number)
+
+
+def _add(index, key, value):
+    if not key:
+        return
+    values = index.get(key, ())
+    if value not in values:
+        index[key] = values + (value,)
+
+
+def _append(index, key, value):
+    if key:
+        index.setdefault(key, []).append(value)
+
+
+def _freeze(index):
+    for (key, values) in index.items():
+        index[key] = tuple(dict.fromkeys(values))
+
+
+def _remove(index, key, value):
+    values = index.get(key)
+    if values is None or value not in values:
+        return
+    values = tuple(v for v in values if v != value)
+    if values:
+        index[key] = values
+    else:
+        del index[key]
+
+
+def _user_aliases(user):
+    aliases = user.get('aliases')
+    if isinstance(aliases, dict):
+        return [alias for alias in aliases.values() if alias]
+    return [user[key] for key in ('alias1', 'alias2', 'alias3', 'alias4')
+            if user.get(key)]
+
+
+class _Snapshot(object):
+    """
+    Entities of every collection and the indexes over them. Replaced
+    whole when collections are refreshed, so readers see one download
+    or the other. Index values are tuples, replaced rather than changed,
+    so they are safe to read while refresh_user() updates the indexes.
+    """
+
+    def __init__(self, entities, fetched):
+        self.entities = entities
+        self.fetched = fetched
+        self.username = {}
+        self.alias = {}
+        self.email = {}
+        self.user_phone_number = {}
+        self.phone_number = {}
+        self.group_members = {}
+        self.user_groups = {}
+        self.group_name = {}
+        # Build the indexes as lists, then freeze them, to stay linear
+        # in the size of large groups.
+        for user in entities['users'].values():
+            self.index_user(user, _append)
+        for group in entities['groups'].values():
+            _append(self.group_name, group.get('name', '').lower(),
+                    group['group_id'])
+        for phone in entities['phones'].values():
+            _append(self.phone_number,
+                    normalize_phone_number(phone.get('number')),
+                    phone['phone_id'])
+        for index in (self.alias, self.email, self.user_phone_number,
+                      self.phone_number, self.group_members,
+                      self.group_name):
+            _freeze(index)
+
+    def index_user(self, user, add=_add):
+        user_id = user['user_id']
+        if user.get('username'):
+            self.username[user['username'].lower()] = user_id
+        for alias in _user_aliases(user):
+            add(self.alias, alias.lower(), user_id)
+        add(self.email, (user.get('email') or '').lower(), user_id)
+        for phone in user.get('phones') or ():
+            add(self.user_phone_number,
+                normalize_phone_number(phone.get('number')), user_id)
+        group_ids = tuple(group['group_id']
+                          for group in user.get('groups') or ())
+        self.user_groups[user_id] = group_ids
+        for group_id in group_ids:
+            add(self.group_members, group_id, user_id)
+
+    def unindex_user(self, user):
+        user_id = user['user_id']
+        username = (user.get('username') or '').lower()
+        if self.username.get(username) == user_id:
+            del self.username[username]
+        for alias in _user_aliases(user):
+            _remove(self.alias, alias.lower(), user_id)
+        _remove(self.email, (user.get('email') or '').lower(), user_id)
+        for phone in user.get('phones') or ():
+            _remove(self.user_phone_number,
+                    normalize_phone_number(phone.get('number')), user_id)
+        for group_id in self.user_groups.pop(user_id, ()):
+            _remove(self.group_members, group_id, user_id)
+
+
+class DirectoryMirror(object):
+    """
+    In-memory mirror of the directory of one account, with indexes by
+    username, alias, email, phone number and group membership.
+    """
+
+    def __init__(self, admin, collections=DEFAULT_COLLECTIONS, store=None,
+                 store_ttl=DEFAULT_STORE_TTL):
+        """
+        admin - Admin client to download the directory with.
+        collections - Which of COLLECTIONS to mirror. Users are always
+            mirrored.
+        store - A duo_client.sqlite_cache.SQLiteCache to share downloaded
+            collections through, or None.
+        store_ttl - Seconds collections are kept in store.
+        """
+        unknown = set(collections) - set(COLLECTIONS)
+        if unknown:
+            raise ValueError('Unknown collections: {}'.format(
+                ', '.join(sorted(unknown))))
+        self.admin = admin
+        self.store = store
+        self.store_ttl = store_ttl
+        self.collections = tuple(
+            c for c in COLLECTIONS if c in collections or c == 'users')
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot(
+            dict((c, {}) for c in COLLECTIONS), {})
+
+    def _fetch(self, collection):
+        iterators = {
+            'users': self.admin.get_users_iterator,
+            'groups': self.admin.get_groups_generator,
+            'phones': self.admin.get_phones_generator,
+            'tokens': self.admin.get_tokens_generator,
+            'integrations': self.admin.get_integrations_generator,
+        }
+        fetched = time.time()
+        entities = list(iterators[collection]())
+        if self.store is not None:
+            self.store.put('directory', self._store_key(collection),
+                           {'fetched': fetched, 'entities': entities},
+                           self.store_ttl)
+        return (fetched, entities)
+
+    def _store_key(self, collection):
+        return json.dumps([self.admin.host,
+                           getattr(self.admin, 'account_id', None),
+                           collection])
+
+    def _load(self, collection, max_age):
+        """
+        Return (fetched, entities) of collection from store if it was
+        downloaded at most max_age seconds ago, otherwise download it.
+        """
+        if self.store is not None and max_age is not None:
+            stored = self.store.get_entry(
+                'directory', self._store_key(collection))
+            if (stored is not None
+                    and time.time() - stored[0]['fetched'] <= max_age):
+                return (stored[0]['fetched'], stored[0]['entities'])
+        return self._fetch(collection)
+
+    def refresh(self, collections=None, max_age=None):
+        """
+        Download collections again, concurrently, and rebuild the indexes.
+
+        collections - Collections to refresh. Defaults to all mirrored.
+        max_age - Only refresh collections downloaded more than max_age
+            seconds ago (or never). Collections another mirror saved to
+            store within max_age are loaded from there instead.
+
+        Returns the list of collections refreshed.
+        """
+        if collections is None:
+            collections = self.collections
+        now = time.time()
+        snapshot = self._snapshot
+        if max_age is not None:
+            collections = [
+                c for c in collections
+                if now - snapshot.fetched.get(c, 0) > max_age]
+        if not collections:
+            return []
+        with ThreadPoolExecutor(max_workers=len(collections)) as executor:
+            results = dict(zip(collections, executor.map(
+                lambda c: self._load(c, max_age), collections)))
+        with self._lock:
+            entities = dict(self._snapshot.entities)
+            fetched = dict(self._snapshot.fetched)
+            for (collection, (when, result)) in results.items():
+                id_key = _ID_KEYS[collection]
+                entities[collection] = dict(
+                    (entity[id_key], entity) for entity in result)
+                fetched[collection] = when
+            self._snapshot = _Snapshot(entities, fetched)
+        return list(collections)
+
+    def refresh_user(self, user_id):
+        """
+        Download one user again, e.g. after it was changed, removing it
+        from the mirror if it no longer exists. The indexes are updated
+        in place rather than rebuilt.
+        """
+        try:
+            user = self.admin.get_user_by_id(user_id)
+        except RuntimeError as e:
+            if getattr(e, 'status', None) != 404:
+                raise
+            user = None
+        with self._lock:
+            snapshot = self._snapshot
+            users = snapshot.entities['users']
+            old = users.get(user_id)
+            if old is not None:
+                snapshot.unindex_user(old)
+            if user is None:
+                users.pop(user_id, None)
+            else:
+                users[user_id] = user
+                snapshot.index_user(user)
+
+    @property
+    def fetched(self):
+        """
+        Dict of collection to the unix time it was last downloaded.
+        """
+        return dict(self._snapshot.fetched)
+
+    def save(self, path):
+        """
+        Atomically write the mirror to path as gzipped JSON.
+        """
+        snapshot = self._snapshot
+        data = json.dumps(
+            {'fetched': snapshot.fetched, 'entities': dict(
+                (c, list(entities.values()))
+                for (c, entities) in snapshot.entities.items())},
+            separators=(',', ':')).encode('utf-8')
+
+        def write(f):
+            with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                gz.write(data)
+        write_file_atomic(path, write, mode='wb')
+
+    @classmethod
+    def load(cls, admin, path, collections=DEFAULT_COLLECTIONS):
+        """
+        Return a mirror with the contents saved to path, or an empty one
+        if path does not exist.
+        """
+        mirror = cls(admin, collections)
+        if not os.path.exists(path):
+            return mirror
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        entities = dict((c, {}) for c in COLLECTIONS)
+        for (collection, values) in data['entities'].items():
+            id_key = _ID_KEYS[collection]
+            entities[collection] = dict((v[id_key], v) for v in values)
+        mirror._snapshot = _Snapshot(entities, data['fetched'])
+        return mirror
+
+    def users(self):
+        return list(self._snapshot.entities['users'].values())
+
+    def groups(self):
+        return list(self._snapshot.entities['groups'].values())
+
+    def phones(self):
+        return list(self._snapshot.entities['phones'].values())
+
+    def tokens(self):
+        return list(self._snapshot.entities['tokens'].values())
+
+    def integrations(self):
+        return list(self._snapshot.entities['integrations'].values())
+
+    def get_user(self, user_id):
+        return self._snapshot.entities['users'].get(user_id)
+
+    def get_group(self, group_id):
+        return self._snapshot.entities['groups'].get(group_id)
+
+    def get_phone(self, phone_id):
+        return self._snapshot.entities['phones'].get(phone_id)
+
+    def get_token(self, token_id):
+        return self._snapshot.entities['tokens'].get(token_id)
+
+    def get_integration(self, integration_key):
+        return self._snapshot.entities['integrations'].get(integration_key)
+
+    def _users(self, snapshot, user_ids):
+        users = snapshot.entities['users']
+        return [users[user_id] for user_id in user_ids if user_id in users]
+
+    def get_user_by_username(self, username):
+        """
+        Returns the user with username (case insensitive), or None.
+        """
+        snapshot = self._snapshot
+        user_id = snapshot.username.get(username.lower())
+        return snapshot.entities['users'].get(user_id)
+
+    def get_users_by_alias(self, alias):
+        snapshot = self._snapshot
+        return self._users(snapshot, snapshot.alias.get(alias.lower(), ()))
+
+    def get_users_by_email(self, email):
+        snapshot = self._snapshot
+        return self._users(snapshot, snapshot.email.get(email.lower(), ()))
+
+    def get_users_by_phone_number(self, number):
+        snapshot = self._snapshot
+        return self._users(snapshot, snapshot.user_phone_number.get(
+            normalize_phone_number(number), ()))
+
+    def get_phones_by_number(self, number):
+        snapshot = self._snapshot
+        phones = snapshot.entities['phones']
+        return [phones[phone_id] for phone_id in snapshot.phone_number.get(
+            normalize_phone_number(number), ())]
+
+    def get_groups_by_name(self, name):
+        snapshot = self._snapshot
+        groups = snapshot.entities['groups']
+        return [groups[group_id] for group_id in
+                snapshot.group_name.get(name.lower(), ())]
+
+    def get_group_members(self, group_id):
+        """
+        Returns the users in the group.
+        """
+        snapshot = self._snapshot
+        return self._users(snapshot, snapshot.group_members.get(group_id, ()))
+
+    def get_user_groups(self, user_id):
+        """
+        Returns the groups of the user, as embedded in the user object
+        if groups are not mirrored.
+        """
+        snapshot = self._snapshot
+        user = snapshot.entities['users'].get(user_id)
+        if user is None:
+            return []
+        groups = snapshot.entities['groups']
+        return [groups.get(group['group_id'], group)
+                for group in user.get('groups') or ()]
+
+    def get_user_aliases(self, user_id):
+        user = self.get_user(user_id)
+        if user is None:
+            return []
+        return _user_aliases(user)
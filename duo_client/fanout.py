@@ -0,0 +1,187 @@
+"""
+Run the same Admin API operation against every child account.
+
+AccountFanout lists the child accounts of an Accounts API integration
+and calls a function with an AccountAdmin for each, on a bounded pool
+of threads, yielding each account's result as soon as it is ready:
+
+    fanout = duo_client.fanout.AccountFanout(accounts_api, workers=16,
+                                             rate=5)
+    for result in fanout.run(lambda admin: admin.get_info_summary()):
+        if result.error is not None:
+            print(result.account_id, 'failed:', result.error)
+        else:
+            report(result.account['name'], result.value)
+
+Accounts on the same API host share a connection pool, so connections
+are reused from one account to the next, and a rate budget, so the
+accounts of one host cannot together exceed it.
+"""
+import concurrent.futures
+import threading
+import time
+
+from .admin import AccountAdmin
+from .connection_pool import ConnectionPool
+from .ratelimit import TokenBucket
+
+
+class AccountResult(object):
+    """
+    Outcome of the function for one child account.
+
+    account - The child account, as returned by get_child_accounts().
+    value - What the function returned, or None if it raised.
+    error - The exception the function raised, or None.
+    elapsed - Seconds the function ran for.
+    """
+
+    def __init__(self, account, value=None, error=None, elapsed=None):
+        self.account = account
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def account_id(self):
+        return self.account.get('account_id')
+
+    def __repr__(self):
+        return '<AccountResult %s %s>' % (
+            self.account_id, 'error' if self.error is not None else 'ok')
+
+
+class AccountFanout(object):
+    """
+    Run a function against many child accounts at once.
+    """
+
+    def __init__(self, accounts_api, workers=8, rate=None, burst=None,
+                 pool_size=None, **admin_kwargs):
+        """
+        accounts_api - Accounts client of the parent account. Its
+            credentials are used for every child account.
+        workers - Number of accounts worked on at once.
+        rate - Requests per second allowed to each child API host, or
+            None for no limit.
+        burst - Requests each host's budget allows at once. Defaults to
+            rate.
+        pool_size - Idle connections kept per child API host. Defaults
+            to workers.
+        admin_kwargs - Passed to every AccountAdmin, e.g. timeout or
+            retry_policy.
+        """
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        self.accounts_api = accounts_api
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.pool_size = pool_size or workers
+        self.admin_kwargs = admin_kwargs
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._limiters = {}
+
+    def connection_pool(self, host):
+        """
+        Return the ConnectionPool of child API host.
+        """
+        with self._lock:
+            pool = self._pools.get(host)
+            if pool is None:
+                pool = self._pools[host] = ConnectionPool(
+                    max_size=self.pool_size)
+            return pool
+
+    def rate_limiter(self, host):
+        """
+        Return the TokenBucket of child API host, or None without a rate.
+        """
+        if self.rate is None:
+            return None
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = TokenBucket(
+                    self.rate, self.burst)
+            return limiter
+
+    def get_admin(self, account):
+        """
+        Return an AccountAdmin for account, a dict with 'account_id' and
+        'api_hostname' keys.
+        """
+        host = account.get('api_hostname') or self.accounts_api.host
+        kwargs = dict(self.admin_kwargs)
+        kwargs.setdefault('connection_pool', self.connection_pool(host))
+        kwargs.setdefault('rate_limiter', self.rate_limiter(host))
+        return AccountAdmin(
+            account['account_id'],
+            child_api_host=account.get('api_hostname'),
+            ikey=self.accounts_api.ikey,
+            skey=self.accounts_api.skey,
+            host=self.accounts_api.host,
+            **kwargs)
+
+    def _call(self, func, account):
+        start = time.monotonic()
+        try:
+            value = func(self.get_admin(account))
+        except Exception as e:
+            return AccountResult(account, error=e,
+                                 elapsed=time.monotonic() - start)
+        return AccountResult(account, value=value,
+                             elapsed=time.monotonic() - start)
+
+    def run(self, func, accounts=None):
+        """
+        Generator of an AccountResult for each account, in the order
+        they finish.
+
+        func - Called with the AccountAdmin of each account. An exception
+            it raises is returned as the account's error; the other
+            accounts carry on.
+        accounts - Child accounts to run against. Defaults to every child
+            account, from get_child_accounts().
+
+        At most workers accounts are started ahead of the caller.
+        Closing the generator early cancels the accounts not yet
+        started and waits for those running.
+        """
+        if accounts is None:
+            accounts = self.accounts_api.get_child_accounts()
+        accounts = iter(accounts)
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='duo-fanout')
+        pending = set()
+        try:
+            for account in accounts:
+                pending.add(executor.submit(self._call, func, account))
+                if len(pending) < self.workers:
+                    continue
+                (done, pending) = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            for future in concurrent.futures.as_completed(pending):
+                pending.discard(future)
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def run_all(self, func, accounts=None):
+        """
+        Run func against accounts like run(), and return a pair of dicts
+        of account id to value and account id to error.
+        """
+        values = {}
+        errors = {}
+        for result in self.run(func, accounts):
+            if result.error is not None:
+                errors[result.account_id] = result.error
+            else:
+                values[result.account_id] = result.value
+        return (values, errors)
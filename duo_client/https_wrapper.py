@@ -22,9 +22,136 @@ import http.client
 import re
 import socket
 import ssl
+import threading
+import time
 import urllib.error
 import urllib.request
 
+# SSL contexts are expensive to build (loading a CA bundle parses every
+# certificate in it) but are safe to share between connections and
+# threads, so they are built once per process and configuration.
+_ssl_context_cache = {}
+_ssl_context_cache_lock = threading.Lock()
+
+
+def _create_ssl_context(ca_certs=None, cert_file=None, key_file=None):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+    if cert_file:
+        context.load_cert_chain(cert_file, key_file)
+    if ca_certs:
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.load_verify_locations(cafile=ca_certs)
+    else:
+        context.verify_mode = ssl.CERT_NONE
+
+    ssl_version_blacklist = ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+    context.options |= ssl_version_blacklist
+    return context
+
+
+def get_ssl_context(ca_certs=None, cert_file=None, key_file=None):
+    """Returns a shared SSL context for the given certificate settings.
+
+    Args:
+      ca_certs: A file containing a set of concatenated certificate authority
+          certs for validating the server against.
+      cert_file: A file containing the client's certificates
+      key_file: A file containing the client's private key
+    Returns:
+      ssl.SSLContext: A context built on first use and cached afterwards.
+    """
+    key = ('pinned', ca_certs, cert_file, key_file)
+    with _ssl_context_cache_lock:
+        context = _ssl_context_cache.get(key)
+        if context is None:
+            context = _create_ssl_context(ca_certs, cert_file, key_file)
+            _ssl_context_cache[key] = context
+    return context
+
+
+def get_default_ssl_context():
+    """Returns a shared context that trusts the system's default CAs."""
+    key = ('default',)
+    with _ssl_context_cache_lock:
+        context = _ssl_context_cache.get(key)
+        if context is None:
+            context = ssl.create_default_context()
+            _ssl_context_cache[key] = context
+    return context
+
+
+def clear_ssl_context_cache():
+    """Discards cached SSL contexts, e.g. after a CA bundle changes."""
+    with _ssl_context_cache_lock:
+        _ssl_context_cache.clear()
+
+
+def get_valid_hosts_for_cert(cert):
+    """Returns a list of valid host globs for an SSL certificate.
+
+    Args:
+      cert: A dictionary representing an SSL certificate.
+    Returns:
+      list: A list of valid host globs.
+    """
+    if 'subjectAltName' in cert:
+        return [x[1] for x in cert['subjectAltName'] if x[0].lower() == 'dns']
+    else:
+        return [x[0][1] for x in cert['subject']
+                if x[0][0].lower() == 'commonname']
+
+
+def validate_certificate_hostname(cert, hostname):
+    """Validates that a given hostname is valid for an SSL certificate.
+
+    Args:
+      cert: A dictionary representing an SSL certificate.
+      hostname: The hostname to test.
+    Returns:
+      bool: Whether or not the hostname is valid for this certificate.
+    """
+    hosts = get_valid_hosts_for_cert(cert)
+    for host in hosts:
+        host_re = host.replace('.', r'\.').replace('*', '[^.]*')
+        if re.search('^%s$' % (host_re,), hostname, re.I):
+            return True
+    return False
+
+
+class TLSSessionCache(object):
+    """Remembers the most recent TLS session for each host.
+
+    Offering a saved session on the next connection to the same host lets
+    the server resume it with an abbreviated handshake instead of a full
+    one. Sessions are only valid with the SSL context that created them,
+    so the context is stored alongside each session.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, context):
+        """Returns the saved session for key if it belongs to context."""
+        with self._lock:
+            entry = self._sessions.get(key)
+        if entry is None or entry[0] is not context:
+            return None
+        return entry[1]
+
+    def set(self, key, context, session):
+        """Saves session, created with context, for key."""
+        if session is None:
+            return
+        with self._lock:
+            self._sessions[key] = (context, session)
+
+    def clear(self):
+        """Forgets every saved session."""
+        with self._lock:
+            self._sessions.clear()
+
+
 class InvalidCertificateException(http.client.HTTPException):
     """Raised when a certificate is provided with an invalid hostname."""
 
@@ -53,7 +180,7 @@ class CertValidatingHTTPSConnection(http.client.HTTPConnection):
     default_port = http.client.HTTPS_PORT
 
     def __init__(self, host, port=None, key_file=None, cert_file=None,
-                 ca_certs=None, strict=None, **kwargs):
+                 ca_certs=None, strict=None, session_cache=None, **kwargs):
         """Constructor.
 
         Args:
@@ -65,20 +192,20 @@ class CertValidatingHTTPSConnection(http.client.HTTPConnection):
               certs for validating the server against.
           strict: When true, causes BadStatusLine to be raised if the status line
               can't be parsed as a valid HTTP/1.0 or 1.1 status line.
+          session_cache: An optional TLSSessionCache. If given, the session
+              from a previous connection to the same host is offered for
+              resumption, and this connection's session is saved for the next.
         """
         http.client.HTTPConnection.__init__(self, host, port, strict, **kwargs)
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS)
-        if cert_file:
-            context.load_cert_chain(cert_file, key_file)
-        if ca_certs:
-            context.verify_mode = ssl.CERT_REQUIRED
-            context.load_verify_locations(cafile=ca_certs)
-        else:
-            context.verify_mode = ssl.CERT_NONE
-
-        ssl_version_blacklist = ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
-        context.options |= ssl_version_blacklist
-        self.default_ssl_context = context
+        self.default_ssl_context = get_ssl_context(ca_certs, cert_file, key_file)
+        self.session_cache = session_cache
+        # Whether the last handshake resumed a saved session. None until
+        # connected.
+        self.session_reused = None
+        # Seconds spent on the TCP connect (including name resolution and
+        # any proxy tunnel) and on the TLS handshake by the last connect().
+        self.connect_time = None
+        self.tls_time = None
 
     def _GetValidHostsForCert(self, cert):
         """Returns a list of valid host globs for an SSL certificate.
@@ -88,11 +215,7 @@ class CertValidatingHTTPSConnection(http.client.HTTPConnection):
         Returns:
           list: A list of valid host globs.
         """
-        if 'subjectAltName' in cert:
-            return [x[1] for x in cert['subjectAltName'] if x[0].lower() == 'dns']
-        else:
-            return [x[0][1] for x in cert['subject']
-                    if x[0][0].lower() == 'commonname']
+        return get_valid_hosts_for_cert(cert)
 
     def _ValidateCertificateHostname(self, cert, hostname):
         """Validates that a given hostname is valid for an SSL certificate.
@@ -103,27 +226,54 @@ class CertValidatingHTTPSConnection(http.client.HTTPConnection):
         Returns:
           bool: Whether or not the hostname is valid for this certificate.
         """
-        hosts = self._GetValidHostsForCert(cert)
-        for host in hosts:
-            host_re = host.replace('.', r'\.').replace('*', '[^.]*')
-            if re.search('^%s$' % (host_re,), hostname, re.I):
-                return True
-        return False
+        return validate_certificate_hostname(cert, hostname)
 
     def connect(self):
         "Connect to a host on a given (SSL) port."
+        start = time.monotonic()
         self.sock = socket.create_connection((self.host, self.port),
                                              self.timeout)
         if self._tunnel_host:
             self._tunnel()
+        connected = time.monotonic()
+        session = None
+        if self.session_cache is not None:
+            session = self.session_cache.get(self._GetSessionKey(),
+                                             self.default_ssl_context)
         self.sock = self.default_ssl_context.wrap_socket(self.sock,
-                                                         server_hostname=self.host)
+                                                         server_hostname=self.host,
+                                                         session=session)
+        self.session_reused = self.sock.session_reused
+        self.connect_time = connected - start
+        self.tls_time = time.monotonic() - connected
         if self.default_ssl_context.verify_mode == ssl.CERT_REQUIRED:
             cert = self.sock.getpeercert()
             cert_validation_host = self._tunnel_host or self.host
             hostname = cert_validation_host.split(':', 0)[0]
             if not self._ValidateCertificateHostname(cert, hostname):
                 raise InvalidCertificateException(hostname, cert, 'hostname mismatch')
+        self._SaveSession()
+
+    def close(self):
+        "Close the connection, saving its TLS session for later resumption."
+        self._SaveSession()
+        http.client.HTTPConnection.close(self)
+
+    def _GetSessionKey(self):
+        """Returns the key sessions are saved under for this connection."""
+        return (self._tunnel_host or self.host, self._tunnel_port or self.port)
+
+    def _SaveSession(self):
+        """Saves the current TLS session, if any, to the session cache.
+
+        With TLS 1.3 the session ticket arrives after the handshake, so this
+        is called again on close to pick up the resumable session.
+        """
+        if self.session_cache is None or self.sock is None:
+            return
+        session = getattr(self.sock, 'session', None)
+        self.session_cache.set(self._GetSessionKey(), self.default_ssl_context,
+                               session)
 
 
 class CertValidatingHTTPSHandler(urllib.request.HTTPSHandler):
@@ -0,0 +1,145 @@
+"""
+Per-request timing instrumentation for Duo API clients.
+
+Pass hooks to a client (request_hooks=[...]) to receive a RequestTiming
+for every API call:
+
+    class LogSlowCalls(RequestHook):
+        def on_request_end(self, timing):
+            if timing.total_time > 1:
+                log.warning('slow call: %r', timing.as_dict())
+
+Timings are only collected while a client has hooks, so clients
+without any pay nothing for them.
+"""
+import contextvars
+import re
+import time
+
+_WORD_SEGMENT = re.compile(r'^(?:[a-z_\-]+|v\d+)$')
+
+# The (response, timing) pair of the last api_call made in this thread or
+# asyncio task, so that parsing the response can add to the same timing.
+_last_timing = contextvars.ContextVar('duo_client_last_timing', default=None)
+
+
+def path_template(path):
+    """
+    Return path with identifiers replaced by {id}, to group requests by
+    endpoint. Segments other than lower case words and version numbers
+    are taken to be identifiers.
+
+    /admin/v1/users/DU0123456789ABCDEF01/phones -> /admin/v1/users/{id}/phones
+    """
+    return '/'.join(
+        '{id}' if segment and not _WORD_SEGMENT.match(segment) else segment
+        for segment in path.split('/')
+    )
+
+
+class RequestTiming(object):
+    """
+    Where the time went in one API call. Durations are in seconds and
+    are None for phases that did not happen, such as connect_time on a
+    reused keep-alive connection.
+
+    host, method, path, path_template - The request.
+    status - HTTP status of the final response, or None.
+    error - Exception that ended the call, if any.
+    attempts - Number of times the request was sent.
+    rate_limited - Number of attempts answered with 429.
+    sign_time - Time spent building and signing the request, across
+        all attempts.
+    rate_limit_wait - Time spent waiting on the client's rate limiter.
+    backoff_time - Time slept between retries.
+    connect_time - Name resolution and TCP connect for the last attempt.
+    tls_time - TLS handshake for the last attempt.
+    ttfb - From sending the last attempt to receiving its response
+        headers, excluding connect_time and tls_time.
+    read_time - Time reading response bodies.
+    parse_time - Time parsing the JSON response, once it has been.
+    request_bytes, response_bytes - Body sizes, across all attempts.
+    total_time - Duration of the call, excluding parse_time.
+    """
+
+    def __init__(self, method, path, host=None):
+        self.host = host
+        self.method = method
+        self.path = path
+        self.path_template = path_template(path)
+        self.status = None
+        self.error = None
+        self.attempts = 0
+        self.rate_limited = 0
+        self.sign_time = 0.0
+        self.rate_limit_wait = 0.0
+        self.backoff_time = 0.0
+        self.connect_time = None
+        self.tls_time = None
+        self.ttfb = None
+        self.read_time = 0.0
+        self.parse_time = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.total_time = None
+        self.start = time.monotonic()
+
+    @property
+    def retries(self):
+        """
+        Number of times the request was retried.
+        """
+        return max(0, self.attempts - 1)
+
+    def as_dict(self):
+        """
+        Return the timing as a dict, e.g. for structured logging.
+        """
+        result = dict(
+            (k, v) for (k, v) in self.__dict__.items()
+            if k not in ('start', 'error'))
+        result['retries'] = self.retries
+        result['error'] = None if self.error is None else repr(self.error)
+        return result
+
+
+class RequestHook(object):
+    """
+    Base class for request hooks. Override whichever callbacks are
+    needed; each is passed the call's RequestTiming.
+
+    Hooks run on the thread (or event loop) making the call, so they
+    should be quick. Exceptions raised by a hook propagate to the caller.
+    """
+
+    def on_request_start(self, timing):
+        """
+        Called before the request is signed and sent.
+        """
+
+    def on_request_end(self, timing):
+        """
+        Called once the call has a final response, or has failed.
+        """
+
+    def on_response_parsed(self, timing):
+        """
+        Called after the response of the call has been parsed as JSON,
+        successfully or not.
+        """
+
+
+def set_last_timing(response, timing):
+    _last_timing.set((response, timing))
+
+
+def pop_last_timing(response):
+    """
+    Return the timing of the api_call that returned response, if it was
+    the last one made in this context.
+    """
+    last = _last_timing.get()
+    if last is None or last[0] is not response:
+        return None
+    _last_timing.set(None)
+    return last[1]
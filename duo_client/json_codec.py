@@ -0,0 +1,101 @@
+"""
+JSON encoding and decoding for Duo API clients.
+
+Responses are decoded by a JSONCodec, which parses the response bytes
+directly rather than decoding them to a str first. The default codec
+uses the standard library. OrjsonCodec and UJSONCodec use those
+libraries, when installed, to parse large responses (such as log pages)
+several times faster:
+
+    admin_api = duo_client.Admin(..., json_codec='auto')
+
+Codecs only decode. Request bodies signed with sig_version 4 and 5 must
+be canonical JSON exactly as the server recomputes it, so they are
+always encoded by Client.canon_json with the standard library.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    """
+    Standard library JSON codec, and the base class for other codecs.
+    """
+    name = 'json'
+
+    def loads(self, data):
+        """
+        Parse JSON from bytes (assumed UTF-8) or str.
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec parsing with orjson.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError('orjson is not installed')
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UJSONCodec(JSONCodec):
+    """
+    Codec parsing with ujson.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise RuntimeError('ujson is not installed')
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+_CODECS = {
+    'json': JSONCodec,
+    'orjson': OrjsonCodec,
+    'ujson': UJSONCodec,
+}
+
+DEFAULT_CODEC = JSONCodec()
+
+
+def get_json_codec(codec=None):
+    """
+    Return a JSONCodec.
+
+    codec - None for the standard library codec, 'auto' for the fastest
+        installed codec, the name of a codec ('json', 'orjson' or
+        'ujson'), or a JSONCodec instance, which is returned as is.
+    """
+    if codec is None:
+        return DEFAULT_CODEC
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec == 'auto':
+        if orjson is not None:
+            return OrjsonCodec()
+        if ujson is not None:
+            return UJSONCodec()
+        return DEFAULT_CODEC
+    try:
+        codec_class = _CODECS[codec]
+    except KeyError:
+        raise ValueError('unknown JSON codec {!r}'.format(codec))
+    return codec_class()
@@ -1,5 +1,33 @@
+from .dedup import DedupWindow
+from .exporter import LogExporter
+from .fetcher import LogFetcher
+from .sources import (
+    LOG_SOURCES,
+    ActivityLogSource,
+    AdministratorLogSource,
+    AuthenticationLogSource,
+    LogSource,
+    OfflineEnrollmentLogSource,
+    TelephonyLogSource,
+    TrustMonitorLogSource,
+    get_log_source,
+)
+from .tailer import LogTailer
 from .telephony import Telephony
 
 __all__ = [
-    'Telephony'
+    'LOG_SOURCES',
+    'ActivityLogSource',
+    'AdministratorLogSource',
+    'AuthenticationLogSource',
+    'DedupWindow',
+    'LogExporter',
+    'LogFetcher',
+    'LogSource',
+    'LogTailer',
+    'OfflineEnrollmentLogSource',
+    'Telephony',
+    'TelephonyLogSource',
+    'TrustMonitorLogSource',
+    'get_log_source',
 ]
@@ -0,0 +1,115 @@
+"""
+Bounded de-duplication of log events.
+
+Overlapping time windows, retries and re-reads from an inclusive mintime
+all deliver some events more than once. DedupWindow remembers the ids
+of recently seen events and drops repeats:
+
+    dedup = DedupWindow(max_size=500000, max_age=3600 * 1000)
+    for event in dedup.filter(events):
+        forward(event)
+
+Ids are kept as 64-bit hashes of the event's eventtype and id, so the
+window's memory is bounded by max_size whatever the ids look like.
+They are forgotten oldest event first, whatever order events arrive in,
+once there are more than max_size, or once they are more than max_age ms
+older than the newest event seen.
+"""
+import hashlib
+import heapq
+import itertools
+import threading
+from typing import Iterable, Iterator, Optional
+
+from duo_client.logs.sources import LOG_SOURCES
+
+# Log type -> LogSource used to find the id and time of its events.
+_EVENT_SOURCES = dict(
+    (log_type, source_class(None))
+    for (log_type, source_class) in LOG_SOURCES.items())
+
+
+class DedupWindow:
+    """
+    Set of recently seen log events, bounded by count and age. Safe to
+    share between threads.
+    """
+
+    def __init__(self, max_size: int = 100000, max_age: Optional[int] = None):
+        """
+        max_size - Number of event ids to remember.
+        max_age - Age in ms, relative to the newest event seen, after
+            which ids are forgotten. None to bound by count alone.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.max_age = max_age
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._keys = set()
+        # (event time, arrival, key) heap: events of the same time are
+        # forgotten in the order they were seen.
+        self._order = []
+        self._arrivals = itertools.count()
+        self._newest = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, event):
+        return self.key(event)[0] in self._keys
+
+    def key(self, event: dict):
+        """
+        Return (hashed id, time in ms) of event, which must be stamped
+        with its eventtype.
+        """
+        log_type = event["eventtype"]
+        source = _EVENT_SOURCES.get(log_type)
+        if source is None:
+            raise ValueError(f"Unsupported log type: {log_type}")
+        digest = hashlib.blake2b(
+            f"{log_type}\0{source.event_id(event)}".encode("utf-8"),
+            digest_size=8).digest()
+        return (int.from_bytes(digest, "big"), source.event_time(event))
+
+    def add(self, event: dict) -> bool:
+        """
+        Remember event. Return False if it has been seen already.
+        """
+        (key, event_time) = self.key(event)
+        with self._lock:
+            if key in self._keys:
+                self.duplicates += 1
+                return False
+            self._keys.add(key)
+            heapq.heappush(
+                self._order, (event_time, next(self._arrivals), key))
+            if self._newest is None or event_time > self._newest:
+                self._newest = event_time
+            self._evict()
+            return True
+
+    def _evict(self):
+        order = self._order
+        while len(order) > self.max_size:
+            self._keys.discard(heapq.heappop(order)[2])
+        if self.max_age is not None:
+            cutoff = self._newest - self.max_age
+            while order and order[0][0] < cutoff:
+                self._keys.discard(heapq.heappop(order)[2])
+
+    def filter(self, events: Iterable[dict]) -> Iterator[dict]:
+        """
+        Generator of the events not seen before.
+        """
+        for event in events:
+            if self.add(event):
+                yield event
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._order.clear()
+            self._newest = None
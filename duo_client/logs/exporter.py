@@ -0,0 +1,171 @@
+"""
+Time-sharded parallel export of logs.
+
+Log endpoints are filtered by mintime and maxtime, so a long time range
+can be split into windows that are paged through independently.
+LogExporter pages through each window on its own thread, all sharing one
+Admin client, and so that client's rate_limiter and
+concurrency_controller:
+
+    exporter = LogExporter(admin_api, "authentication", shards=16)
+    for event in exporter.iter_records(mintime, maxtime):
+        ...
+
+Windows do not overlap and are paged in ascending timestamp order, so
+the ordered output is each window's events in turn. Every window buffers
+at most buffer_pages pages ahead of the consumer. Trust monitor events
+cannot be sorted, so they can only be exported unordered.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+from duo_client.logs.sources import get_log_source
+
+_DONE = object()
+
+
+class LogExporter:
+    """
+    Export one log type over a time range, paging through time windows
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        admin,
+        log_type,
+        shards: int = 8,
+        workers: Optional[int] = None,
+        limit: int = 1000,
+        buffer_pages: int = 2,
+        dedup=None,
+        **filters,
+    ):
+        """
+        admin - Admin client used by every window. Its rate_limiter and
+            concurrency_controller bound the export as a whole.
+        log_type - A log type name or LogSource.
+        shards - Number of time windows to split a range into.
+        workers - Number of windows paged at once. Defaults to shards.
+        limit - Page size of each request, lowered to the source's
+            max_limit.
+        buffer_pages - Pages each window may fetch ahead of the consumer.
+        dedup - DedupWindow to drop events already exported, e.g. when
+            re-exporting overlapping ranges.
+        filters - Other parameters sent with every request, e.g. users
+            or results.
+        """
+        self.source = get_log_source(admin, log_type)
+        if buffer_pages < 1:
+            raise ValueError("buffer_pages must be at least 1")
+        self.admin = admin
+        self.log_type = self.source.log_type
+        self.shards = shards
+        self.workers = workers or shards
+        self.limit = limit
+        self.buffer_pages = buffer_pages
+        self.dedup = dedup
+        self.filters = filters
+
+    def _pages(self, mintime: int, maxtime: int, ascending: bool) -> Iterator[list]:
+        """
+        Generator of the pages of events in one window.
+        """
+        for (events, _) in self.source.pages(
+                mintime, maxtime, limit=min(self.limit, self.source.max_limit),
+                ascending=ascending,
+                **self.filters):
+            yield events
+
+    def iter_records(self, mintime: int, maxtime: int, ordered: bool = True) -> Iterator[dict]:
+        """
+        Generator of the events logged between mintime and maxtime
+        (inclusive, unix timestamps in ms).
+
+        ordered - Yield events in ascending timestamp order (True) or in
+            whichever order windows return them (False), which keeps
+            every worker busy. When ordered, later windows stop once they
+            have buffer_pages pages waiting, so raise buffer_pages to
+            trade memory for throughput.
+
+        Errors fetching any window are raised to the consumer. Closing
+        the generator stops the workers after their current request.
+        """
+        if ordered and not self.source.sortable:
+            raise ValueError(
+                f"{self.log_type} logs cannot be exported in order")
+        windows = self.source.windows(mintime, maxtime, self.shards)
+        stop = threading.Event()
+        if ordered:
+            queues = [queue.Queue(self.buffer_pages) for _ in windows]
+        else:
+            shared = queue.Queue(self.buffer_pages * len(windows))
+            queues = [shared] * len(windows)
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch(window, q):
+            if stop.is_set():
+                return
+            pages = self._pages(window[0], window[1], ordered)
+            try:
+                for page in pages:
+                    if not put(q, (page, None)):
+                        return
+                put(q, (_DONE, None))
+            except BaseException as e:
+                put(q, (None, e))
+            finally:
+                pages.close()
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.workers, len(windows)),
+            thread_name_prefix="duo-log-export",
+        )
+        try:
+            for (window, q) in zip(windows, queues):
+                executor.submit(fetch, window, q)
+            if ordered:
+                for q in queues:
+                    yield from self._drain(q, 1)
+            else:
+                yield from self._drain(shared, len(windows))
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def _drain(self, q: queue.Queue, windows: int) -> Iterator[dict]:
+        """
+        Yield the records put on q until windows windows have finished.
+        """
+        while windows:
+            (page, error) = q.get()
+            if error is not None:
+                raise error
+            if page is _DONE:
+                windows -= 1
+                continue
+            if self.dedup is not None:
+                page = self.dedup.filter(page)
+            yield from page
+
+    def export(self, mintime: int, maxtime: int, sink: Callable[[dict], None],
+               ordered: bool = False) -> int:
+        """
+        Pass each event logged between mintime and maxtime to sink, on
+        the calling thread, and return the number of events exported.
+        """
+        count = 0
+        for record in self.iter_records(mintime, maxtime, ordered=ordered):
+            sink(record)
+            count += 1
+        return count
@@ -0,0 +1,143 @@
+"""
+Concurrent fetching of several log types.
+
+LogFetcher pages through each log type on its own thread, all sharing
+one Admin client, so a fetch takes about as long as its slowest log
+type rather than the sum of them all. The client's rate_limiter and
+concurrency_controller bound the requests of all log types together:
+
+    fetcher = LogFetcher(admin_api, [
+        LogTailer(admin_api, "authentication", checkpoint_path=...),
+        LogTailer(admin_api, "administrator", checkpoint_path=...),
+    ])
+    while True:
+        fetcher.fetch(callback=forward)
+        time.sleep(60)
+
+LogTailers are polled for their new events. Log types given as names or
+LogSources are fetched over mintime and maxtime, by default each
+source's default_times() (the last 180 days), so a loop fetching them
+should pass the window to fetch:
+
+    fetcher = LogFetcher(admin_api, ["trust_monitor"])
+    fetcher.fetch(callback=forward, mintime=last_maxtime + 1,
+                  maxtime=now_ms)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from duo_client.logs.sources import get_log_source
+from duo_client.logs.tailer import LogTailer
+
+DEFAULT_LOG_TYPES = (
+    "administrator",
+    "authentication",
+    "telephony",
+    "activity",
+    "trust_monitor",
+)
+
+
+class LogFetcher:
+    """
+    Fetch several log types concurrently.
+    """
+
+    def __init__(self, admin, log_types=DEFAULT_LOG_TYPES, workers: Optional[int] = None,
+                 dedup=None, limit: int = 1000):
+        """
+        admin - Admin client shared by every log type.
+        log_types - Log type names, LogSources or LogTailers. Each must be
+            a different log type.
+        workers - Number of log types fetched at once. Defaults to all.
+        dedup - DedupWindow to drop events already fetched, e.g. by an
+            earlier fetch of an overlapping range.
+        limit - Page size of each request for log types that are not
+            tailers, lowered to each source's max_limit.
+        """
+        self.admin = admin
+        self.streams = []
+        for log_type in log_types:
+            if not isinstance(log_type, LogTailer):
+                log_type = get_log_source(admin, log_type)
+            self.streams.append(log_type)
+        names = [stream.log_type for stream in self.streams]
+        if len(set(names)) != len(names):
+            raise ValueError("Each log type may only be fetched once")
+        self.workers = workers or len(self.streams)
+        self.dedup = dedup
+        self.limit = limit
+
+    def _events(self, stream, mintime, maxtime):
+        if isinstance(stream, LogTailer):
+            events = stream.poll()
+        else:
+            events = stream.iter_events(
+                mintime, maxtime, prefetch=0,
+                limit=min(self.limit, stream.max_limit))
+        if self.dedup is not None:
+            events = self.dedup.filter(events)
+        return events
+
+    def fetch(
+        self,
+        callback: Optional[Callable[[str, dict], None]] = None,
+        output=None,
+        mintime: Optional[int] = None,
+        maxtime: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Fetch every log type and return the number of events of each.
+
+        Pass exactly one of:
+        callback - Called with (log_type, event) for each event, on the
+            thread fetching that log type. Calls for one log type are
+            made in order and never at the same time, but calls for
+            different log types may be.
+        output - A queue.Queue to put (log_type, event) on for each event,
+            then (log_type, None) once that log type is finished. A
+            bounded queue holds the fetch back to the consumer's pace.
+
+        mintime, maxtime - Range to fetch log types that are not
+            tailers over, in unix ms. Defaults to each source's
+            default_times().
+
+        Every log type is fetched even if another fails. The first error
+        is then raised.
+        """
+        if (callback is None) == (output is None):
+            raise ValueError("Pass one of callback or output")
+
+        def run(stream):
+            log_type = stream.log_type
+            count = 0
+            try:
+                for event in self._events(stream, mintime, maxtime):
+                    if callback is not None:
+                        callback(log_type, event)
+                    else:
+                        output.put((log_type, event))
+                    count += 1
+            finally:
+                if output is not None:
+                    output.put((log_type, None))
+            return count
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.workers, len(self.streams)),
+            thread_name_prefix="duo-log-fetch",
+        ) as executor:
+            futures = [(stream.log_type, executor.submit(run, stream))
+                       for stream in self.streams]
+
+        counts = {}
+        error = None
+        for (log_type, future) in futures:
+            if future.exception() is not None:
+                if error is None:
+                    error = future.exception()
+            else:
+                counts[log_type] = future.result()
+        if error is not None:
+            raise error
+        return counts
@@ -0,0 +1,388 @@
+"""
+One interface over every Admin API log type.
+
+A LogSource knows a log type's endpoint, how its responses are paged,
+where each event's time and id are, and how events are tagged with
+eventtype and host. The exporter, tailer and fetcher take any source:
+
+    source = get_log_source(admin_api, "authentication")
+    for event in source.iter_events(mintime, maxtime):
+        ...
+
+All times are unix timestamps in milliseconds, including for v1
+endpoints, which are queried in seconds.
+
+Pages of events logged long enough ago no longer change. A source given
+a page_cache keeps them, so reruns over the same range are answered
+from disk:
+
+    store = duo_client.sqlite_cache.SQLiteCache("logs.db")
+    source = get_log_source(admin_api, "authentication", page_cache=store)
+"""
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from duo_client.cache import MISS
+from duo_client.client import (
+    canon_params,
+    next_cursor,
+    normalize_params,
+    prefetch_pages,
+)
+from duo_client.util import get_default_request_times, get_log_uri
+
+# Age in ms after which logged events are taken to be final.
+DEFAULT_SETTLE_TIME = 3600 * 1000
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def split_time_range(mintime: int, maxtime: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Split the inclusive millisecond range [mintime, maxtime] into at most
+    shards inclusive windows that do not overlap.
+    """
+    mintime = int(mintime)
+    maxtime = int(maxtime)
+    if maxtime < mintime:
+        raise ValueError("maxtime must not be before mintime")
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    span = maxtime - mintime + 1
+    shards = min(shards, span)
+    windows = []
+    start = mintime
+    for i in range(shards):
+        end = mintime + span * (i + 1) // shards - 1
+        windows.append((start, end))
+        start = end + 1
+    return windows
+
+
+def iso_time_ms(ts: str) -> int:
+    """
+    Return an ISO 8601 timestamp as a unix timestamp in ms.
+    """
+    if ts.endswith("Z"):
+        ts = ts[:-1] + "+00:00"
+    # Before Python 3.11, fromisoformat() only takes fractions of 3 or 6
+    # digits.
+    ts = _FRACTION_RE.sub(
+        lambda m: "." + m.group(1)[:6].ljust(6, "0"), ts, count=1)
+    dt = datetime.fromisoformat(ts)
+    return (int(dt.replace(microsecond=0).timestamp()) * 1000
+            + dt.microsecond // 1000)
+
+
+class LogSource:
+    """
+    Base class for the log types of the Admin API.
+
+    log_type - Name of the log type, and the eventtype of its events.
+    path - Endpoint of the log type.
+    records_key - Key of the events in each response, or None if the
+        response is the list of events.
+    id_key - Key of the unique id of each event, or None.
+    offset_param - Request parameter carrying the paging cursor.
+    sortable - True if events can be requested oldest first.
+    max_limit - Largest page size the endpoint serves.
+    """
+    log_type = None
+    path = None
+    records_key = None
+    id_key = None
+    offset_param = "next_offset"
+    sortable = True
+    max_limit = 1000
+
+    def __init__(self, admin, page_cache=None, settle_time: int = DEFAULT_SETTLE_TIME):
+        """
+        admin - Admin client to fetch events with.
+        page_cache - A duo_client.sqlite_cache.SQLiteCache to keep pages
+            of settled events in, or None.
+        settle_time - Age in ms after which events are settled, and
+            pages of them kept for good.
+        """
+        self.admin = admin
+        self.page_cache = page_cache
+        self.settle_time = settle_time
+
+    def settled(self, event_time: int) -> bool:
+        """
+        Return True if no more events logged at event_time are expected.
+        """
+        return event_time < time.time() * 1000 - self.settle_time
+
+    def cached_call(self, params: dict, call, cacheable):
+        """
+        Return call(params), from page_cache when it was kept there.
+        Results for which cacheable(result) is true are kept.
+        """
+        cache = self.page_cache
+        if cache is None:
+            return call(params)
+        key = json.dumps([
+            self.admin.host, getattr(self.admin, "account_id", None),
+            self.path, canon_params(normalize_params(params))])
+        result = cache.get(self.log_type, key)
+        if result is MISS:
+            result = call(params)
+            if cacheable(result):
+                cache.put(self.log_type, key, result)
+        return result
+
+    def _get_page(self, params):
+        return self.admin._fetch_page("GET", self.path, params)
+
+    def default_times(self) -> Tuple[int, int]:
+        """
+        Return the (mintime, maxtime) used when a caller gives none.
+        """
+        return get_default_request_times()
+
+    def windows(self, mintime: int, maxtime: int, shards: int) -> List[Tuple[int, int]]:
+        return split_time_range(mintime, maxtime, shards)
+
+    def event_time(self, event: dict) -> int:
+        """
+        Return the time of event in ms.
+        """
+        raise NotImplementedError
+
+    def event_id(self, event: dict):
+        """
+        Return a value identifying event among all events of the type.
+        """
+        return event.get(self.id_key)
+
+    def stamp(self, events: list) -> list:
+        """
+        Tag events with their eventtype and the host they came from.
+        """
+        host = self.admin.host
+        for event in events:
+            event["eventtype"] = self.log_type
+            event["host"] = host
+        return events
+
+    def get_records(self, response) -> list:
+        if self.records_key is None:
+            return response
+        return response[self.records_key]
+
+    def get_next_offset(self, response, metadata):
+        """
+        Return the cursor of the page after response, or None.
+        """
+        return next_cursor(response, response.get("metadata", {}))
+
+    def build_params(self, mintime: int, maxtime: int, limit: Optional[int] = None,
+                     ascending: bool = False, **filters) -> dict:
+        params = {}
+        for (k, v) in filters.items():
+            if v is not None:
+                params[k] = v
+        params["mintime"] = f"{int(mintime)}"
+        params["maxtime"] = f"{int(maxtime)}"
+        if limit is not None:
+            params["limit"] = f"{int(limit)}"
+        if ascending:
+            params["sort"] = "ts:asc"
+        return params
+
+    def pages(self, mintime: int, maxtime: int, limit: Optional[int] = None,
+              next_offset=None, ascending: bool = False,
+              **filters) -> Iterator[Tuple[list, object]]:
+        """
+        Generator of (events, next_offset) for each page of events logged
+        between mintime and maxtime, inclusive. next_offset resumes after
+        the page when passed back in, and is None on the last page.
+
+        ascending - Request events oldest first. Requires sortable.
+        """
+        if ascending and not self.sortable:
+            raise ValueError(f"{self.log_type} logs cannot be sorted")
+        params = self.build_params(
+            mintime, maxtime, limit, ascending=ascending, **filters)
+        fetch_page = None
+        if self.settled(int(maxtime)):
+            def fetch_page(params):
+                return self.cached_call(
+                    params, self._get_page, lambda page: True)
+        yield from self.admin._json_cursor_pages(
+            "GET", self.path, params,
+            lambda response: self.stamp(self.get_records(response)),
+            offset_param=self.offset_param,
+            get_next_offset_func=self.get_next_offset,
+            next_offset=next_offset,
+            fetch_page=fetch_page)
+
+    def iter_events(self, mintime: Optional[int] = None, maxtime: Optional[int] = None,
+                    prefetch: Optional[int] = None, **kwargs) -> Iterator[dict]:
+        """
+        Generator of the events logged between mintime and maxtime,
+        inclusive, which default to default_times().
+
+        prefetch - Number of pages to fetch in the background ahead of
+            the caller. Defaults to the client's paging_prefetch.
+        kwargs - Passed to pages().
+        """
+        (default_mintime, default_maxtime) = self.default_times()
+        if mintime is None:
+            mintime = default_mintime
+        if maxtime is None:
+            maxtime = default_maxtime
+        if prefetch is None:
+            prefetch = self.admin.paging_prefetch
+        pages = self.pages(mintime, maxtime, **kwargs)
+        for (events, _) in prefetch_pages(pages, prefetch):
+            yield from events
+
+
+class AuthenticationLogSource(LogSource):
+    log_type = "authentication"
+    path = get_log_uri("authentication", 2)
+    records_key = "authlogs"
+    id_key = "txid"
+
+    def event_time(self, event):
+        return int(event["timestamp"]) * 1000
+
+
+class ActivityLogSource(LogSource):
+    log_type = "activity"
+    path = get_log_uri("activity", 2)
+    records_key = "items"
+    id_key = "activity_id"
+
+    def event_time(self, event):
+        return iso_time_ms(event["ts"])
+
+
+class TelephonyLogSource(LogSource):
+    log_type = "telephony"
+    path = get_log_uri("telephony", 2)
+    records_key = "items"
+    id_key = "telephony_id"
+
+    def event_time(self, event):
+        return iso_time_ms(event["ts"])
+
+
+class TrustMonitorLogSource(LogSource):
+    log_type = "trust_monitor"
+    path = "/admin/v1/trust_monitor/events"
+    records_key = "events"
+    id_key = "sekey"
+    offset_param = "offset"
+    sortable = False
+    max_limit = 200
+
+    def event_time(self, event):
+        return int(event["surfaced_timestamp"])
+
+    def get_next_offset(self, response, metadata):
+        return next_cursor(response, metadata)
+
+
+class V1LogSource(LogSource):
+    """
+    Base class for v1 logs, which take mintime in seconds, no maxtime or
+    cursor, and return at most page_size events, oldest first. Pages
+    after the first start at the second of the last event, skipping the
+    events already returned.
+    """
+    page_size = 1000
+
+    def _full_and_settled(self, records):
+        # Only full pages are final: a short one may still grow.
+        return (len(records) == self.page_size
+                and self.settled(self.event_time(records[-1])))
+
+    def _get_records(self, params):
+        return self.admin.json_api_call("GET", self.path, params)
+
+    def event_time(self, event):
+        return int(event["timestamp"]) * 1000
+
+    def event_id(self, event):
+        # v1 events have no id: identify them by their content.
+        content = dict((k, v) for (k, v) in event.items()
+                       if k not in ("eventtype", "host"))
+        return hashlib.blake2b(
+            json.dumps(content, sort_keys=True).encode("utf-8"),
+            digest_size=16).hexdigest()
+
+    def pages(self, mintime, maxtime, limit=None, next_offset=None,
+              ascending=False, **filters):
+        mintime = int(mintime)
+        maxtime = int(maxtime)
+        params = {"mintime": f"{mintime // 1000}"}
+        seen = set()
+        while True:
+            records = self.cached_call(
+                params, self._get_records, self._full_and_settled)
+            page = []
+            done = len(records) < self.page_size
+            for event in records:
+                event_time = self.event_time(event)
+                if event_time < mintime:
+                    continue
+                if event_time > maxtime:
+                    done = True
+                    break
+                if self.event_id(event) not in seen:
+                    page.append(event)
+            if not done and not page:
+                # A full page of events already returned: the rest of
+                # the second cannot be reached.
+                done = True
+            if not done:
+                last = int(records[-1]["timestamp"])
+                params["mintime"] = f"{last}"
+                seen = set(self.event_id(event) for event in records
+                           if int(event["timestamp"]) == last)
+            yield (self.stamp(page), None)
+            if done:
+                break
+
+
+class AdministratorLogSource(V1LogSource):
+    log_type = "administrator"
+    path = get_log_uri("administrator", 1)
+
+
+class OfflineEnrollmentLogSource(V1LogSource):
+    log_type = "offline_enrollment"
+    path = get_log_uri("offline_enrollment", 1)
+
+
+LOG_SOURCES = dict((source.log_type, source) for source in (
+    AuthenticationLogSource,
+    ActivityLogSource,
+    TelephonyLogSource,
+    TrustMonitorLogSource,
+    AdministratorLogSource,
+    OfflineEnrollmentLogSource,
+))
+
+
+def get_log_source(admin, source, **kwargs) -> LogSource:
+    """
+    Return a LogSource.
+
+    source - A log type in LOG_SOURCES, or a LogSource, which is
+        returned as is.
+    kwargs - Passed to the LogSource, e.g. page_cache.
+    """
+    if isinstance(source, LogSource):
+        return source
+    try:
+        source_class = LOG_SOURCES[source]
+    except KeyError:
+        raise ValueError(f"Unsupported log type: {source}")
+    return source_class(admin, **kwargs)
@@ -0,0 +1,143 @@
+"""
+Incremental tailing of logs with durable checkpoints.
+
+LogTailer polls one log type and yields only events it has not
+yielded before, saving its position to a checkpoint file so a restarted
+forwarder carries on where it left off:
+
+    tailer = LogTailer(admin_api, "authentication",
+                       checkpoint_path="/var/lib/forwarder/authlog.json")
+    for event in tailer.tail(interval=60):
+        forward(event)
+
+The checkpoint holds the v2 next_offset cursor of the page being walked,
+the timestamp of the newest event yielded and the ids of the events
+sharing that timestamp. Each poll re-reads from that timestamp
+inclusively and drops the events already yielded, so events logged in
+the same millisecond are neither lost nor repeated. The checkpoint is
+saved, atomically, once the caller has consumed each page: an event is
+yielded again after a crash only if its page had not been finished.
+"""
+import json
+import os
+import time
+from typing import Iterator, Optional
+
+from duo_client.logs.sources import get_log_source
+from duo_client.util import write_json_atomic
+
+
+class LogTailer:
+    """
+    Poll a log type for new events.
+    """
+
+    def __init__(
+        self,
+        admin,
+        log_type,
+        checkpoint_path: Optional[str] = None,
+        mintime: Optional[int] = None,
+        lag: int = 120,
+        limit: int = 1000,
+        **filters,
+    ):
+        """
+        admin - Admin client to poll with.
+        log_type - A log type name or LogSource, which must be
+            sortable.
+        checkpoint_path - File to save the tailer's position to, and to
+            resume from if it exists. Without one, the position is only
+            kept in memory.
+        mintime - Unix timestamp in ms to start from when there is no
+            checkpoint. Defaults to lag seconds ago, i.e. new events only.
+        lag - Seconds behind now to poll up to. Events can take a couple
+            of minutes to become available to the API.
+        limit - Page size of each request.
+        filters - Other parameters sent with every request.
+        """
+        self.source = get_log_source(admin, log_type)
+        if not self.source.sortable:
+            raise ValueError(
+                f"{self.source.log_type} logs cannot be tailed in order")
+        self.admin = admin
+        self.log_type = self.source.log_type
+        self.checkpoint_path = checkpoint_path
+        self.lag = lag
+        self.limit = limit
+        self.filters = filters
+        self.state = None
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                self.state = json.load(f)
+        if self.state is None:
+            if mintime is None:
+                mintime = self._now_ms()
+            self.state = {
+                "mintime": int(mintime),
+                "maxtime": None,
+                "next_offset": None,
+                "last_time": None,
+                "last_ids": [],
+            }
+
+    def _now_ms(self) -> int:
+        return int((time.time() - self.lag) * 1000)
+
+    def save(self) -> None:
+        """
+        Save the position to checkpoint_path, if there is one.
+        """
+        if self.checkpoint_path is not None:
+            write_json_atomic(self.checkpoint_path, self.state)
+
+    def poll(self) -> Iterator[dict]:
+        """
+        Generator of the events logged since the last poll, oldest first.
+        """
+        state = self.state
+        if state["next_offset"] is None:
+            # Start a new walk from the newest event yielded, inclusive,
+            # or after the last walk if it found nothing.
+            if state["last_time"] is not None:
+                state["mintime"] = state["last_time"]
+            elif state["maxtime"] is not None:
+                state["mintime"] = state["maxtime"] + 1
+            state["maxtime"] = self._now_ms()
+            if state["maxtime"] < state["mintime"]:
+                return
+
+        source = self.source
+        pages = source.pages(
+            state["mintime"], state["maxtime"], limit=self.limit,
+            next_offset=state["next_offset"], ascending=True, **self.filters)
+        try:
+            for (events, next_offset) in pages:
+                for event in events:
+                    event_time = source.event_time(event)
+                    event_id = source.event_id(event)
+                    last_time = state["last_time"]
+                    if last_time is not None:
+                        if event_time < last_time:
+                            continue
+                        if event_time == last_time:
+                            if event_id in state["last_ids"]:
+                                continue
+                            state["last_ids"].append(event_id)
+                    if last_time is None or event_time > last_time:
+                        state["last_time"] = event_time
+                        state["last_ids"] = [event_id]
+                    yield event
+                state["next_offset"] = next_offset
+                self.save()
+        finally:
+            pages.close()
+
+    def tail(self, interval: float = 60) -> Iterator[dict]:
+        """
+        Generator of new events, polling every interval seconds forever.
+        """
+        while True:
+            started = time.monotonic()
+            yield from self.poll()
+            time.sleep(max(0, interval - (time.monotonic() - started)))
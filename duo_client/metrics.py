@@ -0,0 +1,195 @@
+"""
+Prometheus metrics for Duo API client traffic.
+
+ClientMetrics is a request hook that counts requests, errors, rate
+limited responses and retries, and records latency and body sizes. Add
+it to every client whose traffic should be reported, then serve
+render() from the application's metrics endpoint:
+
+    metrics = duo_client.metrics.ClientMetrics()
+    admin_api = duo_client.Admin(..., request_hooks=[metrics])
+    ...
+    body = metrics.render()  # with Content-Type: metrics.CONTENT_TYPE
+
+Series are labeled by host, method and endpoint, where endpoint is the
+request path with ids replaced by {id}.
+"""
+import collections
+import threading
+
+from .instrumentation import RequestHook
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_LABELS = ('host', 'method', 'endpoint')
+
+
+def _escape_label_value(value):
+    return (str(value).replace('\\', '\\\\')
+            .replace('\n', '\\n').replace('"', '\\"'))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape_label_value(value))
+        for (name, value) in zip(names, values))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of observed values.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for (i, bound) in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """
+        Return (upper bound, count of observations <= bound) pairs,
+        ending with +Inf.
+        """
+        result = []
+        total = 0
+        for (bound, count) in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float('inf'), self.count))
+        return result
+
+
+class ClientMetrics(RequestHook):
+    """
+    Request hook collecting Prometheus metrics for Duo API calls.
+
+    One instance may be shared by many clients and threads.
+    """
+
+    def __init__(self, prefix='duo_client', latency_buckets=None):
+        """
+        prefix - Prefix for the metric names.
+        latency_buckets - Upper bounds, in seconds, of the request
+            duration histogram buckets.
+        """
+        if latency_buckets is None:
+            latency_buckets = DEFAULT_LATENCY_BUCKETS
+        self.prefix = prefix
+        self.latency_buckets = latency_buckets
+        self._lock = threading.Lock()
+        self._requests = collections.Counter()
+        self._errors = collections.Counter()
+        self._rate_limited = collections.Counter()
+        self._retries = collections.Counter()
+        self._request_bytes = collections.Counter()
+        self._response_bytes = collections.Counter()
+        self._backoff = collections.Counter()
+        self._latency = {}
+
+    def on_request_end(self, timing):
+        labels = (timing.host or '', timing.method, timing.path_template)
+        if timing.status is None:
+            status = 'error'
+        else:
+            status = str(timing.status)
+        with self._lock:
+            self._requests[labels + (status,)] += 1
+            if timing.error is not None or (
+                    timing.status is not None and timing.status >= 400):
+                self._errors[labels] += 1
+            self._rate_limited[labels] += timing.rate_limited
+            self._retries[labels] += timing.retries
+            self._request_bytes[labels] += timing.request_bytes
+            self._response_bytes[labels] += timing.response_bytes
+            self._backoff[labels] += timing.backoff_time
+            histogram = self._latency.get(labels)
+            if histogram is None:
+                histogram = self._latency[labels] = Histogram(
+                    self.latency_buckets)
+            histogram.observe(timing.total_time)
+
+    def clear(self):
+        """
+        Reset all metrics.
+        """
+        with self._lock:
+            for counter in (self._requests, self._errors,
+                            self._rate_limited, self._retries,
+                            self._request_bytes, self._response_bytes,
+                            self._backoff):
+                counter.clear()
+            self._latency.clear()
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def counter(name, help_text, values, labels=_LABELS):
+            name = '%s_%s' % (self.prefix, name)
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s counter' % name)
+            for (key, value) in sorted(values.items()):
+                lines.append('%s%s %s' % (
+                    name, _format_labels(labels, key), _format_value(value)))
+
+        with self._lock:
+            counter('requests_total',
+                    'API calls made, by final HTTP status.',
+                    self._requests, _LABELS + ('status',))
+            counter('request_errors_total',
+                    'API calls that failed or ended with an HTTP error.',
+                    self._errors)
+            counter('rate_limited_total',
+                    'Attempts answered with 429 Too Many Requests.',
+                    self._rate_limited)
+            counter('retries_total',
+                    'Attempts retried after a failure.',
+                    self._retries)
+            counter('backoff_seconds_total',
+                    'Seconds spent waiting between retries.',
+                    self._backoff)
+            counter('request_bytes_total',
+                    'Request body bytes sent.',
+                    self._request_bytes)
+            counter('response_bytes_total',
+                    'Response body bytes received.',
+                    self._response_bytes)
+
+            name = '%s_request_duration_seconds' % self.prefix
+            lines.append('# HELP %s Duration of API calls, including '
+                         'retries.' % name)
+            lines.append('# TYPE %s histogram' % name)
+            for (key, histogram) in sorted(self._latency.items()):
+                for (bound, count) in histogram.cumulative_counts():
+                    lines.append('%s_bucket%s %d' % (
+                        name,
+                        _format_labels(_LABELS + ('le',),
+                                       key + (_format_value(bound),)),
+                        count))
+                labels = _format_labels(_LABELS, key)
+                lines.append('%s_sum%s %s' % (
+                    name, labels, _format_value(histogram.sum)))
+                lines.append('%s_count%s %d' % (name, labels, histogram.count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,125 @@
+"""
+Client-side rate limiting for Duo API requests.
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens are added at rate per second up to burst. Each request takes
+    one token, so a full bucket allows a burst of requests followed by a
+    steady rate. A single bucket may be shared by several clients (and
+    threads) that talk to the same account.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        rate - Tokens added per second.
+        burst - Maximum number of tokens held. Defaults to rate, or 1 if
+            rate is less than 1.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if burst is None:
+            burst = max(1, rate)
+        if burst < 1:
+            raise ValueError('burst must be at least 1')
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def take(self, tokens=1):
+        """
+        Take tokens if they are available. Returns 0 if they were taken,
+        otherwise the number of seconds until they will be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            return self._take_locked(tokens)
+
+    def _take_locked(self, tokens):
+        if tokens > self.burst:
+            raise ValueError('cannot take more than burst tokens')
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+        return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Block until tokens can be taken. Returns True once they are, or
+        False if that would take longer than timeout seconds.
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while True:
+            wait = self.take(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    return False
+            time.sleep(wait)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a local file, so that processes
+    on the same host share one limit.
+
+    The file is locked with fcntl.flock() while it is updated, which
+    makes this class unavailable on platforms without fcntl.
+    """
+
+    def __init__(self, path, rate, burst=None):
+        """
+        path - File holding the bucket state. It is created if needed.
+        rate, burst - As for TokenBucket.
+        """
+        if fcntl is None:
+            raise RuntimeError('FileTokenBucket requires fcntl')
+        super(FileTokenBucket, self).__init__(rate, burst)
+        self.path = path
+
+    def take(self, tokens=1):
+        with self._lock:
+            return self._take_shared(tokens)
+
+    def _take_shared(self, tokens):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Wall clock time, unlike TokenBucket, as the state is shared
+            # between processes.
+            now = time.time()
+            state = os.read(fd, 64).split()
+            if len(state) == 2:
+                (saved_tokens, updated) = (float(v) for v in state)
+                elapsed = max(0.0, now - updated)
+                self._tokens = min(
+                    self.burst, saved_tokens + elapsed * self.rate)
+            else:
+                self._tokens = self.burst
+            wait = self._take_locked(tokens)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, ('%r %r' % (self._tokens, now)).encode('ascii'))
+            return wait
+        finally:
+            os.close(fd)
@@ -0,0 +1,176 @@
+"""
+Retry policies for Duo API requests.
+"""
+import asyncio
+import email.utils
+import http.client
+import random
+import socket
+import time
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+SERVER_ERROR_STATUSES = frozenset([500, 502, 503, 504])
+CONNECTION_ERRORS = (
+    ConnectionError,
+    http.client.BadStatusLine,
+    http.client.IncompleteRead,
+    socket.timeout,
+    asyncio.IncompleteReadError,
+    asyncio.TimeoutError,
+)
+
+
+def parse_retry_after(value, now=None):
+    """
+    Return the number of seconds a Retry-After header value asks the
+    client to wait, or None if the value cannot be parsed. The value is
+    either a number of seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, date.timestamp() - now)
+
+
+def parse_rate_limit_reset(value, now=None):
+    """
+    Return the number of seconds until a RateLimit-Reset or
+    X-RateLimit-Reset header says the limit resets, or None. Large values
+    are taken to be a unix timestamp rather than a number of seconds.
+    """
+    if value is None:
+        return None
+    try:
+        reset = float(value.strip())
+    except ValueError:
+        return None
+    if reset > 1e9:
+        if now is None:
+            now = time.time()
+        reset = reset - now
+    return max(0.0, reset)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed request is retried.
+
+    The defaults reproduce the client's historical behavior: only
+    rate limited (429) responses are retried, with exponential backoff
+    from initial_backoff_wait_secs, multiplied by backoff_factor up to
+    max_backoff_wait_secs, plus up to jitter seconds of random delay.
+    Unlike before, a Retry-After or rate limit reset header on the
+    response is honored instead of the computed backoff, waiting at most
+    max_retry_after seconds.
+
+    Subclasses can override get_delay() for entirely custom behavior.
+    """
+
+    def __init__(self,
+                 max_backoff_wait_secs=32,
+                 initial_backoff_wait_secs=1,
+                 backoff_factor=2,
+                 jitter=1.0,
+                 retry_statuses=(429,),
+                 respect_retry_after=True,
+                 retry_server_errors=False,
+                 retry_connection_errors=False,
+                 deadline=None,
+                 max_retry_after=None):
+        """
+        max_backoff_wait_secs - Stop retrying once the exponential backoff
+            would exceed this many seconds.
+        initial_backoff_wait_secs - Backoff before the first retry.
+        backoff_factor - Multiplier applied to the backoff on each retry.
+        jitter - Maximum random seconds added to each computed backoff.
+        retry_statuses - HTTP statuses that are retried for any method.
+        respect_retry_after - Wait as long as Retry-After, RateLimit-Reset
+            or X-RateLimit-Reset response headers ask for.
+        retry_server_errors - Also retry 500, 502, 503 and 504 responses
+            to idempotent (GET, HEAD, OPTIONS) requests.
+        retry_connection_errors - Also retry idempotent requests that
+            fail with a connection reset, dropped connection or timeout.
+        deadline - Total seconds, across all attempts and waits, after
+            which no further retries are made.
+        max_retry_after - Longest wait, in seconds, that response headers
+            can ask for. Defaults to max_backoff_wait_secs.
+        """
+        self.max_backoff_wait_secs = max_backoff_wait_secs
+        self.initial_backoff_wait_secs = initial_backoff_wait_secs
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.retry_server_errors = retry_server_errors
+        self.retry_connection_errors = retry_connection_errors
+        self.deadline = deadline
+        if max_retry_after is None:
+            max_retry_after = max_backoff_wait_secs
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, method, response=None, error=None):
+        """
+        Return True if a request with this outcome may be retried.
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if error is not None:
+            return (self.retry_connection_errors and idempotent and
+                    isinstance(error, CONNECTION_ERRORS))
+        if response.status in self.retry_statuses:
+            return True
+        return (self.retry_server_errors and idempotent and
+                response.status in SERVER_ERROR_STATUSES)
+
+    def get_server_delay(self, response):
+        """
+        Return the delay requested by the response's headers, or None.
+        """
+        getheader = getattr(response, 'getheader', None)
+        if getheader is None:
+            return None
+        delay = parse_retry_after(getheader('Retry-After'))
+        if delay is None:
+            delay = parse_rate_limit_reset(getheader('RateLimit-Reset'))
+        if delay is None:
+            delay = parse_rate_limit_reset(getheader('X-RateLimit-Reset'))
+        return delay
+
+    def get_delay(self, method, attempt, elapsed, response=None, error=None):
+        """
+        Return the number of seconds to wait before the next attempt, or
+        None if the request should not be retried.
+
+        method - HTTP method of the request.
+        attempt - Number of attempts made so far, starting at 1.
+        elapsed - Seconds since the first attempt started.
+        response - The response to the last attempt, if there was one.
+        error - The exception raised by the last attempt, if any.
+        """
+        if not self.is_retryable(method, response=response, error=error):
+            return None
+        backoff = (self.initial_backoff_wait_secs *
+                   self.backoff_factor ** (attempt - 1))
+        if backoff > self.max_backoff_wait_secs:
+            return None
+        delay = None
+        if response is not None and self.respect_retry_after:
+            delay = self.get_server_delay(response)
+            if delay is not None:
+                delay = min(delay, self.max_retry_after)
+        if delay is None:
+            delay = backoff + random.uniform(0.0, self.jitter)  # noqa: DUO102, non-cryptographic random use
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
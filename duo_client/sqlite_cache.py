@@ -0,0 +1,211 @@
+"""
+Persistent cache of API responses in an SQLite database.
+
+An SQLiteCache keeps responses on disk between runs, and is shared by
+every process that opens the same file, so short-lived jobs do not
+start cold:
+
+    store = duo_client.sqlite_cache.SQLiteCache('/var/cache/duo.db')
+    admin_api = duo_client.Admin(
+        ..., entity_cache=duo_client.cache.EntityCache(backend=store))
+    mirror = duo_client.directory.DirectoryMirror(admin_api, store=store)
+    mirror.refresh(max_age=3600)
+
+Log pages can also be kept, see duo_client.logs.LogSource.
+
+The database is in WAL mode, so any number of processes can read while
+one writes. Expired entries are ignored but stay on disk until the
+database is compacted:
+
+    python -m duo_client.sqlite_cache compact /var/cache/duo.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from .cache import MISS
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' namespace TEXT NOT NULL,'
+    ' key TEXT NOT NULL,'
+    ' value TEXT NOT NULL,'
+    ' stored REAL NOT NULL,'
+    ' expires REAL,'
+    ' PRIMARY KEY (namespace, key))',
+    'CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)',
+)
+
+
+class SQLiteCache(object):
+    """
+    Key-value store of JSON values with optional TTLs, grouped into
+    namespaces. Safe to share between threads; each thread uses its own
+    connection.
+    """
+
+    def __init__(self, path, timeout=30):
+        """
+        path - Database file, created if it does not exist.
+        timeout - Seconds to wait for another process's write to finish.
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Thread -> its connection in this process.
+        self._connections = {}
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self):
+        # Connections must not be used across a fork, so each process
+        # opens its own.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None,
+                check_same_thread=False)
+            local.conn.execute('PRAGMA synchronous=NORMAL')
+            local.pid = os.getpid()
+            with self._lock:
+                # Close the connections of threads that have exited, so
+                # thread churn does not leak file descriptors.
+                for (thread, conn) in list(self._connections.items()):
+                    if not thread.is_alive():
+                        del self._connections[thread]
+                        conn.close()
+                self._connections[threading.current_thread()] = local.conn
+        return local.conn
+
+    def get_entry(self, namespace, key):
+        """
+        Return (value, stored, expires) for key, or None if it is missing
+        or expired. Times are unix times; expires is None for entries
+        that never expire.
+        """
+        row = self._connection().execute(
+            'SELECT value, stored, expires FROM entries'
+            ' WHERE namespace = ? AND key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (namespace, key, time.time())).fetchone()
+        if row is None:
+            return None
+        return (json.loads(row[0]), row[1], row[2])
+
+    def get(self, namespace, key):
+        """
+        Return the value of key, or MISS.
+        """
+        entry = self.get_entry(namespace, key)
+        if entry is None:
+            return MISS
+        return entry[0]
+
+    def put(self, namespace, key, value, ttl=None):
+        """
+        Store value for key, replacing any value it had.
+
+        ttl - Seconds to keep value for, or None to keep it until it is
+            replaced or deleted.
+        """
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries'
+            ' (namespace, key, value, stored, expires)'
+            ' VALUES (?, ?, ?, ?, ?)',
+            (namespace, key, json.dumps(value, separators=(',', ':')),
+             now, expires))
+
+    def delete(self, namespace, key=None):
+        """
+        Delete key, or every key of namespace if key is None.
+        """
+        if key is None:
+            self._connection().execute(
+                'DELETE FROM entries WHERE namespace = ?', (namespace,))
+        else:
+            self._connection().execute(
+                'DELETE FROM entries WHERE namespace = ? AND key = ?',
+                (namespace, key))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+    def compact(self):
+        """
+        Delete expired entries and shrink the database file. Returns the
+        number of entries deleted.
+        """
+        conn = self._connection()
+        deleted = conn.execute(
+            'DELETE FROM entries WHERE expires <= ?',
+            (time.time(),)).rowcount
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return deleted
+
+    def stats(self):
+        """
+        Return a dict of the number of entries, how many of them have
+        expired, and the size of the database in bytes.
+        """
+        conn = self._connection()
+        (entries, expired) = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(expires <= ?), 0) FROM entries',
+            (time.time(),)).fetchone()
+        (page_count,) = conn.execute('PRAGMA page_count').fetchone()
+        (page_size,) = conn.execute('PRAGMA page_size').fetchone()
+        return {
+            'entries': entries,
+            'expired': expired,
+            'bytes': page_count * page_size,
+        }
+
+    def close(self):
+        """
+        Close the connections of every thread.
+        """
+        with self._lock:
+            connections = self._connections
+            self._connections = {}
+        for conn in connections.values():
+            conn.close()
+        self._local = threading.local()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m duo_client.sqlite_cache',
+        description='Maintain a duo_client SQLite cache.')
+    parser.add_argument('command', choices=['compact', 'stats', 'clear'])
+    parser.add_argument('path', help='Database file')
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        parser.error('No such file: %s' % args.path)
+    store = SQLiteCache(args.path)
+    try:
+        if args.command == 'compact':
+            before = os.path.getsize(args.path)
+            deleted = store.compact()
+            print('Deleted %d expired entries, %d -> %d bytes' % (
+                deleted, before, os.path.getsize(args.path)))
+        elif args.command == 'clear':
+            store.clear()
+        else:
+            for (name, value) in sorted(store.stats().items()):
+                print('%s: %d' % (name, value))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,7 @@
-from typing import Dict, Sequence, Tuple
+import json
+import os
+import tempfile
+from typing import IO, Callable, Dict, Sequence, Tuple
 from datetime import datetime, timedelta, timezone
 
 
@@ -19,3 +22,32 @@ def get_default_request_times() -> Tuple[int, int]:
     mintime = int((today - timedelta(days=180)).timestamp() * 1000)
     maxtime = int(today.timestamp() * 1000) - 120
     return mintime, maxtime
+
+
+def write_file_atomic(path: str, write: Callable[[IO], None], mode: str = "w") -> None:
+    """
+    Replace the file at path with what write(f) writes to a file opened
+    with mode ("w" or "wb"), such that readers (and a process restarted
+    after a crash) see either the old or the new file. A binary write
+    can wrap f, e.g. in a gzip.GzipFile, as long as it closes the
+    wrapper before returning.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    (fd, tmp_path) = tempfile.mkstemp(
+        dir=directory, prefix=".%s." % os.path.basename(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_json_atomic(path: str, data) -> None:
+    """
+    Atomically replace the file at path with data as JSON.
+    """
+    write_file_atomic(path, lambda f: json.dump(data, f))
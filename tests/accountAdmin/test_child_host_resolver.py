@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import duo_client.accounts
+import duo_client.admin
+import duo_client.cache
+import duo_client.connection_pool
+import duo_client.ratelimit
+from duo_client.accounts import (
+    Accounts,
+    ChildHostResolver,
+    get_child_host_resolver,
+)
+from .. import util
+
+CHILDREN = [
+    {'account_id': 'DA1', 'api_hostname': 'api-1.example.com', 'name': 'one'},
+    {'account_id': 'DA2', 'api_hostname': 'api-2.example.com', 'name': 'two'},
+]
+
+
+class FakeAccounts(object):
+    def __init__(self, children=CHILDREN, delay=0):
+        self.children = list(children)
+        self.delay = delay
+        self.calls = 0
+        self.error = None
+
+    def get_child_accounts(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return list(self.children)
+
+
+class MockAccountListConnection(util.MockHTTPConnection):
+    def read(self):
+        if self.uri.endswith('/create'):
+            response = {'account_id': 'DA3', 'name': 'three',
+                        'api_hostname': 'api-3.example.com'}
+        elif self.uri.endswith('/delete'):
+            response = ''
+        else:
+            response = CHILDREN
+        return json.dumps({'stat': 'OK', 'response': response})
+
+
+@mock.patch.dict(Accounts.child_map, clear=True)
+class TestChildHostResolver(unittest.TestCase):
+    def setUp(self):
+        self.accounts = FakeAccounts()
+        self.resolver = ChildHostResolver(self.accounts)
+
+    def test_lists_once(self):
+        self.assertEqual(self.resolver.resolve('DA1'), 'api-1.example.com')
+        self.assertEqual(self.resolver.resolve('DA2'), 'api-2.example.com')
+        self.assertEqual(self.accounts.calls, 1)
+        self.assertEqual(self.resolver.hosts(), {
+            'DA1': 'api-1.example.com', 'DA2': 'api-2.example.com'})
+
+    @mock.patch('duo_client.accounts.time.time')
+    def test_misses(self, mock_time):
+        mock_time.return_value = 1000
+        self.resolver.resolve('DA1')
+        # An unknown id right after a listing does not list again.
+        self.assertIsNone(self.resolver.resolve('DA3'))
+        self.assertEqual(self.accounts.calls, 1)
+        self.accounts.children.append(
+            {'account_id': 'DA3', 'api_hostname': 'api-3.example.com'})
+        mock_time.return_value = 1059
+        self.assertIsNone(self.resolver.resolve('DA3'))
+        self.assertEqual(self.accounts.calls, 1)
+        mock_time.return_value = 1060
+        self.assertEqual(self.resolver.resolve('DA3'), 'api-3.example.com')
+        self.assertEqual(self.accounts.calls, 2)
+
+    @mock.patch('duo_client.accounts.time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 1000
+        self.resolver.resolve('DA1')
+        self.accounts.children[0] = dict(
+            CHILDREN[0], api_hostname='api-9.example.com')
+        mock_time.return_value = 1000 + 3599
+        self.assertEqual(self.resolver.resolve('DA1'), 'api-1.example.com')
+        mock_time.return_value = 1000 + 3600
+        self.assertEqual(self.resolver.resolve('DA1'), 'api-9.example.com')
+        self.assertEqual(self.accounts.calls, 2)
+
+    @mock.patch('duo_client.accounts.time.time')
+    def test_listing_errors(self, mock_time):
+        mock_time.return_value = 1000
+        self.resolver.resolve('DA1')
+        self.accounts.error = RuntimeError('Received 500 Internal Error')
+        mock_time.return_value = 10000
+        self.assertEqual(self.resolver.resolve('DA1'), 'api-1.example.com')
+        with self.assertRaises(RuntimeError):
+            self.resolver.resolve('DA3')
+
+    def test_single_flight(self):
+        self.accounts.delay = 0.1
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.resolver.resolve('DA2')))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['api-2.example.com'] * 8)
+        self.assertEqual(self.accounts.calls, 1)
+
+    def test_persistence(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'child_hosts.json')
+        ChildHostResolver(self.accounts, path=path).resolve('DA1')
+        other = FakeAccounts()
+        resolver = ChildHostResolver(other, path=path)
+        self.assertEqual(resolver.resolve('DA2'), 'api-2.example.com')
+        self.assertEqual(other.calls, 0)
+        with open(path, 'w') as f:
+            f.write('not json')
+        self.assertEqual(ChildHostResolver(other, path=path).hosts(), {})
+
+    def test_update_and_discard(self):
+        self.resolver.update([{'account_id': 'DA5',
+                               'api_hostname': 'api-5.example.com'}])
+        self.assertEqual(self.resolver.resolve('DA5'), 'api-5.example.com')
+        self.assertEqual(self.accounts.calls, 0)
+        self.resolver.discard('DA5')
+        self.assertEqual(self.resolver.hosts(), {})
+
+
+@mock.patch.dict(Accounts.child_map, clear=True)
+@mock.patch.dict(duo_client.accounts._resolvers, clear=True)
+class TestSharedResolver(unittest.TestCase):
+    kwargs = {'ikey': 'test_ikey', 'skey': 'test_skey', 'host': 'example.com'}
+
+    def test_shared_per_integration(self):
+        resolver = get_child_host_resolver(**self.kwargs)
+        self.assertIs(get_child_host_resolver(**self.kwargs), resolver)
+        self.assertIsNot(get_child_host_resolver(
+            'other_ikey', 'test_skey', 'example.com'), resolver)
+        self.assertIsNot(get_child_host_resolver(
+            'test_ikey', 'other_skey', 'example.com'), resolver)
+
+    def test_only_transport_kwargs_shared(self):
+        limiter = duo_client.ratelimit.TokenBucket(1)
+        pool = duo_client.connection_pool.ConnectionPool()
+        resolver = get_child_host_resolver(
+            timeout=5, rate_limiter=limiter, connection_pool=pool,
+            entity_cache=duo_client.cache.EntityCache(), **self.kwargs)
+        accounts_api = resolver.accounts_api
+        self.assertEqual(accounts_api.timeout, 5)
+        self.assertIsNone(accounts_api.rate_limiter)
+        self.assertIsNot(accounts_api.connection_pool, pool)
+
+    def test_account_admin(self):
+        resolver = get_child_host_resolver(**self.kwargs)
+        resolver.accounts_api._connect = \
+            lambda: MockAccountListConnection()
+        with mock.patch.object(resolver.accounts_api, 'get_child_accounts',
+                               wraps=resolver.accounts_api.get_child_accounts
+                               ) as listing:
+            admins = [duo_client.admin.AccountAdmin(account_id, **self.kwargs)
+                      for account_id in ('DA1', 'DA2', 'DA1', 'DA9')]
+        self.assertEqual([admin.host for admin in admins], [
+            'api-1.example.com', 'api-2.example.com', 'api-1.example.com',
+            'example.com'])
+        self.assertEqual(listing.call_count, 1)
+        self.assertEqual(resolver.listings, 1)
+
+    def test_child_map_used(self):
+        # Child accounts the caller listed are not listed again.
+        Accounts.child_map['DA7'] = 'api-7.example.com'
+        resolver = get_child_host_resolver(**self.kwargs)
+        with mock.patch.object(resolver.accounts_api,
+                               'get_child_accounts') as listing:
+            admin = duo_client.admin.AccountAdmin('DA7', **self.kwargs)
+        self.assertEqual(admin.host, 'api-7.example.com')
+        listing.assert_not_called()
+        self.assertEqual(resolver.hosts(), {'DA7': 'api-7.example.com'})
+
+    def test_explicit_resolver(self):
+        resolver = ChildHostResolver(FakeAccounts())
+        admin = duo_client.admin.AccountAdmin(
+            'DA2', child_host_resolver=resolver, **self.kwargs)
+        self.assertEqual(admin.host, 'api-2.example.com')
+        self.assertEqual(duo_client.accounts._resolvers, {})
+
+    def test_accounts_calls_update_shared_resolver(self):
+        resolver = get_child_host_resolver(**self.kwargs)
+        accounts_api = Accounts(**self.kwargs)
+        accounts_api._connect = lambda: MockAccountListConnection()
+        accounts_api.get_child_accounts()
+        self.assertEqual(resolver.hosts()['DA1'], 'api-1.example.com')
+        accounts_api.create_account('three')
+        self.assertEqual(resolver.resolve('DA3'), 'api-3.example.com')
+        accounts_api.delete_account('DA3')
+        self.assertNotIn('DA3', resolver.hosts())
+        self.assertEqual(resolver.listings, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
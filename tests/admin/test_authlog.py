@@ -27,3 +27,46 @@ class TestEndpoints(TestAdmin):
         self.assertEqual(
             util.params_to_dict(args)['account_id'],
             [self.client_authlog.account_id])
+
+
+class TestAuthlogIterator(TestAdmin):
+    def setUp(self):
+        super(TestAuthlogIterator, self).setUp()
+        self.server = util.MockAuthlogServer(
+            {'txid': 'tx%d' % i, 'timestamp': 1000 + i} for i in range(7))
+        self.client._connect = self.server.connect
+
+    def test_follows_next_offset(self):
+        records = list(self.client.get_authentication_log_iterator(
+            1000000, 2000000, limit='3', results=['success', 'denied']))
+        # Newest first, the API's default sort.
+        self.assertEqual([r['txid'] for r in records],
+                         ['tx%d' % i for i in reversed(range(7))])
+        self.assertTrue(all(r['eventtype'] == 'authentication' and
+                            r['host'] == 'example.com' for r in records))
+        self.assertEqual(len(self.server.uris), 3)
+        first = self.server.requests[0]
+        self.assertEqual(first['mintime'], ['1000000'])
+        self.assertEqual(first['maxtime'], ['2000000'])
+        self.assertEqual(sorted(first['results']), ['denied', 'success'])
+        self.assertNotIn('next_offset', first)
+        self.assertEqual(self.server.requests[2]['next_offset'],
+                         ['1001000,tx1'])
+        self.assertTrue(self.server.uris[0].startswith(
+            '/admin/v2/logs/authentication'))
+
+    def test_prefetch(self):
+        records = list(self.client.get_authentication_log_iterator(
+            1000000, 2000000, prefetch=1, limit='3'))
+        self.assertEqual(len(records), 7)
+        self.assertEqual(len(self.server.uris), 3)
+
+    def test_resume_from_offset(self):
+        records = list(self.client.get_authentication_log_iterator(
+            1000000, 2000000, limit='3', next_offset=['1004000', 'tx4']))
+        self.assertEqual([r['txid'] for r in records][0], 'tx3')
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError):
+            self.client.get_authentication_log_iterator(
+                1000000, 2000000, user_names=['x'])
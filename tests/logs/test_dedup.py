@@ -0,0 +1,106 @@
+import threading
+import unittest
+
+import duo_client.admin
+from duo_client.logs import DedupWindow, LogExporter
+from .. import util
+
+
+def authlog(txid, timestamp=1):
+    return {'eventtype': 'authentication', 'txid': txid,
+            'timestamp': timestamp}
+
+
+class TestDedupWindow(unittest.TestCase):
+    def test_drops_repeats(self):
+        dedup = DedupWindow()
+        events = [authlog('a'), authlog('b'), authlog('a'),
+                  {'eventtype': 'activity', 'activity_id': 'a',
+                   'ts': '1970-01-01T00:00:01Z'}]
+        self.assertEqual(list(dedup.filter(events)),
+                         [events[0], events[1], events[3]])
+        self.assertEqual(dedup.duplicates, 1)
+        self.assertEqual(len(dedup), 3)
+        self.assertIn(authlog('b'), dedup)
+
+    def test_evicts_by_count(self):
+        dedup = DedupWindow(max_size=2)
+        for txid in 'abc':
+            self.assertTrue(dedup.add(authlog(txid)))
+        self.assertEqual(len(dedup), 2)
+        self.assertNotIn(authlog('a'), dedup)
+        self.assertTrue(dedup.add(authlog('a')))
+        self.assertFalse(dedup.add(authlog('c')))
+
+    def test_evicts_by_age(self):
+        dedup = DedupWindow(max_age=60 * 1000)
+        dedup.add(authlog('a', timestamp=0))
+        dedup.add(authlog('b', timestamp=30))
+        self.assertEqual(len(dedup), 2)
+        dedup.add(authlog('c', timestamp=61))
+        self.assertEqual(len(dedup), 2)
+        self.assertNotIn(authlog('a'), dedup)
+
+    def test_evicts_by_age_newest_first(self):
+        dedup = DedupWindow(max_age=60 * 1000)
+        for timestamp in range(7200, 0, -1):
+            dedup.add(authlog(str(timestamp), timestamp=timestamp))
+        self.assertEqual(len(dedup), 61)
+        self.assertIn(authlog('7200', timestamp=7200), dedup)
+        self.assertNotIn(authlog('7139', timestamp=7139), dedup)
+
+    def test_evicts_oldest_by_count(self):
+        dedup = DedupWindow(max_size=2)
+        for timestamp in (3, 2, 1):
+            dedup.add(authlog(str(timestamp), timestamp=timestamp))
+        self.assertNotIn(authlog('1', timestamp=1), dedup)
+        self.assertIn(authlog('3', timestamp=3), dedup)
+
+    def test_v1_events_by_content(self):
+        dedup = DedupWindow()
+        event = {'eventtype': 'administrator', 'host': 'example.com',
+                 'timestamp': 1, 'action': 'user_create'}
+        self.assertTrue(dedup.add(event))
+        self.assertFalse(dedup.add(dict(event, host='other.example.com')))
+        self.assertTrue(dedup.add(dict(event, action='user_delete')))
+
+    def test_threads(self):
+        dedup = DedupWindow()
+        added = []
+
+        def worker():
+            for i in range(1000):
+                if dedup.add(authlog(str(i))):
+                    added.append(i)
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(added), list(range(1000)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            DedupWindow(max_size=0)
+        with self.assertRaises(ValueError):
+            DedupWindow().add({'eventtype': 'bogus'})
+
+
+class TestExporterDedup(unittest.TestCase):
+    def test_overlapping_exports(self):
+        client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+        server = util.MockAuthlogServer(
+            {'txid': 'tx%d' % i, 'timestamp': i} for i in range(1000))
+        client._connect = server.connect
+        exporter = LogExporter(client, 'authentication', shards=2,
+                               dedup=DedupWindow())
+        records = []
+        self.assertEqual(exporter.export(0, 499999, records.append), 500)
+        self.assertEqual(
+            exporter.export(400000, 599999, records.append), 100)
+        self.assertEqual(len(set(r['txid'] for r in records)), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import unittest
+from unittest import mock
+
+import duo_client.admin
+from duo_client.logs import LogExporter
+from duo_client.logs.sources import split_time_range
+from .. import util
+
+
+class TestSplitTimeRange(unittest.TestCase):
+    def test_windows_cover_range(self):
+        windows = split_time_range(1000, 1999, 3)
+        self.assertEqual(windows, [(1000, 1332), (1333, 1665), (1666, 1999)])
+
+    def test_more_shards_than_milliseconds(self):
+        self.assertEqual(split_time_range(5, 6, 10), [(5, 5), (6, 6)])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            split_time_range(10, 5, 2)
+        with self.assertRaises(ValueError):
+            split_time_range(5, 10, 0)
+
+
+class TestLogExporter(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+        # One event a second for the first 1000 seconds.
+        self.server = util.MockAuthlogServer(
+            {'txid': 'tx%d' % i, 'timestamp': i} for i in range(1000))
+        self.client._connect = self.server.connect
+
+    def test_ordered(self):
+        exporter = LogExporter(self.client, 'authentication', shards=7,
+                               workers=3, limit=50, users=['DU1'])
+        records = list(exporter.iter_records(0, 999999))
+        self.assertEqual([r['timestamp'] for r in records],
+                         list(range(1000)))
+        self.assertTrue(all(r['eventtype'] == 'authentication' and
+                            r['host'] == 'example.com' for r in records))
+        params = self.server.requests[0]
+        self.assertEqual(params['sort'], ['ts:asc'])
+        self.assertEqual(params['users'], ['DU1'])
+        self.assertTrue(self.server.uris[0].startswith(
+            '/admin/v2/logs/authentication?'))
+
+    def test_unordered_export(self):
+        exporter = LogExporter(self.client, 'authentication', shards=4,
+                               limit=100)
+        records = []
+        self.assertEqual(exporter.export(0, 499999, records.append), 500)
+        self.assertEqual(sorted(r['timestamp'] for r in records),
+                         list(range(500)))
+
+    def test_error_raised(self):
+        self.server.fail_mintime = 500000
+        exporter = LogExporter(self.client, 'authentication', shards=2)
+        with self.assertRaises(RuntimeError):
+            list(exporter.iter_records(0, 999999))
+
+    def test_close_stops_workers(self):
+        exporter = LogExporter(self.client, 'authentication', shards=4,
+                               limit=10, buffer_pages=1)
+        records = exporter.iter_records(0, 999999)
+        next(records)
+        records.close()
+        requests = len(self.server.requests)
+        self.assertLess(requests, 100)
+        self.assertFalse([t for t in threading.enumerate()
+                          if t.name.startswith('duo-log-export')])
+
+    def test_limit_clamped_to_source(self):
+        exporter = LogExporter(self.client, 'trust_monitor')
+        with mock.patch.object(exporter.source, 'pages',
+                               return_value=iter([])) as pages:
+            list(exporter.iter_records(0, 9999, ordered=False))
+        self.assertEqual(
+            set(call[1]['limit'] for call in pages.call_args_list), {200})
+
+    def test_unsupported_log_type(self):
+        with self.assertRaises(ValueError):
+            LogExporter(self.client, 'bogus')
+
+    def test_unsortable_log_type_unordered_only(self):
+        exporter = LogExporter(self.client, 'trust_monitor')
+        with self.assertRaises(ValueError):
+            next(exporter.iter_records(0, 999999))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import queue
+import threading
+import time
+import unittest
+from unittest import mock
+
+import duo_client.admin
+from duo_client.logs import DedupWindow, LogFetcher, LogTailer
+from .. import util
+
+RESPONSES = {
+    '/admin/v1/logs/administrator': [{'timestamp': 1, 'action': 'a'}],
+    '/admin/v2/logs/authentication': {
+        'authlogs': [{'txid': 'x', 'timestamp': 1}], 'metadata': {}},
+    '/admin/v2/logs/telephony': {
+        'items': [{'telephony_id': 't', 'ts': '1970-01-01T00:00:01Z'}],
+        'metadata': {}},
+    '/admin/v2/logs/activity': {
+        'items': [{'activity_id': 'y', 'ts': '1970-01-01T00:00:01Z'}],
+        'metadata': {}},
+    '/admin/v1/trust_monitor/events': {
+        'events': [{'sekey': 'z', 'surfaced_timestamp': 1000}]},
+}
+
+
+class MockLogsConnection(util.MockHTTPConnection):
+    """
+    Answers each log endpoint with one event after a delay, tracking the
+    most requests in flight at once.
+    """
+    delay = 0.05
+    lock = threading.Lock()
+    in_flight = [0, 0]
+    fail_path = None
+
+    def read(self):
+        path = self.uri.split('?')[0]
+        with self.lock:
+            self.in_flight[0] += 1
+            self.in_flight[1] = max(self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight[0] -= 1
+        if path == self.fail_path:
+            self.status = 500
+            self.reason = 'Internal Server Error'
+            return json.dumps({'stat': 'FAIL', 'code': 50000,
+                               'message': 'oops'})
+        return json.dumps({'stat': 'OK', 'response': RESPONSES[path]})
+
+
+class TestLogFetcher(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+        self.client._connect = lambda: MockLogsConnection()
+        MockLogsConnection.in_flight[:] = [0, 0]
+        MockLogsConnection.fail_path = None
+
+    def test_callback(self):
+        events = []
+        lock = threading.Lock()
+
+        def callback(log_type, event):
+            with lock:
+                events.append((log_type, event['eventtype']))
+        counts = LogFetcher(self.client).fetch(
+            callback=callback, mintime=0, maxtime=5000)
+        self.assertEqual(counts, {
+            'administrator': 1, 'authentication': 1, 'telephony': 1,
+            'activity': 1, 'trust_monitor': 1})
+        self.assertEqual(sorted(events), sorted(
+            (log_type, log_type) for log_type in counts))
+        self.assertEqual(MockLogsConnection.in_flight[1], 5)
+
+    def test_limit_clamped_to_source(self):
+        fetcher = LogFetcher(self.client, ['authentication', 'trust_monitor'])
+        with mock.patch.object(fetcher.streams[0], 'pages',
+                               wraps=fetcher.streams[0].pages) as auth, \
+                mock.patch.object(fetcher.streams[1], 'pages',
+                                  wraps=fetcher.streams[1].pages) as tm:
+            fetcher.fetch(callback=lambda *args: None, mintime=0, maxtime=5000)
+        self.assertEqual(auth.call_args[1]['limit'], 1000)
+        self.assertEqual(tm.call_args[1]['limit'], 200)
+
+    def test_workers_bound_concurrency(self):
+        LogFetcher(self.client, workers=2).fetch(
+            callback=lambda *args: None, mintime=0, maxtime=5000)
+        self.assertEqual(MockLogsConnection.in_flight[1], 2)
+
+    def test_output_queue(self):
+        output = queue.Queue()
+        fetcher = LogFetcher(self.client, ['authentication', 'activity'])
+        fetcher.fetch(output=output, mintime=0, maxtime=5000)
+        items = [output.get_nowait() for _ in range(4)]
+        self.assertEqual(
+            sorted((log_type, event is None) for (log_type, event) in items),
+            [('activity', False), ('activity', True),
+             ('authentication', False), ('authentication', True)])
+
+    def test_tailer(self):
+        tailer = LogTailer(self.client, 'authentication', mintime=0, lag=0)
+        fetcher = LogFetcher(self.client, [tailer, 'trust_monitor'])
+        counts = fetcher.fetch(callback=lambda *args: None)
+        self.assertEqual(counts, {'authentication': 1, 'trust_monitor': 1})
+        self.assertEqual(fetcher.fetch(callback=lambda *args: None)
+                         ['authentication'], 0)
+
+    def test_dedup(self):
+        fetcher = LogFetcher(self.client, dedup=DedupWindow())
+        counts = fetcher.fetch(callback=lambda *args: None,
+                               mintime=0, maxtime=5000)
+        self.assertEqual(set(counts.values()), {1})
+        counts = fetcher.fetch(callback=lambda *args: None,
+                               mintime=0, maxtime=5000)
+        self.assertEqual(set(counts.values()), {0})
+
+    def test_error_raised_after_others_finish(self):
+        MockLogsConnection.fail_path = '/admin/v2/logs/telephony'
+        events = []
+        with self.assertRaises(RuntimeError):
+            LogFetcher(self.client).fetch(
+                callback=lambda log_type, event: events.append(log_type),
+                mintime=0, maxtime=5000)
+        self.assertEqual(len(events), 4)
+
+    def test_invalid(self):
+        fetcher = LogFetcher(self.client)
+        with self.assertRaises(ValueError):
+            fetcher.fetch()
+        with self.assertRaises(ValueError):
+            LogFetcher(self.client, ['activity', 'activity'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import duo_client.admin
+from duo_client.logs import (
+    ActivityLogSource,
+    AdministratorLogSource,
+    AuthenticationLogSource,
+    get_log_source,
+)
+from duo_client.logs.sources import iso_time_ms
+from duo_client.sqlite_cache import SQLiteCache
+from .. import util
+
+
+class MockResponsesConnection(util.MockHTTPConnection):
+    """
+    Answers each request with the next of responses, recording params.
+    """
+    responses = []
+    requests = []
+
+    def read(self):
+        (path, query) = self.uri.split('?')
+        self.requests.append((path, dict(
+            (k, v[0]) for (k, v) in util.params_to_dict(query).items())))
+        (response, metadata) = self.responses.pop(0)
+        body = {'stat': 'OK', 'response': response}
+        if metadata is not None:
+            body['metadata'] = metadata
+        return json.dumps(body)
+
+
+class TestLogSources(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+        self.client._connect = lambda: MockResponsesConnection()
+        MockResponsesConnection.requests = []
+
+    def respond(self, *responses):
+        MockResponsesConnection.responses = list(responses)
+
+    def test_v2_pages(self):
+        self.respond(
+            ({'authlogs': [{'txid': 'a', 'timestamp': 1}],
+              'metadata': {'next_offset': ['1000', 'a']}}, None),
+            ({'authlogs': [{'txid': 'b', 'timestamp': 2}],
+              'metadata': {}}, None))
+        source = get_log_source(self.client, 'authentication')
+        pages = list(source.pages(0, 5000, limit=1, ascending=True,
+                                  users=['DU1']))
+        self.assertEqual(pages[0][1], ['1000', 'a'])
+        self.assertIsNone(pages[1][1])
+        self.assertEqual(pages[1][0], [{'txid': 'b', 'timestamp': 2,
+                                        'eventtype': 'authentication',
+                                        'host': 'example.com'}])
+        (path, params) = MockResponsesConnection.requests[1]
+        self.assertEqual(path, '/admin/v2/logs/authentication')
+        self.assertEqual(params['next_offset'], '1000,a')
+        self.assertEqual(params['sort'], 'ts:asc')
+        self.assertEqual(params['users'], 'DU1')
+        self.assertEqual((params['mintime'], params['maxtime']),
+                         ('0', '5000'))
+        self.assertEqual(source.event_time(pages[0][0][0]), 1000)
+        self.assertEqual(source.event_id(pages[0][0][0]), 'a')
+
+    def test_trust_monitor_cursor(self):
+        self.respond(
+            ({'events': [{'sekey': 'a', 'surfaced_timestamp': 10}]},
+             {'next_offset': '31229'}),
+            ({'events': [{'sekey': 'b', 'surfaced_timestamp': 20}]}, {}))
+        source = get_log_source(self.client, 'trust_monitor')
+        events = list(source.iter_events(0, 100))
+        self.assertEqual([e['sekey'] for e in events], ['a', 'b'])
+        self.assertEqual(events[0]['eventtype'], 'trust_monitor')
+        self.assertEqual(MockResponsesConnection.requests[1][0],
+                         '/admin/v1/trust_monitor/events')
+        self.assertEqual(MockResponsesConnection.requests[1][1]['offset'],
+                         '31229')
+        with self.assertRaises(ValueError):
+            next(source.pages(0, 100, ascending=True))
+
+    @mock.patch.object(AdministratorLogSource, 'page_size', 3)
+    def test_v1_pages(self):
+        self.respond(
+            ([{'timestamp': 9, 'action': 'a'},
+              {'timestamp': 10, 'action': 'b'},
+              {'timestamp': 11, 'action': 'c'}], None),
+            # The next page starts at the second of the last event.
+            ([{'timestamp': 11, 'action': 'c'},
+              {'timestamp': 11, 'action': 'd'},
+              {'timestamp': 12, 'action': 'e'}], None),
+            ([{'timestamp': 12, 'action': 'e'},
+              {'timestamp': 15, 'action': 'f'}], None))
+        source = AdministratorLogSource(self.client)
+        events = list(source.iter_events(10000, 14999))
+        self.assertEqual([e['action'] for e in events], ['b', 'c', 'd', 'e'])
+        self.assertEqual(events[0]['eventtype'], 'administrator')
+        self.assertEqual(
+            [params['mintime'] for (_, params) in
+             MockResponsesConnection.requests], ['10', '11', '12'])
+        self.assertNotIn('maxtime', MockResponsesConnection.requests[0][1])
+        self.assertEqual(source.event_id(events[0]),
+                         source.event_id({'timestamp': 10, 'action': 'b'}))
+
+    def test_iter_events_default_times(self):
+        self.respond(({'items': [], 'metadata': {}}, None))
+        source = ActivityLogSource(self.client)
+        with mock.patch('duo_client.logs.sources.get_default_request_times',
+                        return_value=(5, 6)):
+            self.assertEqual(list(source.iter_events()), [])
+        (path, params) = MockResponsesConnection.requests[0]
+        self.assertEqual(path, '/admin/v2/logs/activity')
+        self.assertEqual((params['mintime'], params['maxtime']), ('5', '6'))
+
+    def page_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        store = SQLiteCache(os.path.join(tmpdir, 'cache.db'))
+        self.addCleanup(store.close)
+        return store
+
+    def test_page_cache(self):
+        store = self.page_cache()
+        source = get_log_source(self.client, 'authentication',
+                                page_cache=store)
+        page = ({'authlogs': [{'txid': 'a', 'timestamp': 1}],
+                 'metadata': {}}, None)
+        now = int(time.time() * 1000)
+        for _ in range(2):
+            self.respond(page)
+            events = list(source.iter_events(0, 5000))
+            self.assertEqual(events[0]['eventtype'], 'authentication')
+        # Settled pages are fetched once; recent ones every time.
+        self.assertEqual(len(MockResponsesConnection.requests), 1)
+        self.assertEqual(store.stats()['entries'], 1)
+        for _ in range(2):
+            self.respond(page)
+            list(source.iter_events(0, now))
+        self.assertEqual(len(MockResponsesConnection.requests), 3)
+        self.assertEqual(store.stats()['entries'], 1)
+
+    @mock.patch.object(AdministratorLogSource, 'page_size', 2)
+    def test_v1_page_cache(self):
+        store = self.page_cache()
+        source = AdministratorLogSource(self.client, page_cache=store)
+        now = int(time.time())
+        responses = (
+            ([{'timestamp': 10, 'action': 'a'},
+              {'timestamp': 11, 'action': 'b'}], None),
+            ([{'timestamp': 11, 'action': 'b'},
+              {'timestamp': now, 'action': 'c'}], None),
+            ([{'timestamp': now, 'action': 'c'}], None))
+        for run in range(2):
+            # The first page is only fetched once.
+            self.respond(*responses[run:])
+            events = list(source.iter_events(10000, now * 1000))
+            self.assertEqual([e['action'] for e in events], ['a', 'b', 'c'])
+        # Only the first page is full and settled.
+        self.assertEqual(
+            [params['mintime'] for (_, params) in
+             MockResponsesConnection.requests],
+            ['10', '11', str(now), '11', str(now)])
+
+    def test_iso_time(self):
+        self.assertEqual(iso_time_ms('1970-01-01T00:00:01.5+00:00'), 1500)
+        self.assertEqual(iso_time_ms('1970-01-01T00:00:02Z'), 2000)
+        self.assertEqual(iso_time_ms('1970-01-01T00:00:01.1Z'), 1100)
+        self.assertEqual(
+            iso_time_ms('1970-01-01T00:00:01.123456789+00:00'), 1123)
+        self.assertEqual(iso_time_ms('1970-01-01T00:00:01.12345Z'), 1123)
+
+    def test_get_log_source(self):
+        source = AuthenticationLogSource(self.client)
+        self.assertIs(get_log_source(self.client, source), source)
+        self.assertIsInstance(get_log_source(self.client, 'activity'),
+                              ActivityLogSource)
+        with self.assertRaises(ValueError):
+            get_log_source(self.client, 'bogus')
+
+
+if __name__ == '__main__':
+    unittest.main()
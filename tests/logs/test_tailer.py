@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import duo_client.admin
+from duo_client.logs import LogTailer
+from duo_client.util import write_json_atomic
+from .. import util
+
+
+def event(txid, timestamp):
+    return {'txid': txid, 'timestamp': timestamp}
+
+
+@mock.patch('duo_client.logs.tailer.time.time')
+class TestLogTailer(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+        self.server = util.MockAuthlogServer([
+            event('a', 100), event('b', 101), event('c', 101),
+            event('d', 102), event('e', 103)])
+        self.client._connect = self.server.connect
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'authlog.json')
+
+    def tailer(self, mintime=100000):
+        return LogTailer(self.client, 'authentication', mintime=mintime,
+                         checkpoint_path=self.path, limit=2, lag=0)
+
+    def txids(self, events):
+        return [e['txid'] for e in events]
+
+    def test_yields_only_new_events(self, mock_time):
+        mock_time.return_value = 101.5
+        tailer = self.tailer()
+        self.assertEqual(self.txids(tailer.poll()), ['a', 'b', 'c'])
+        # A late event in the same second as the last one yielded.
+        self.server.events.insert(3, event('c2', 101))
+        mock_time.return_value = 103
+        events = list(tailer.poll())
+        self.assertEqual(self.txids(events), ['c2', 'd', 'e'])
+        self.assertEqual(events[0]['eventtype'], 'authentication')
+        self.assertEqual(events[0]['host'], 'example.com')
+        self.assertEqual(self.server.requests[-3]['mintime'], ['101000'])
+        self.assertEqual(self.server.requests[-1]['sort'], ['ts:asc'])
+        mock_time.return_value = 104
+        self.assertEqual(list(tailer.poll()), [])
+
+    def test_resumes_from_checkpoint(self, mock_time):
+        mock_time.return_value = 110
+        self.assertEqual(self.txids(self.tailer().poll()),
+                         ['a', 'b', 'c', 'd', 'e'])
+        self.server.events.append(event('f', 104))
+        mock_time.return_value = 120
+        self.assertEqual(self.txids(self.tailer(mintime=0).poll()), ['f'])
+
+    def test_resumes_cursor_after_crash(self, mock_time):
+        mock_time.return_value = 110
+        events = self.tailer().poll()
+        self.assertEqual(self.txids(next(events) for _ in range(3)),
+                         ['a', 'b', 'c'])
+        # Abandoned part way through the second page: it is re-read with
+        # the saved cursor, and only the unfinished page is repeated.
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['next_offset'], ['101000', 'b'])
+        tailer = self.tailer()
+        self.assertEqual(self.txids(tailer.poll()), ['c', 'd', 'e'])
+        self.assertEqual(self.server.requests[-2]['next_offset'],
+                         ['101000,b'])
+
+    def test_no_checkpoint_file(self, mock_time):
+        mock_time.return_value = 110
+        tailer = LogTailer(self.client, 'authentication', mintime=100000,
+                           lag=0)
+        self.assertEqual(len(list(tailer.poll())), 5)
+        self.assertEqual(list(tailer.poll()), [])
+
+    def test_unsupported_log_type(self, mock_time):
+        with self.assertRaises(ValueError):
+            LogTailer(self.client, 'trust_monitor')
+
+
+class TestWriteJsonAtomic(unittest.TestCase):
+    def test_replaces_file(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'state.json')
+        write_json_atomic(path, {'a': 1})
+        write_json_atomic(path, {'a': 2})
+        with open(path) as f:
+            self.assertEqual(json.load(f), {'a': 2})
+        self.assertEqual(os.listdir(tmpdir), ['state.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
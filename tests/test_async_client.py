@@ -0,0 +1,411 @@
+import asyncio
+import http.client
+import json
+import unittest
+import urllib.parse
+from unittest import mock
+
+import duo_client.async_client
+import duo_client.cache
+import duo_client.concurrency
+import duo_client.instrumentation
+
+
+class MockDuoServer(object):
+    """
+    Minimal HTTP/1.1 server that answers Duo API style JSON requests.
+
+    Paths ending in /paged, and requests with an offset, return objects
+    in pages, log paths return events, /limited answers 429 until
+    rate_limited_count reaches zero, and everything else echoes the
+    request back as the response.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        self.rate_limited_count = 0
+        self.chunked = False
+        # Requests to read and then close the connection on, unanswered.
+        self.drop_count = 0
+        # Raw status line to answer with instead of a response, or None.
+        self.status_line = None
+        self.objects = [{'id': i} for i in range(5)]
+        self.events = [{'txid': str(i), 'timestamp': 1700000000 + i}
+                       for i in range(5)]
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                (method, uri, _) = request_line.decode('ascii').split(' ')
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line == b'\r\n':
+                        break
+                    (name, _, value) = line.decode('ascii').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = b''
+                if 'content-length' in headers:
+                    body = await reader.readexactly(int(headers['content-length']))
+                self.requests.append((method, uri, headers, body))
+                if self.drop_count:
+                    self.drop_count -= 1
+                    break
+                if self.status_line is not None:
+                    writer.write(self.status_line + b'\r\n\r\n')
+                    await writer.drain()
+                    break
+                (status, payload) = self.respond(method, uri, headers, body)
+                self.write_response(writer, status, payload)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def respond(self, method, uri, headers, body):
+        parsed = urllib.parse.urlparse(uri)
+        params = urllib.parse.parse_qs(parsed.query)
+        if parsed.path.endswith('/limited') and self.rate_limited_count:
+            self.rate_limited_count -= 1
+            return (429, {'stat': 'FAIL', 'code': 42901, 'message': 'Too Many Requests'})
+        if '/logs/' in parsed.path:
+            return (200, {'stat': 'OK',
+                          'response': self.log_response(parsed.path, params)})
+        if parsed.path.endswith('/paged') or 'offset' in params:
+            limit = int(params['limit'][0])
+            offset = int(params['offset'][0])
+            metadata = {'total_objects': len(self.objects)}
+            if offset + limit < len(self.objects):
+                metadata['next_offset'] = offset + limit
+            return (200, {'stat': 'OK',
+                          'response': self.objects[offset:offset + limit],
+                          'metadata': metadata})
+        return (200, {'stat': 'OK', 'response': {
+            'method': method,
+            'path': parsed.path,
+            'params': params,
+            'body': body.decode('utf-8'),
+            'authorization': headers.get('authorization'),
+            'date': headers.get('date'),
+        }})
+
+    def log_response(self, path, params):
+        if path.startswith('/admin/v1/'):
+            return self.events
+        limit = int(params.get('limit', ['100'])[0])
+        offset = 0
+        if 'next_offset' in params:
+            offset = int(params['next_offset'][0].split(',')[1])
+        page = self.events[offset:offset + limit]
+        metadata = {}
+        if offset + limit < len(self.events):
+            metadata['next_offset'] = [
+                str(page[-1]['timestamp'] * 1000), str(offset + limit)]
+        records_key = 'authlogs' if path.endswith('/authentication') else 'items'
+        return {records_key: page, 'metadata': metadata}
+
+    def write_response(self, writer, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        head = ['HTTP/1.1 %d %s' % (status, 'OK' if status == 200 else 'Error'),
+                'Content-Type: application/json']
+        if self.chunked:
+            head.append('Transfer-Encoding: chunked')
+            middle = len(data) // 2
+            data = b''.join(
+                b'%x\r\n%s\r\n' % (len(chunk), chunk)
+                for chunk in (data[:middle], data[middle:])
+            ) + b'0\r\n\r\n'
+        else:
+            head.append('Content-Length: %d' % len(data))
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('ascii') + data)
+
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    client_class = duo_client.async_client.AsyncClient
+
+    async def asyncSetUp(self):
+        self.server = MockDuoServer()
+        await self.server.start()
+        self.client = self.client_class(
+            'test_ikey', 'test_akey', '127.0.0.1',
+            ca_certs='HTTP', port=self.server.port)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    async def test_json_api_call_get(self):
+        response = await self.client.json_api_call(
+            'GET', '/foo/bar', {'username': 'user1'})
+        self.assertEqual(response['method'], 'GET')
+        self.assertEqual(response['path'], '/foo/bar')
+        self.assertEqual(response['params'], {'username': ['user1']})
+        self.assertTrue(response['authorization'].startswith('Basic '))
+        self.assertIsNotNone(response['date'])
+
+    async def test_json_api_call_post(self):
+        response = await self.client.json_api_call(
+            'POST', '/foo/bar', {'username': 'user1'})
+        self.assertEqual(response['method'], 'POST')
+        self.assertEqual(json.loads(response['body']), {'username': 'user1'})
+
+    async def test_signature_matches_sync_client(self):
+        with mock.patch('email.utils.formatdate',
+                        return_value='Tue, 04 Jul 2017 14:12:00 -0000'):
+            response = await self.client.json_api_call(
+                'GET', '/foo/bar', {'username': 'user1'})
+            (_, _, headers) = self.client._prepare_request(
+                'GET', '/foo/bar', {'username': 'user1'})
+        self.assertEqual(
+            response['authorization'].encode('ascii'), headers[b'Authorization'])
+
+    async def test_connection_reused(self):
+        for _ in range(3):
+            await self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_dropped_keep_alive_replays_get(self):
+        await self.client.json_api_call('GET', '/foo/bar', {})
+        self.server.drop_count = 1
+        response = await self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(response['path'], '/foo/bar')
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_dropped_keep_alive_not_replayed_for_post(self):
+        # The server may have acted on the request before disconnecting.
+        await self.client.json_api_call('GET', '/foo/bar', {})
+        self.server.drop_count = 1
+        with self.assertRaises(ConnectionResetError):
+            await self.client.json_api_call('POST', '/auth/v2/auth', {})
+        self.assertEqual([r[0] for r in self.server.requests], ['GET', 'POST'])
+
+    async def test_bad_status_line(self):
+        for status_line in (b'HTTP/1.1', b'HTTP/1.1 2x0 OK', b'HTTP/1.1 20 OK',
+                            b'garbage'):
+            self.server.status_line = status_line
+            with self.assertRaises(http.client.BadStatusLine):
+                await self.client.json_api_call('POST', '/foo/bar', {})
+
+    async def test_concurrent_requests_bounded(self):
+        self.client.max_connections = 2
+        self.client._loop = None
+        await asyncio.gather(*[
+            self.client.json_api_call('GET', '/foo/bar', {}) for _ in range(10)
+        ])
+        self.assertEqual(len(self.server.requests), 10)
+        self.assertLessEqual(self.server.connections, 2)
+
+    async def test_chunked_response(self):
+        self.server.chunked = True
+        response = await self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(response['path'], '/foo/bar')
+
+    async def test_paging(self):
+        self.client.paging_limit = 2
+        objects = [obj async for obj in
+                   self.client.json_paging_api_call('GET', '/foo/paged', {})]
+        self.assertEqual(objects, self.server.objects)
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_error_response(self):
+        self.server.rate_limited_count = 100
+        self.client._MAX_BACKOFF_WAIT_SECS = 0
+        with self.assertRaises(RuntimeError) as ctx:
+            await self.client.json_api_call('GET', '/foo/limited', {})
+        self.assertEqual(ctx.exception.status, 429)
+
+    @mock.patch('duo_client.async_client.asyncio.sleep')
+    @mock.patch('duo_client.retry.random')
+    async def test_rate_limited_retry(self, mock_random, mock_sleep):
+        mock_random.uniform.return_value = 0.123
+        self.server.rate_limited_count = 2
+        response = await self.client.json_api_call('GET', '/foo/limited', {})
+        self.assertEqual(response['path'], '/foo/limited')
+        mock_sleep.assert_has_calls([mock.call(1.123), mock.call(2.123)])
+        self.assertEqual(len(self.server.requests), 3)
+
+    @mock.patch('duo_client.async_client.asyncio.sleep')
+    async def test_rate_limiter(self, mock_sleep):
+        self.client.rate_limiter = mock.Mock()
+        self.client.rate_limiter.take.side_effect = [0.25, 0]
+        await self.client.json_api_call('GET', '/foo/bar', {})
+        mock_sleep.assert_called_once_with(0.25)
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_concurrency_controller(self):
+        controller = duo_client.concurrency.AIMDController(initial_window=2)
+        self.client.concurrency_controller = controller
+        await asyncio.gather(*[
+            self.client.json_api_call('GET', '/foo/bar', {}) for _ in range(6)
+        ])
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(controller.window, 4)
+        self.assertLessEqual(self.server.connections, 4)
+
+    async def test_request_hooks(self):
+        timings = []
+
+        class Hook(duo_client.instrumentation.RequestHook):
+            def on_response_parsed(self, timing):
+                timings.append(timing)
+        self.client.add_request_hook(Hook())
+        await self.client.json_api_call('POST', '/foo/bar', {'a': 'b'})
+        await self.client.json_api_call('GET', '/foo/bar', {})
+        (first, second) = timings
+        self.assertEqual(first.status, 200)
+        self.assertEqual(first.request_bytes, len('{"a":"b"}'))
+        self.assertGreater(first.response_bytes, 0)
+        self.assertIsNotNone(first.connect_time)
+        self.assertIsNotNone(first.ttfb)
+        self.assertIsNotNone(first.parse_time)
+        # The second call reuses the first call's connection.
+        self.assertIsNone(second.connect_time)
+
+    async def test_proxy_not_supported(self):
+        self.client.set_proxy('proxy.example.com', 8080)
+        with self.assertRaises(NotImplementedError):
+            await self.client.json_api_call('GET', '/foo/bar', {})
+
+
+class TestAsyncAdmin(TestAsyncClient):
+    client_class = duo_client.async_client.AsyncAdmin
+
+    async def test_get_user_by_id(self):
+        self.client.account_id = 'DA012345678901234567'
+        response = await self.client.get_user_by_id('DU012345678901234567')
+        self.assertEqual(response['path'], '/admin/v1/users/DU012345678901234567')
+        self.assertEqual(response['params']['account_id'],
+                         ['DA012345678901234567'])
+
+    async def test_entity_cache(self):
+        self.client.entity_cache = duo_client.cache.EntityCache()
+        await self.client.get_user_by_id('DU012345678901234567')
+        response = await self.client.get_user_by_id('DU012345678901234567')
+        self.assertEqual(response['path'], '/admin/v1/users/DU012345678901234567')
+        self.assertEqual(len(self.server.requests), 1)
+        await self.client.update_user('DU012345678901234567', realname='x')
+        await self.client.get_user_by_id('DU012345678901234567')
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_iterator(self):
+        self.client.paging_limit = 2
+        with mock.patch.object(self.client, 'json_paging_api_call',
+                               wraps=self.client.json_paging_api_call) as paging:
+            iterator = self.client.get_users_iterator()
+            self.assertTrue(hasattr(iterator, '__aiter__'))
+            paging.assert_called_once_with('GET', '/admin/v1/users', {})
+            await iterator.aclose()
+
+    async def test_get_users(self):
+        self.client.paging_limit = 2
+        users = await self.client.get_users()
+        self.assertEqual(users, self.server.objects)
+        self.assertEqual(len(self.server.requests), 3)
+        users = await self.client.get_users(limit=2, offset=2)
+        self.assertEqual(users, self.server.objects[2:4])
+
+    async def test_list_wrappers(self):
+        self.client.paging_limit = 2
+        self.assertEqual(await self.client.get_admins(), self.server.objects)
+        self.assertEqual(await self.client.get_user_phones('DU1'),
+                         self.server.objects)
+        self.assertEqual(
+            await self.client.get_external_password_mgmt_statuses(),
+            self.server.objects)
+
+    def assertStamped(self, events):
+        self.assertEqual([event['txid'] for event in events],
+                         [event['txid'] for event in self.server.events])
+        for event in events:
+            self.assertEqual(event['host'], '127.0.0.1')
+
+    async def test_get_authentication_log(self):
+        with self.assertWarns(DeprecationWarning):
+            events = await self.client.get_authentication_log(mintime=0)
+        self.assertStamped(events)
+        self.assertEqual(events[0]['eventtype'], 'authentication')
+
+        response = await self.client.get_authentication_log(api_version=2)
+        self.assertStamped(response['authlogs'])
+        self.assertEqual(response['authlogs'][0]['eventtype'],
+                         'authentication')
+
+    async def test_get_telephony_log(self):
+        events = await self.client.get_telephony_log()
+        self.assertStamped(events)
+        self.assertEqual(events[0]['eventtype'], 'telephony')
+
+        response = await self.client.get_telephony_log(api_version=2)
+        self.assertStamped(response['items'])
+
+    async def test_get_activity_logs(self):
+        response = await self.client.get_activity_logs()
+        self.assertStamped(response['items'])
+        self.assertEqual(response['items'][0]['eventtype'], 'activity')
+
+    async def test_get_administrator_log(self):
+        events = await self.client.get_administrator_log()
+        self.assertStamped(events)
+        self.assertEqual(events[0]['eventtype'], 'administrator')
+
+    async def test_get_authentication_log_iterator(self):
+        self.client.paging_limit = 2
+        iterator = self.client.get_authentication_log_iterator(
+            0, 1700000010000, results=['success'])
+        self.assertTrue(hasattr(iterator, '__aiter__'))
+        events = [event async for event in iterator]
+        self.assertStamped(events)
+        self.assertEqual(events[0]['eventtype'], 'authentication')
+        self.assertEqual(len(self.server.requests), 3)
+        uri = self.server.requests[1][1]
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(uri).query)
+        self.assertEqual(params['next_offset'], ['1700000001000,2'])
+        self.assertEqual(params['results'], ['success'])
+
+    async def test_get_authentication_log_iterator_resume(self):
+        events = [event async for event in
+                  self.client.get_authentication_log_iterator(
+                      0, 1700000010000, limit=2,
+                      next_offset=['1700000001000', '2'])]
+        self.assertEqual([event['txid'] for event in events],
+                         ['2', '3', '4'])
+
+    def test_get_authentication_log_iterator_invalid_filter(self):
+        with self.assertRaises(ValueError):
+            self.client.get_authentication_log_iterator(0, 1, api_version=2)
+
+    async def test_get_logo(self):
+        response = await self.client.get_logo()
+        self.assertEqual(response['path'], '/admin/v1/logo')
+
+
+class TestAsyncAuth(TestAsyncClient):
+    client_class = duo_client.async_client.AsyncAuth
+
+    async def test_ping(self):
+        response = await self.client.ping()
+        self.assertEqual(response['path'], '/auth/v2/ping')
+
+    async def test_auth_status(self):
+        response = await self.client.auth_status('txid1')
+        self.assertEqual(response['waiting'], False)
+        self.assertEqual(self.server.requests[0][0], 'GET')
+        self.assertIn('txid=txid1', self.server.requests[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import duo_client.admin
+from duo_client.cache import MISS, EntityCache
+from duo_client.sqlite_cache import SQLiteCache
+from . import util
+
+
+class CountingAdmin(duo_client.admin.Admin):
+    counter = 0
+
+    def _make_request(self, *args, **kwargs):
+        self.counter += 1
+        return super(CountingAdmin, self)._make_request(*args, **kwargs)
+
+
+class TestEntityCache(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com')
+
+    def test_cacheable_paths(self):
+        cache = EntityCache(ttls={'users': 0, 'info': 60})
+        self.assertIsNotNone(cache.key(self.client, '/admin/v1/phones/DP1', {}))
+        self.assertIsNotNone(cache.key(self.client, '/admin/v1/info/summary', {}))
+        for path in ('/admin/v1/users/DU1', '/admin/v1/phones',
+                     '/admin/v1/phones/DP1/activation_url',
+                     '/admin/v1/logs/administrator'):
+            self.assertIsNone(cache.key(self.client, path, {}))
+
+    def test_key_includes_params_and_account(self):
+        cache = EntityCache()
+        path = '/admin/v2/groups/DG1'
+        key = cache.key(self.client, path, {})
+        self.assertNotEqual(key, cache.key(self.client, path, {'a': 'b'}))
+        self.client.account_id = 'DA1'
+        self.assertNotEqual(key, cache.key(self.client, path, {}))
+
+    @mock.patch('duo_client.cache.time.monotonic')
+    def test_ttl(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        cache = EntityCache(ttls={'phones': 10})
+        user_key = cache.key(self.client, '/admin/v1/users/DU1', {})
+        phone_key = cache.key(self.client, '/admin/v1/phones/DP1', {})
+        cache.put(user_key, {'user_id': 'DU1'})
+        cache.put(phone_key, {'phone_id': 'DP1'})
+        mock_monotonic.return_value = 10
+        self.assertEqual(cache.get(user_key), {'user_id': 'DU1'})
+        self.assertIs(cache.get(phone_key), MISS)
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_lru(self):
+        cache = EntityCache(max_entries=2)
+        keys = [cache.key(self.client, '/admin/v1/users/DU%d' % i, {})
+                for i in range(3)]
+        cache.put(keys[0], 0)
+        cache.put(keys[1], 1)
+        cache.get(keys[0])
+        cache.put(keys[2], 2)
+        self.assertIs(cache.get(keys[1]), MISS)
+        self.assertEqual(cache.get(keys[0]), 0)
+        self.assertEqual(cache.stats(), {
+            'hits': 2, 'misses': 1, 'evictions': 1, 'invalidations': 0,
+            'size': 2})
+
+    def test_copies(self):
+        cache = EntityCache()
+        key = cache.key(self.client, '/admin/v1/users/DU1', {})
+        user = {'groups': []}
+        cache.put(key, user)
+        user['groups'].append('g')
+        cache.get(key)['groups'].append('h')
+        self.assertEqual(cache.get(key), {'groups': []})
+
+    def test_invalidate_path(self):
+        cache = EntityCache()
+        user_key = cache.key(self.client, '/admin/v1/users/DU1', {})
+        phone_key = cache.key(self.client, '/admin/v1/phones/DP1', {})
+        group_key = cache.key(self.client, '/admin/v2/groups/DG1', {})
+        for key in (user_key, phone_key, group_key):
+            cache.put(key, {})
+        cache.invalidate_path('/admin/v1/users/DU1/phones/DP1')
+        self.assertIs(cache.get(user_key), MISS)
+        self.assertIs(cache.get(phone_key), MISS)
+        self.assertEqual(cache.get(group_key), {})
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+    def test_put_after_invalidate_ignored(self):
+        cache = EntityCache()
+        key = cache.key(self.client, '/admin/v1/users/DU1', {})
+        cache.invalidate('users')
+        cache.put(key, {'stale': True})
+        self.assertIs(cache.get(cache.key(self.client, '/admin/v1/users/DU1', {})), MISS)
+
+    def test_lookup_and_finish(self):
+        cache = EntityCache()
+        path = '/admin/v1/users/DU1'
+        (key, response) = cache.lookup(self.client, 'GET', path, {})
+        self.assertIs(response, MISS)
+        cache.finish('GET', path, key)
+        self.assertIs(cache.lookup(self.client, 'GET', path, {})[1], MISS)
+        cache.finish('GET', path, key, {'user_id': 'DU1'})
+        self.assertEqual(cache.lookup(self.client, 'GET', path, {}),
+                         (key, {'user_id': 'DU1'}))
+        self.assertEqual(cache.lookup(self.client, 'POST', path, {}),
+                         (None, MISS))
+        # Failed changes still invalidate.
+        cache.finish('POST', path, None)
+        self.assertIs(cache.lookup(self.client, 'GET', path, {})[1], MISS)
+
+    def test_threads(self):
+        cache = EntityCache(max_entries=50)
+        keys = [cache.key(self.client, '/admin/v1/users/DU%d' % i, {})
+                for i in range(100)]
+
+        def worker():
+            for key in keys:
+                if cache.get(key) is MISS:
+                    cache.put(key, {})
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 50)
+
+
+class TestAdminEntityCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = EntityCache()
+        self.client = CountingAdmin(
+            'test_ikey', 'test_akey', 'example.com', entity_cache=self.cache)
+        self.client._connect = lambda: util.MockHTTPConnection()
+
+    def test_lookups_cached(self):
+        first = self.client.get_user_by_id('DU1')
+        second = self.client.get_user_by_id('DU1')
+        self.assertEqual(first, second)
+        self.client.get_phone_by_id('DP1')
+        self.client.get_group('DG1', api_version=2)
+        self.client.get_integration('DI1')
+        self.client.get_admin('DE1')
+        self.client.get_group('DG1', api_version=2)
+        self.assertEqual(self.client.counter, 5)
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_mutations_invalidate(self):
+        self.client.get_user_by_id('DU1')
+        self.client.get_group('DG1', api_version=2)
+        self.client.update_user('DU1', realname='x')
+        self.client.get_user_by_id('DU1')
+        self.client.get_group('DG1', api_version=2)
+        self.assertEqual(self.client.counter, 4)
+        self.client.delete_group('DG1')
+        self.client.get_group('DG1', api_version=2)
+        self.assertEqual(self.client.counter, 6)
+
+    def test_lists_not_cached(self):
+        self.client._connect = \
+            lambda: util.MockHTTPConnection(data_response_should_be_list=True)
+        self.client.get_users_by_name('user')
+        self.client.get_users_by_name('user')
+        self.assertEqual(self.client.counter, 2)
+
+    def test_no_cache(self):
+        self.client.entity_cache = None
+        self.client.get_user_by_id('DU1')
+        self.client.get_user_by_id('DU1')
+        self.assertEqual(self.client.counter, 2)
+
+
+class TestEntityCacheBackend(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.store = SQLiteCache(os.path.join(tmpdir, 'cache.db'))
+        self.addCleanup(self.store.close)
+
+    def client(self):
+        client = CountingAdmin(
+            'test_ikey', 'test_akey', 'example.com',
+            entity_cache=EntityCache(ttls={'phones': 0}, backend=self.store))
+        client._connect = lambda: util.MockHTTPConnection()
+        return client
+
+    def test_shared_between_runs(self):
+        first = self.client()
+        user = first.get_user_by_id('DU1')
+        first.get_phone_by_id('DP1')
+        second = self.client()
+        self.assertEqual(second.get_user_by_id('DU1'), user)
+        self.assertEqual(second.get_user_by_id('DU1'), user)
+        second.get_phone_by_id('DP1')
+        self.assertEqual(second.counter, 1)
+        self.assertEqual(second.entity_cache.stats()['hits'], 2)
+        self.assertEqual(self.store.stats()['entries'], 1)
+
+    def test_invalidation(self):
+        first = self.client()
+        first.get_user_by_id('DU1')
+        first.update_user('DU1', realname='x')
+        self.assertEqual(self.store.stats()['entries'], 0)
+        first.get_user_by_id('DU1')
+        first.entity_cache.clear()
+        self.assertEqual(self.store.stats()['entries'], 0)
+
+    def test_backend_ttl(self):
+        cache = EntityCache(ttls={'users': 10}, backend=self.store)
+        key = cache.key(self.client(), '/admin/v1/users/DU1', {})
+        with mock.patch('duo_client.sqlite_cache.time.time') as mock_time:
+            mock_time.return_value = 1000
+            cache.put(key, {'user_id': 'DU1'})
+            mock_time.return_value = 1010
+            self.assertIs(EntityCache(backend=self.store).get(key), MISS)
+
+
+if __name__ == '__main__':
+    unittest.main()
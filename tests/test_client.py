@@ -1,6 +1,7 @@
 import hashlib
 import http.client
 import ssl
+import time
 from unittest import mock
 import unittest
 import duo_client.client
@@ -9,6 +10,9 @@ from . import util
 import base64
 import collections
 import json
+import random
+import string
+import urllib.parse
 
 JSON_BODY = {
             'data': 'abc123',
@@ -108,6 +112,82 @@ class TestQueryParameters(unittest.TestCase):
         )
 
 
+def reference_canon_params(params):
+    """
+    canon_params as it was before quoting was memoized, to check the
+    current implementation against.
+    """
+    args = []
+    for (key, vals) in sorted(
+        (urllib.parse.quote(key, '~'), vals) for (key, vals) in list(params.items())):
+        for val in sorted(urllib.parse.quote(val, '~') for val in vals):
+            args.append('%s=%s' % (key, val))
+    return '&'.join(args)
+
+
+class TestCanonParamsEquivalence(unittest.TestCase):
+    """
+    Randomized checks that canon_params matches the reference
+    implementation byte for byte.
+    """
+    alphabet = (string.ascii_letters + string.digits + '_.-~' +
+                ' !"#$%&\'()*+,/:;<=>?@[\\]^`{|}' + '\x00\n\t\x7f' +
+                '\xe9\xfc\u20ac\u469a\u2620\U0001f600')
+
+    def random_string(self, rng):
+        length = rng.choice([0, 1, 3, 10, 40, 300])
+        if rng.random() < 0.5:
+            # Mostly ASCII-safe, like typical parameters.
+            chars = string.ascii_letters + string.digits + '_.-~'
+        else:
+            chars = self.alphabet
+        return ''.join(rng.choice(chars) for _ in range(length))
+
+    def random_params(self, rng):
+        params = {}
+        for _ in range(rng.randint(0, 6)):
+            key = self.random_string(rng)
+            if rng.random() < 0.3:
+                params[key] = self.random_string(rng)
+            else:
+                params[key] = [
+                    rng.choice([self.random_string(rng),
+                                rng.randint(-5, 10**6), True, False])
+                    for _ in range(rng.randint(0, 4))]
+        return params
+
+    def test_normalized_params(self):
+        rng = random.Random(1234)  # noqa: DUO102, reproducible test data
+        for _ in range(500):
+            params = duo_client.client.normalize_params(self.random_params(rng))
+            self.assertEqual(duo_client.client.canon_params(params),
+                             reference_canon_params(params))
+
+    def test_str_params(self):
+        rng = random.Random(5678)  # noqa: DUO102, reproducible test data
+        for _ in range(500):
+            params = dict(
+                (self.random_string(rng),
+                 [self.random_string(rng) for _ in range(rng.randint(1, 3))])
+                for _ in range(rng.randint(0, 6)))
+            self.assertEqual(duo_client.client.canon_params(params),
+                             reference_canon_params(params))
+
+    def test_repeated_values_memoized(self):
+        params = duo_client.client.normalize_params(
+            {'username list': ['a b', 'c@d'], 'limit': '100'})
+        expected = reference_canon_params(params)
+        for _ in range(3):
+            self.assertEqual(duo_client.client.canon_params(params), expected)
+
+    def test_invalid_value_raises_like_quote(self):
+        params = duo_client.client.normalize_params({'a': None})
+        with self.assertRaises(TypeError):
+            reference_canon_params(params)
+        with self.assertRaises(TypeError):
+            duo_client.client.canon_params(params)
+
+
 class TestCanonicalize(unittest.TestCase):
     """
     Tests of the canonicalization of request attributes and parameters
@@ -312,6 +392,73 @@ class TestSign(unittest.TestCase):
         self.assertEqual(actual,
                          expected)
 
+class TestSigner(unittest.TestCase):
+    skey = 'gtdfxv9YgVBYcF6dl2Eq17KUQJN2PLM2ODVTkvoT'
+    request = {
+        'method': 'POST',
+        'host': 'foo.bar52.com',
+        'uri': '/Foo/BaR2/qux',
+        'date': 'Fri, 07 Dec 2012 17:18:00 -0000',
+    }
+
+    def test_matches_sign(self):
+        signer = duo_client.client.Signer('test_ikey', self.skey)
+        params = duo_client.client.normalize_params({'a': ['1'], 'b': 'x y'})
+        for (sig_version, digestmod, body) in [
+                (1, hashlib.sha1, None),
+                (2, hashlib.sha1, None),
+                (2, hashlib.sha512, None),
+                (4, hashlib.sha512, '{"a":"1"}'),
+                (5, hashlib.sha512, '{"a":"1"}')]:
+            for _ in range(2):
+                expected = duo_client.client.sign(
+                    'test_ikey', self.skey, sig_version=sig_version,
+                    params=params, body=body, digestmod=digestmod,
+                    **self.request)
+                actual = signer.sign(
+                    sig_version=sig_version, params=params, body=body,
+                    digestmod=digestmod, **self.request)
+                self.assertEqual(actual, expected)
+
+    @mock.patch('duo_client.client.email.utils.formatdate')
+    @mock.patch('duo_client.client.time.time')
+    def test_date_cached_per_second(self, mock_time, mock_formatdate):
+        mock_formatdate.side_effect = lambda second: 'date %d' % second
+        signer = duo_client.client.Signer('test_ikey', self.skey)
+        mock_time.return_value = 1000.1
+        self.assertEqual(signer.date(), 'date 1000')
+        mock_time.return_value = 1000.9
+        self.assertEqual(signer.date(), 'date 1000')
+        mock_time.return_value = 1001.0
+        self.assertEqual(signer.date(), 'date 1001')
+        self.assertEqual(mock_formatdate.call_count, 2)
+
+    def test_date_utc(self):
+        signer = duo_client.client.Signer('test_ikey', self.skey)
+        with mock.patch('duo_client.client.time.time', return_value=1354900680):
+            self.assertEqual(signer.date(), 'Fri, 07 Dec 2012 17:18:00 -0000')
+
+    @mock.patch('duo_client.client.pytz.timezone',
+                wraps=duo_client.client.pytz.timezone)
+    def test_timezone_resolved_once(self, mock_timezone):
+        signer = duo_client.client.Signer(
+            'test_ikey', self.skey, sig_timezone='America/Detroit')
+        with mock.patch('duo_client.client.time.time') as mock_time:
+            mock_time.return_value = 1354900680
+            self.assertEqual(signer.date(), 'Fri, 07 Dec 2012 12:18:00 -0500')
+            mock_time.return_value = 1354900681
+            self.assertEqual(signer.date(), 'Fri, 07 Dec 2012 12:18:01 -0500')
+        mock_timezone.assert_called_once_with('America/Detroit')
+
+    def test_client_signer_follows_keys(self):
+        client = duo_client.client.Client('test_ikey', self.skey, 'example.com')
+        signer = client.get_signer()
+        self.assertIs(client.get_signer(), signer)
+        client.skey = 'other'
+        self.assertIsNot(client.get_signer(), signer)
+        self.assertEqual(client.get_signer().skey, 'other')
+
+
 class TestRequest(unittest.TestCase):
     """ Tests for the request created by api_call and json_api_call. """
     # usful args for testing
@@ -415,6 +562,167 @@ class TestPaging(unittest.TestCase):
         self.assertListEqual(expected, list(response))
         self.assertEqual(1, self.client.counter)
 
+
+class TestPrefetchPaging(unittest.TestCase):
+    def setUp(self):
+        self.client = util.CountingClient(
+            'test_ikey', 'test_akey', 'example.com', paging_limit=100)
+        self.objects = [util.MockJsonObject() for i in range(1000)]
+        self.client._connect = lambda: util.MockPagingHTTPConnection(self.objects)
+
+    def wait_for_counter(self, value):
+        deadline = time.monotonic() + 5
+        while self.client.counter < value and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_prefetch_returns_all_objects_in_order(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, prefetch=2)
+        expected = [obj.to_json() for obj in self.objects]
+        self.assertListEqual(expected, list(response))
+        self.assertEqual(10, self.client.counter)
+
+    def test_prefetch_default_from_client(self):
+        self.client.paging_prefetch = 3
+        with mock.patch('duo_client.client.prefetch_pages',
+                        wraps=duo_client.client.prefetch_pages) as mock_prefetch:
+            self.assertEqual(
+                len(self.objects),
+                len(list(self.client.json_paging_api_call(
+                    'GET', '/admin/v1/objects', {}))))
+        self.assertEqual(mock_prefetch.call_args[0][1], 3)
+
+    def test_prefetch_is_bounded(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, prefetch=2)
+        next(response)
+        # The page being consumed plus two prefetched pages.
+        self.wait_for_counter(3)
+        time.sleep(0.05)
+        self.assertEqual(3, self.client.counter)
+        response.close()
+
+    def test_prefetch_stops_when_closed(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, prefetch=1)
+        next(response)
+        response.close()
+        time.sleep(0.3)
+        self.assertLessEqual(self.client.counter, 2)
+
+    def test_prefetch_raises_errors(self):
+        def pages():
+            yield [1, 2]
+            raise RuntimeError('Received 500 Internal Server Error')
+        response = duo_client.client.prefetch_pages(pages(), 2)
+        self.assertEqual([1, 2], next(response))
+        with self.assertRaises(RuntimeError):
+            next(response)
+
+    def test_cursor_prefetch(self):
+        self.client._connect = lambda: util.MockAlternatePagingHTTPConnection(self.objects)
+        response = self.client.json_cursor_api_call(
+            'GET', '/admin/v1/objects', {}, lambda resp: resp['data'],
+            prefetch=2)
+        expected = [obj.to_json() for obj in self.objects]
+        self.assertListEqual(expected, list(response))
+        self.assertEqual(10, self.client.counter)
+
+
+class MockCappedPagingHTTPConnection(util.MockPagingHTTPConnection):
+    """ Paging connection whose server caps the page size at 150. """
+    def request(self, method, uri, body, headers):
+        super(MockCappedPagingHTTPConnection, self).request(
+            method, uri, body, headers)
+        self.limit = min(self.limit, 150)
+
+
+class MockNoTotalPagingHTTPConnection(util.MockPagingHTTPConnection):
+    """ Paging connection that does not report total_objects. """
+    def read(self):
+        data = json.loads(super(MockNoTotalPagingHTTPConnection, self).read())
+        del data['metadata']['total_objects']
+        return json.dumps(data)
+
+
+class TestParallelPaging(unittest.TestCase):
+    def setUp(self):
+        self.client = util.CountingClient(
+            'test_ikey', 'test_akey', 'example.com', paging_limit=100)
+        self.objects = [util.MockJsonObject() for i in range(1000)]
+        self.expected = [obj.to_json() for obj in self.objects]
+        self.client._connect = lambda: util.MockPagingHTTPConnection(self.objects)
+
+    def test_parallel_ordered(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, concurrency=4)
+        self.assertListEqual(self.expected, list(response))
+        self.assertEqual(10, self.client.counter)
+
+    def test_parallel_unordered(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, concurrency=4, ordered=False)
+        result = list(response)
+        self.assertEqual(len(self.expected), len(result))
+        self.assertEqual(
+            sorted(obj['id'] for obj in self.expected),
+            sorted(obj['id'] for obj in result))
+        self.assertEqual(10, self.client.counter)
+
+    def test_parallel_default_from_client(self):
+        self.client.paging_concurrency = 3
+        with mock.patch.object(self.client, '_json_parallel_paging_pages',
+                               wraps=self.client._json_parallel_paging_pages) as pages:
+            self.assertListEqual(
+                self.expected,
+                list(self.client.json_paging_api_call('GET', '/admin/v1/objects', {})))
+        self.assertEqual(pages.call_args[0][3], 3)
+
+    def test_parallel_single_page(self):
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {'limit': '1000'}, concurrency=4)
+        self.assertListEqual(self.expected, list(response))
+        self.assertEqual(1, self.client.counter)
+
+    def test_parallel_uses_server_page_size(self):
+        self.client._connect = lambda: MockCappedPagingHTTPConnection(self.objects)
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {'limit': '500'}, concurrency=4)
+        self.assertListEqual(self.expected, list(response))
+        self.assertEqual(7, self.client.counter)
+
+    def test_parallel_without_total_is_sequential(self):
+        self.client._connect = lambda: MockNoTotalPagingHTTPConnection(self.objects)
+        response = self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, concurrency=4)
+        self.assertListEqual(self.expected, list(response))
+        self.assertEqual(10, self.client.counter)
+
+    def test_parallel_reads_objects_added_during_paging(self):
+        fetch_page = self.client._fetch_page
+        def growing_fetch(method, path, params):
+            if params['offset'] == '500' and len(self.objects) == 1000:
+                self.objects.extend(util.MockJsonObject() for i in range(50))
+            return fetch_page(method, path, params)
+        self.client._fetch_page = growing_fetch
+        result = list(self.client.json_paging_api_call(
+            'GET', '/admin/v1/objects', {}, concurrency=2))
+        self.assertEqual(1050, len(self.objects))
+        self.assertEqual([obj.to_json() for obj in self.objects], result)
+        self.assertEqual(11, self.client.counter)
+
+    def test_parallel_raises_errors(self):
+        fetch_page = self.client._fetch_page
+        def failing_fetch(method, path, params):
+            if params['offset'] == '500':
+                raise RuntimeError('Received 500 Internal Server Error')
+            return fetch_page(method, path, params)
+        self.client._fetch_page = failing_fetch
+        with self.assertRaises(RuntimeError):
+            list(self.client.json_paging_api_call(
+                'GET', '/admin/v1/objects', {}, concurrency=4))
+
+
 class TestAlternatePaging(unittest.TestCase):
     def setUp(self):
         self.client = util.CountingClient(
@@ -710,7 +1018,7 @@ class TestRetryRequests(unittest.TestCase):
         self.assertEqual(response.status, 200)
         self.assertEqual(mock_connection.requests, 1)
 
-    @mock.patch('duo_client.client.random')
+    @mock.patch('duo_client.retry.random')
     def test_single_limited_response(self, mock_random, mock_sleep):
         mock_random.uniform.return_value = 0.123
         # monkeypatch client's _connect()
@@ -725,7 +1033,7 @@ class TestRetryRequests(unittest.TestCase):
         self.assertEqual(response.status, 200)
         self.assertEqual(mock_connection.requests, 2)
 
-    @mock.patch('duo_client.client.random')
+    @mock.patch('duo_client.retry.random')
     def test_all_limited_responses(self, mock_random, mock_sleep):
         mock_random.uniform.return_value = 0.123
         # monkeypatch client's _connect()
@@ -844,5 +1152,12 @@ class TestDisableCaPinningConnect(unittest.TestCase):
         self.assertIsInstance(conn, duo_client.https_wrapper.CertValidatingHTTPSConnection)
         self.assertEqual(conn.default_ssl_context.verify_mode, ssl.CERT_REQUIRED)
 
+    def test_connect_shares_tls_session_cache(self):
+        client = duo_client.client.Client('ikey', 'skey', 'host.example.com')
+        first = client._connect()
+        second = client._connect()
+        self.assertIs(first.session_cache, client.tls_session_cache)
+        self.assertIs(second.session_cache, client.tls_session_cache)
+
 if __name__ == '__main__':
     unittest.main()
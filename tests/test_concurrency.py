@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import duo_client.client
+from duo_client.concurrency import AIMDController
+from . import util
+
+
+class TestAIMDController(unittest.TestCase):
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            AIMDController(initial_window=0)
+        with self.assertRaises(ValueError):
+            AIMDController(initial_window=8, max_window=4)
+        with self.assertRaises(ValueError):
+            AIMDController(decrease=1)
+
+    def test_additive_increase(self):
+        controller = AIMDController(initial_window=2, max_window=3)
+        for _ in range(2):
+            controller.release(controller.acquire(), 200)
+        self.assertEqual(controller.window, 2)
+        for _ in range(2):
+            controller.release(controller.acquire(), 200)
+        self.assertEqual(controller.window, 3)
+        for _ in range(10):
+            controller.release(controller.acquire(), 200)
+        self.assertEqual(controller.window, 3)
+
+    def test_multiplicative_decrease_once_per_window(self):
+        controller = AIMDController(initial_window=8)
+        tokens = [controller.acquire() for _ in range(8)]
+        self.assertEqual(controller.in_flight, 8)
+        for token in tokens:
+            controller.release(token, 429)
+        self.assertEqual(controller.window, 4)
+        self.assertEqual(controller.in_flight, 0)
+        controller.release(controller.acquire(), 429)
+        self.assertEqual(controller.window, 2)
+
+    def test_min_window(self):
+        controller = AIMDController(initial_window=1)
+        for _ in range(3):
+            controller.release(controller.acquire(), 429)
+        self.assertEqual(controller.window, 1)
+
+    @mock.patch('duo_client.concurrency.time.monotonic')
+    def test_latency_spike(self, mock_monotonic):
+        controller = AIMDController(initial_window=4, latency_threshold=2)
+        mock_monotonic.return_value = 10
+        token = controller.acquire()
+        mock_monotonic.return_value = 13
+        controller.release(token, 200)
+        self.assertEqual(controller.window, 2)
+
+    def test_errors_leave_window(self):
+        controller = AIMDController(initial_window=4)
+        controller.release(controller.acquire(), None)
+        controller.release(controller.acquire(), 503)
+        self.assertEqual(controller.window, 4)
+
+    def test_acquire_blocks_at_window(self):
+        controller = AIMDController(initial_window=1)
+        token = controller.acquire()
+        self.assertIsNone(controller.acquire(timeout=0.01))
+        acquired = []
+        thread = threading.Thread(
+            target=lambda: acquired.append(controller.acquire()))
+        thread.start()
+        controller.release(token, 200)
+        thread.join(5)
+        self.assertEqual(len(acquired), 1)
+
+    def test_acquire_async(self):
+        controller = AIMDController(initial_window=2)
+
+        async def run():
+            running = []
+            peak = []
+
+            async def task():
+                token = await controller.acquire_async()
+                running.append(1)
+                peak.append(len(running))
+                await asyncio.sleep(0)
+                running.pop()
+                controller.release(token, 200)
+            await asyncio.gather(*[task() for _ in range(6)])
+            return max(peak)
+        self.assertLessEqual(asyncio.run(run()), 3)
+        self.assertEqual(controller.in_flight, 0)
+
+
+class MockStatusConnection(util.MockHTTPConnection):
+    status = 429
+    reason = 'Too Many Requests'
+
+
+class TestClientConcurrencyController(unittest.TestCase):
+    def setUp(self):
+        self.controller = AIMDController(initial_window=4)
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com',
+            concurrency_controller=self.controller)
+
+    def test_success_grows_window(self):
+        self.client._connect = lambda: util.MockHTTPConnection()
+        for _ in range(5):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.controller.window, 5)
+        self.assertEqual(self.controller.in_flight, 0)
+
+    @mock.patch('duo_client.client.sleep')
+    def test_rate_limit_shrinks_window(self, mock_sleep):
+        self.client._connect = lambda: MockStatusConnection()
+        self.client._MAX_BACKOFF_WAIT_SECS = 0
+        with self.assertRaises(RuntimeError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.controller.window, 2)
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_error_releases_slot(self):
+        class FailingConnection(util.MockHTTPConnection):
+            def request(self, *args):
+                raise ConnectionResetError()
+        self.client._connect = lambda: FailingConnection()
+        with self.assertRaises(ConnectionResetError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_controller_does_not_enable_parallel_paging(self):
+        with mock.patch.object(self.client, '_json_parallel_paging_pages',
+                               return_value=iter([])) as parallel:
+            with mock.patch.object(self.client, '_json_paging_pages',
+                                   return_value=iter([])) as sequential:
+                list(self.client.json_paging_api_call('GET', '/foo', {}))
+                parallel.assert_not_called()
+                sequential.assert_called_once()
+                self.client.paging_concurrency = 3
+                list(self.client.json_paging_api_call('GET', '/foo', {}))
+        self.assertEqual(parallel.call_args[0][3], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import http.client
+import socket
+import unittest
+from unittest import mock
+
+import duo_client.client
+from duo_client.connection_pool import ConnectionPool, is_connection_dropped
+from . import util
+
+
+class MockPooledHTTPConnection(util.MockHTTPConnection):
+    """
+    Mock connection that records how it is used and can fail on demand.
+    """
+    will_close = False
+
+    def __init__(self, fail_with=None, fail_after_send=False):
+        super(MockPooledHTTPConnection, self).__init__()
+        self.requests = 0
+        self.closed = False
+        self.fail_with = fail_with
+        self.fail_after_send = fail_after_send
+
+    def request(self, method, uri, body, headers):
+        if self.fail_with is not None and not self.fail_after_send:
+            raise self.fail_with
+        self.requests += 1
+        super(MockPooledHTTPConnection, self).request(
+            method, uri, body, headers)
+
+    def getresponse(self):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return self
+
+    def read(self):
+        return b'{"stat": "OK", "response": {}}'
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_put_and_get(self):
+        pool = ConnectionPool()
+        conn = MockPooledHTTPConnection()
+        pool.put('key', conn)
+        self.assertEqual(pool.idle_count('key'), 1)
+        self.assertIs(pool.get('key'), conn)
+        self.assertIsNone(pool.get('key'))
+
+    def test_keys_are_separate(self):
+        pool = ConnectionPool()
+        pool.put('a', MockPooledHTTPConnection())
+        self.assertIsNone(pool.get('b'))
+        self.assertEqual(pool.idle_count(), 1)
+
+    def test_max_size(self):
+        pool = ConnectionPool(max_size=1)
+        first = MockPooledHTTPConnection()
+        second = MockPooledHTTPConnection()
+        pool.put('key', first)
+        pool.put('key', second)
+        self.assertEqual(pool.idle_count('key'), 1)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+
+    def test_invalid_max_size(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(max_size=0)
+
+    @mock.patch('duo_client.connection_pool.time.monotonic')
+    def test_idle_timeout(self, mock_monotonic):
+        pool = ConnectionPool(idle_timeout=10)
+        conn = MockPooledHTTPConnection()
+        mock_monotonic.return_value = 100
+        pool.put('key', conn)
+        mock_monotonic.return_value = 111
+        self.assertIsNone(pool.get('key'))
+        self.assertTrue(conn.closed)
+
+    def test_dropped_connection_discarded(self):
+        (ours, theirs) = socket.socketpair()
+        self.addCleanup(ours.close)
+        conn = MockPooledHTTPConnection()
+        conn.sock = ours
+        self.assertFalse(is_connection_dropped(conn))
+        theirs.close()
+        self.assertTrue(is_connection_dropped(conn))
+
+        pool = ConnectionPool()
+        pool.put('key', conn)
+        self.assertIsNone(pool.get('key'))
+        self.assertTrue(conn.closed)
+
+    def test_clear(self):
+        pool = ConnectionPool()
+        conn = MockPooledHTTPConnection()
+        pool.put('key', conn)
+        pool.clear()
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.idle_count(), 0)
+
+
+class TestClientConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool()
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com',
+            connection_pool=self.pool)
+        self.connections = []
+
+        def connect():
+            conn = MockPooledHTTPConnection()
+            self.connections.append(conn)
+            return conn
+        self.client._connect = connect
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.connections[0].requests, 3)
+        self.assertFalse(self.connections[0].closed)
+
+    def test_no_pool_closes_connection(self):
+        self.client.connection_pool = None
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(len(self.connections), 2)
+        self.assertTrue(all(conn.closed for conn in self.connections))
+
+    def test_will_close_not_pooled(self):
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.connections[0].will_close = True
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(self.pool.idle_count(), 0)
+
+    def test_stale_connection_reconnects(self):
+        stale = MockPooledHTTPConnection(
+            fail_with=http.client.RemoteDisconnected('closed'))
+        self.pool.put(self.client._connection_key(), stale)
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertTrue(stale.closed)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.connections[0].requests, 1)
+
+    def test_stale_connection_after_send_replays_get(self):
+        stale = MockPooledHTTPConnection(
+            fail_with=http.client.RemoteDisconnected('closed'),
+            fail_after_send=True)
+        self.pool.put(self.client._connection_key(), stale)
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(stale.requests, 1)
+        self.assertEqual(self.connections[0].requests, 1)
+
+    def test_stale_connection_after_send_not_replayed_for_post(self):
+        # The server may have acted on the request before disconnecting.
+        stale = MockPooledHTTPConnection(
+            fail_with=http.client.RemoteDisconnected('closed'),
+            fail_after_send=True)
+        self.pool.put(self.client._connection_key(), stale)
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.client.json_api_call('POST', '/auth/v2/auth', {})
+        self.assertEqual(stale.requests, 1)
+        self.assertEqual(self.connections, [])
+
+    def test_stale_connection_before_send_replays_post(self):
+        stale = MockPooledHTTPConnection(fail_with=BrokenPipeError())
+        self.pool.put(self.client._connection_key(), stale)
+        self.client.json_api_call('POST', '/auth/v2/auth', {})
+        self.assertEqual(stale.requests, 0)
+        self.assertEqual(self.connections[0].requests, 1)
+
+    def test_fresh_connection_error_raises(self):
+        def connect():
+            return MockPooledHTTPConnection(fail_with=ConnectionResetError())
+        self.client._connect = connect
+        with self.assertRaises(ConnectionResetError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.pool.idle_count(), 0)
+
+    def test_pool_keyed_by_host(self):
+        other = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'other.example.com',
+            connection_pool=self.pool)
+        self.assertNotEqual(
+            self.client._connection_key(), other._connection_key())
+
+    def test_pool_keyed_by_timeout(self):
+        other = duo_client.client.Client(
+            'test_ikey', 'test_akey', self.client.host, timeout=5,
+            connection_pool=self.pool)
+        self.assertNotEqual(
+            self.client._connection_key(), other._connection_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
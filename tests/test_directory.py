@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.parse
+
+import duo_client.admin
+from duo_client.directory import DirectoryMirror, normalize_phone_number
+from duo_client.sqlite_cache import SQLiteCache
+from . import util
+
+GROUPS = [
+    {'group_id': 'DG1', 'name': 'Staff'},
+    {'group_id': 'DG2', 'name': 'Admins'},
+]
+PHONES = [
+    {'phone_id': 'DP1', 'number': '+15555550100'},
+    {'phone_id': 'DP2', 'number': '+15555550101'},
+]
+TOKENS = [{'token_id': 'DT1', 'serial': '123'}]
+
+
+def make_users():
+    return [
+        {'user_id': 'DU1', 'username': 'alice', 'email': 'Alice@example.com',
+         'aliases': {'alias1': 'asmith', 'alias2': None},
+         'phones': [PHONES[0]], 'groups': GROUPS, 'tokens': TOKENS},
+        {'user_id': 'DU2', 'username': 'bob', 'email': 'bob@example.com',
+         'alias1': 'rob', 'phones': [PHONES[1]], 'groups': [GROUPS[0]],
+         'tokens': []},
+        {'user_id': 'DU3', 'username': 'carol', 'email': None,
+         'phones': [], 'groups': [], 'tokens': []},
+    ]
+
+
+class MockDirectoryConnection(util.MockHTTPConnection):
+    """
+    Serves the users, groups, phones and tokens collections in pages of
+    two, and single users by id.
+    """
+    collections = {}
+    requests = []
+
+    def read(self):
+        parsed = urllib.parse.urlparse(self.uri)
+        params = urllib.parse.parse_qs(parsed.query)
+        self.requests.append(parsed.path)
+        parts = parsed.path.split('/')
+        objects = self.collections[parts[3]]
+        if len(parts) == 5:
+            for obj in objects:
+                if obj['user_id'] == parts[4]:
+                    return json.dumps({'stat': 'OK', 'response': obj})
+            self.status = 404
+            self.reason = 'Not Found'
+            return json.dumps({'stat': 'FAIL', 'code': 40401,
+                               'message': 'Resource not found'})
+        offset = int(params['offset'][0])
+        metadata = {'total_objects': len(objects)}
+        if offset + 2 < len(objects):
+            metadata['next_offset'] = offset + 2
+        return json.dumps({'stat': 'OK',
+                           'response': objects[offset:offset + 2],
+                           'metadata': metadata})
+
+
+class TestDirectoryMirror(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.admin.Admin(
+            'test_ikey', 'test_akey', 'example.com', paging_limit=2)
+        self.client._connect = lambda: MockDirectoryConnection()
+        MockDirectoryConnection.collections = {
+            'users': make_users(), 'groups': list(GROUPS),
+            'phones': list(PHONES), 'tokens': list(TOKENS),
+            'integrations': [{'integration_key': 'DI1'}]}
+        MockDirectoryConnection.requests = []
+        self.mirror = DirectoryMirror(self.client)
+        self.mirror.refresh()
+
+    def test_lookups(self):
+        mirror = self.mirror
+        self.assertEqual(mirror.get_user('DU2')['username'], 'bob')
+        self.assertEqual(mirror.get_user_by_username('ALICE')['user_id'],
+                         'DU1')
+        self.assertIsNone(mirror.get_user_by_username('dave'))
+        self.assertEqual([u['user_id'] for u in
+                          mirror.get_users_by_alias('ASmith')], ['DU1'])
+        self.assertEqual([u['user_id'] for u in
+                          mirror.get_users_by_alias('rob')], ['DU2'])
+        self.assertEqual([u['user_id'] for u in
+                          mirror.get_users_by_email('alice@EXAMPLE.com')],
+                         ['DU1'])
+        self.assertEqual(
+            [u['user_id'] for u in
+             mirror.get_users_by_phone_number('+1 (555) 555-0101')],
+            ['DU2'])
+        self.assertEqual([p['phone_id'] for p in
+                          mirror.get_phones_by_number('15555550100')], [])
+        self.assertEqual([p['phone_id'] for p in
+                          mirror.get_phones_by_number('+15555550100')],
+                         ['DP1'])
+        self.assertEqual(mirror.get_token('DT1')['serial'], '123')
+        self.assertEqual(mirror.get_user_aliases('DU1'), ['asmith'])
+        self.assertEqual(len(mirror.users()), 3)
+        self.assertEqual(len(mirror.tokens()), 1)
+
+    def test_groups(self):
+        mirror = self.mirror
+        self.assertEqual(
+            sorted(u['user_id'] for u in mirror.get_group_members('DG1')),
+            ['DU1', 'DU2'])
+        self.assertEqual([g['group_id'] for g in
+                          mirror.get_groups_by_name('admins')], ['DG2'])
+        self.assertEqual([g['name'] for g in mirror.get_user_groups('DU1')],
+                         ['Staff', 'Admins'])
+        self.assertEqual(mirror.get_user_groups('DU9'), [])
+
+    def test_refresh_max_age(self):
+        self.assertEqual(self.mirror.refresh(max_age=3600), [])
+        self.mirror._snapshot.fetched['groups'] = 0
+        self.assertEqual(self.mirror.refresh(max_age=3600), ['groups'])
+        self.assertEqual(self.mirror.refresh(['tokens']), ['tokens'])
+
+    def test_refresh_picks_up_changes(self):
+        MockDirectoryConnection.collections['users'][2]['groups'] = [GROUPS[1]]
+        self.mirror.refresh(['users'])
+        self.assertEqual([u['user_id'] for u in
+                          self.mirror.get_group_members('DG2')],
+                         ['DU1', 'DU3'])
+
+    def test_refresh_user(self):
+        users = MockDirectoryConnection.collections['users']
+        users[1] = dict(users[1], username='robert', alias1=None,
+                        groups=[GROUPS[1]])
+        self.mirror.refresh_user('DU2')
+        self.assertEqual(MockDirectoryConnection.requests[-1],
+                         '/admin/v1/users/DU2')
+        self.assertIsNone(self.mirror.get_user_by_username('bob'))
+        self.assertEqual(self.mirror.get_user_by_username('robert')['user_id'],
+                         'DU2')
+        self.assertEqual(self.mirror.get_users_by_alias('rob'), [])
+        self.assertEqual([u['user_id'] for u in
+                          self.mirror.get_group_members('DG1')], ['DU1'])
+        del users[1]
+        self.mirror.refresh_user('DU2')
+        self.assertIsNone(self.mirror.get_user('DU2'))
+        self.assertEqual(len(self.mirror.get_group_members('DG2')), 1)
+
+    def test_save_and_load(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'directory.json.gz')
+        self.mirror.save(path)
+        loaded = DirectoryMirror.load(self.client, path)
+        self.assertEqual(loaded.fetched, self.mirror.fetched)
+        self.assertEqual(loaded.get_user_by_username('bob')['user_id'], 'DU2')
+        self.assertEqual(len(loaded.get_group_members('DG1')), 2)
+        self.assertEqual(os.listdir(tmpdir), ['directory.json.gz'])
+        empty = DirectoryMirror.load(self.client, path + '.missing')
+        self.assertEqual(empty.users(), [])
+
+    def test_store(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        store = SQLiteCache(os.path.join(tmpdir, 'cache.db'))
+        self.addCleanup(store.close)
+        first = DirectoryMirror(self.client, store=store)
+        first.refresh()
+        MockDirectoryConnection.requests = []
+        second = DirectoryMirror(self.client, store=store)
+        self.assertEqual(second.refresh(max_age=3600), list(second.collections))
+        self.assertEqual(MockDirectoryConnection.requests, [])
+        self.assertEqual(second.fetched, first.fetched)
+        self.assertEqual(second.get_user_by_username('bob')['user_id'], 'DU2')
+        # Without max_age, collections are always downloaded.
+        second.refresh(['tokens'])
+        self.assertEqual(MockDirectoryConnection.requests,
+                         ['/admin/v1/tokens'])
+
+    def test_collections(self):
+        mirror = DirectoryMirror(self.client, collections=['groups'])
+        self.assertEqual(mirror.collections, ('users', 'groups'))
+        mirror = DirectoryMirror(self.client, collections=['integrations'])
+        mirror.refresh()
+        self.assertEqual(mirror.get_integration('DI1'),
+                         {'integration_key': 'DI1'})
+        with self.assertRaises(ValueError):
+            DirectoryMirror(self.client, collections=['bogus'])
+
+    def test_normalize_phone_number(self):
+        self.assertEqual(normalize_phone_number(' +1 (555) 555-0100 '),
+                         '+15555550100')
+        self.assertEqual(normalize_phone_number(None), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
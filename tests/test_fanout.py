@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+
+import duo_client.accounts
+from duo_client.fanout import AccountFanout
+
+
+def make_accounts(n):
+    return [{'account_id': 'DA%d' % i, 'name': 'account %d' % i,
+             'api_hostname': 'api-%d.example.com' % (i % 2)}
+            for i in range(n)]
+
+
+class TestAccountFanout(unittest.TestCase):
+    def setUp(self):
+        self.accounts_api = duo_client.accounts.Accounts(
+            'test_ikey', 'test_skey', 'example.com')
+        self.accounts_api.get_child_accounts = lambda: make_accounts(6)
+
+    def test_results_and_errors(self):
+        def func(admin):
+            if admin.account_id == 'DA3':
+                raise RuntimeError('Received 403 Access forbidden')
+            return (admin.account_id, admin.host, admin.ikey)
+
+        results = list(AccountFanout(self.accounts_api, workers=3).run(func))
+        self.assertEqual(sorted(r.account_id for r in results),
+                         ['DA%d' % i for i in range(6)])
+        for result in results:
+            if result.account_id == 'DA3':
+                self.assertIsNone(result.value)
+                self.assertEqual(str(result.error),
+                                 'Received 403 Access forbidden')
+            else:
+                self.assertIsNone(result.error)
+                self.assertEqual(result.value, (
+                    result.account_id, result.account['api_hostname'],
+                    'test_ikey'))
+            self.assertGreaterEqual(result.elapsed, 0)
+
+    def test_run_all(self):
+        def func(admin):
+            if admin.account_id == 'DA1':
+                raise RuntimeError('Received 500 Internal Error')
+            return admin.host
+
+        (values, errors) = AccountFanout(self.accounts_api).run_all(
+            func, accounts=make_accounts(3))
+        self.assertEqual(values, {'DA0': 'api-0.example.com',
+                                  'DA2': 'api-0.example.com'})
+        self.assertEqual(list(errors), ['DA1'])
+
+    def test_per_host_pools_and_limiters(self):
+        fanout = AccountFanout(self.accounts_api, rate=5)
+        admins = [fanout.get_admin(account) for account in make_accounts(4)]
+        self.assertIs(admins[0].connection_pool, admins[2].connection_pool)
+        self.assertIs(admins[0].rate_limiter, admins[2].rate_limiter)
+        self.assertIsNot(admins[0].connection_pool, admins[1].connection_pool)
+        self.assertIsNot(admins[0].rate_limiter, admins[1].rate_limiter)
+        self.assertEqual(admins[0].rate_limiter.rate, 5)
+        self.assertIsNone(
+            AccountFanout(self.accounts_api).get_admin(
+                make_accounts(1)[0]).rate_limiter)
+
+    def test_streams_as_completed(self):
+        def func(admin):
+            if admin.account_id == 'DA0':
+                time.sleep(0.2)
+            return admin.account_id
+
+        results = AccountFanout(self.accounts_api, workers=6).run(func)
+        self.assertEqual([r.value for r in results][-1], 'DA0')
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def func(admin):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        list(AccountFanout(self.accounts_api, workers=2).run(
+            func, make_accounts(10)))
+        self.assertEqual(running[1], 2)
+
+    def test_close_early(self):
+        started = []
+
+        def accounts():
+            for account in make_accounts(100):
+                started.append(account['account_id'])
+                yield account
+
+        results = AccountFanout(self.accounts_api, workers=4).run(
+            lambda admin: time.sleep(0.01), accounts())
+        next(results)
+        results.close()
+        self.assertLess(len(started), 10)
+
+    def test_workers(self):
+        with self.assertRaises(ValueError):
+            AccountFanout(self.accounts_api, workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
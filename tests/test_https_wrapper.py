@@ -1,10 +1,19 @@
-from duo_client.https_wrapper import CertValidatingHTTPSConnection
+from duo_client.https_wrapper import (
+    CertValidatingHTTPSConnection,
+    TLSSessionCache,
+    clear_ssl_context_cache,
+    get_default_ssl_context,
+)
 import unittest
 from unittest import mock
 import ssl
 
 class TestSSLContextCreation(unittest.TestCase):
     """ Test that the SSL context used to wrap sockets is configured correctly """
+    def setUp(self):
+        clear_ssl_context_cache()
+        self.addCleanup(clear_ssl_context_cache)
+
     def test_no_ca_certs(self):
         conn = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com')
         self.assertEqual(conn.default_ssl_context.verify_mode, ssl.CERT_NONE)  # noqa: DUO122, testing insecure context
@@ -40,3 +49,110 @@ class TestSSLContextCreation(unittest.TestCase):
         conn = CertValidatingHTTPSConnection(f'{hostname}:443')
         conn.connect()
         self.assertEqual(conn.sock.server_hostname, hostname)
+
+
+class TestSSLContextCache(unittest.TestCase):
+    """ Test that SSL contexts are built once and shared between connections """
+    def setUp(self):
+        clear_ssl_context_cache()
+        self.addCleanup(clear_ssl_context_cache)
+
+    @mock.patch('ssl.SSLContext.load_verify_locations')
+    def test_ca_bundle_loaded_once(self, mock_load):
+        first = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', ca_certs='cafilepath')
+        second = CertValidatingHTTPSConnection('api-otherhost.duosecurity.com', ca_certs='cafilepath')
+        self.assertIs(first.default_ssl_context, second.default_ssl_context)
+        mock_load.assert_called_once_with(cafile='cafilepath')
+
+    @mock.patch('ssl.SSLContext.load_verify_locations')
+    def test_different_ca_certs_not_shared(self, mock_load):
+        first = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', ca_certs='cafilepath')
+        second = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', ca_certs='otherpath')
+        self.assertIsNot(first.default_ssl_context, second.default_ssl_context)
+        self.assertEqual(mock_load.call_count, 2)
+
+    @mock.patch('ssl.SSLContext.load_cert_chain')
+    def test_client_cert_part_of_key(self, mock_load):
+        first = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com')
+        second = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', cert_file='certfilepath')
+        self.assertIsNot(first.default_ssl_context, second.default_ssl_context)
+
+    @mock.patch('ssl.SSLContext.load_verify_locations')
+    def test_clear_cache(self, mock_load):
+        first = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', ca_certs='cafilepath')
+        clear_ssl_context_cache()
+        second = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com', ca_certs='cafilepath')
+        self.assertIsNot(first.default_ssl_context, second.default_ssl_context)
+
+    def test_default_context_shared(self):
+        self.assertIs(get_default_ssl_context(), get_default_ssl_context())
+
+
+@mock.patch('socket.create_connection')
+class TestTLSSessionResumption(unittest.TestCase):
+    """ Test that TLS sessions are saved and offered again on reconnect """
+    def make_connection(self, session_cache, session_reused=False):
+        conn = CertValidatingHTTPSConnection('api-fakehost.duosecurity.com',
+                                             session_cache=session_cache)
+        context = mock.Mock(verify_mode=ssl.CERT_NONE)  # noqa: DUO122, testing insecure context
+        context.wrap_socket.return_value = mock.Mock(
+            session=mock.sentinel.new_session,
+            session_reused=session_reused,
+        )
+        conn.default_ssl_context = context
+        return conn
+
+    def test_first_connection_offers_no_session(self, mock_create):
+        cache = TLSSessionCache()
+        conn = self.make_connection(cache)
+        conn.connect()
+        _, kwargs = conn.default_ssl_context.wrap_socket.call_args
+        self.assertIsNone(kwargs['session'])
+        self.assertFalse(conn.session_reused)
+        self.assertIs(
+            cache.get(('api-fakehost.duosecurity.com', 443), conn.default_ssl_context),
+            mock.sentinel.new_session)
+
+    def test_saved_session_offered(self, mock_create):
+        cache = TLSSessionCache()
+        conn = self.make_connection(cache, session_reused=True)
+        cache.set(('api-fakehost.duosecurity.com', 443),
+                  conn.default_ssl_context, mock.sentinel.old_session)
+        conn.connect()
+        _, kwargs = conn.default_ssl_context.wrap_socket.call_args
+        self.assertIs(kwargs['session'], mock.sentinel.old_session)
+        self.assertTrue(conn.session_reused)
+
+    def test_connect_timings_recorded(self, mock_create):
+        conn = self.make_connection(TLSSessionCache())
+        self.assertIsNone(conn.connect_time)
+        self.assertIsNone(conn.tls_time)
+        conn.connect()
+        self.assertGreaterEqual(conn.connect_time, 0)
+        self.assertGreaterEqual(conn.tls_time, 0)
+
+    def test_session_from_other_context_not_offered(self, mock_create):
+        cache = TLSSessionCache()
+        cache.set(('api-fakehost.duosecurity.com', 443),
+                  mock.Mock(), mock.sentinel.old_session)
+        conn = self.make_connection(cache)
+        conn.connect()
+        _, kwargs = conn.default_ssl_context.wrap_socket.call_args
+        self.assertIsNone(kwargs['session'])
+
+    def test_session_saved_on_close(self, mock_create):
+        cache = TLSSessionCache()
+        conn = self.make_connection(cache)
+        conn.connect()
+        conn.sock.session = mock.sentinel.ticket_session
+        conn.close()
+        self.assertIs(
+            cache.get(('api-fakehost.duosecurity.com', 443), conn.default_ssl_context),
+            mock.sentinel.ticket_session)
+
+    def test_no_session_cache(self, mock_create):
+        conn = self.make_connection(None)
+        conn.connect()
+        conn.close()
+        _, kwargs = conn.default_ssl_context.wrap_socket.call_args
+        self.assertIsNone(kwargs['session'])
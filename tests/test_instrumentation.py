@@ -0,0 +1,150 @@
+import unittest
+from unittest import mock
+
+import duo_client.client
+from duo_client.instrumentation import RequestHook, RequestTiming, path_template
+from . import util
+
+
+class RecordingHook(RequestHook):
+    def __init__(self):
+        self.events = []
+
+    def on_request_start(self, timing):
+        self.events.append(('start', timing))
+
+    def on_request_end(self, timing):
+        self.events.append(('end', timing))
+
+    def on_response_parsed(self, timing):
+        self.events.append(('parsed', timing))
+
+
+class MockRateLimitedConnection(util.MockHTTPConnection):
+    """
+    Answers 429 to the first request made on any instance, and 200 after.
+    """
+    requests = [0]
+
+    def request(self, method, uri, body, headers):
+        self.requests[0] += 1
+        if self.requests[0] == 1:
+            (self.status, self.reason) = (429, 'Too Many Requests')
+        else:
+            (self.status, self.reason) = (200, 'OK')
+        super(MockRateLimitedConnection, self).request(
+            method, uri, body, headers)
+
+
+class TestPathTemplate(unittest.TestCase):
+    def test_ids_replaced(self):
+        self.assertEqual(
+            path_template('/admin/v1/users/DU0123456789ABCDEF01/phones'),
+            '/admin/v1/users/{id}/phones')
+        self.assertEqual(
+            path_template('/admin/v1/users/user%40example.com'),
+            '/admin/v1/users/{id}')
+
+    def test_words_and_versions_kept(self):
+        for path in ('/auth/v2/ping', '/admin/v2/logs/authentication',
+                     '/admin/v1/info/authentication_attempts'):
+            self.assertEqual(path_template(path), path)
+
+
+class TestRequestTiming(unittest.TestCase):
+    def test_as_dict(self):
+        timing = RequestTiming('GET', '/admin/v1/users/DU012345')
+        timing.attempts = 3
+        timing.error = ValueError('oops')
+        result = timing.as_dict()
+        self.assertEqual(result['path_template'], '/admin/v1/users/{id}')
+        self.assertEqual(result['retries'], 2)
+        self.assertEqual(result['error'], "ValueError('oops')")
+        self.assertNotIn('start', result)
+
+
+class TestClientHooks(unittest.TestCase):
+    def setUp(self):
+        self.hook = RecordingHook()
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com',
+            request_hooks=[self.hook])
+        self.client._connect = lambda: util.MockHTTPConnection()
+
+    def test_json_api_call(self):
+        self.client.json_api_call('POST', '/admin/v1/users/DU012345', {'a': 'b'})
+        self.assertEqual([event for (event, _) in self.hook.events],
+                         ['start', 'end', 'parsed'])
+        timing = self.hook.events[0][1]
+        self.assertTrue(all(t is timing for (_, t) in self.hook.events))
+        self.assertEqual(timing.method, 'POST')
+        self.assertEqual(timing.path_template, '/admin/v1/users/{id}')
+        self.assertEqual(timing.status, 200)
+        self.assertEqual(timing.attempts, 1)
+        self.assertEqual(timing.retries, 0)
+        self.assertEqual(timing.request_bytes, len('{"a":"b"}'))
+        self.assertGreater(timing.response_bytes, 0)
+        self.assertGreater(timing.sign_time, 0)
+        self.assertIsNotNone(timing.ttfb)
+        self.assertIsNotNone(timing.parse_time)
+        self.assertGreaterEqual(timing.total_time, timing.sign_time)
+        self.assertIsNone(timing.error)
+
+    def test_api_call_not_parsed(self):
+        self.client.api_call('GET', '/auth/v2/ping', {})
+        self.assertEqual([event for (event, _) in self.hook.events],
+                         ['start', 'end'])
+
+    @mock.patch('duo_client.client.sleep')
+    @mock.patch('duo_client.retry.random')
+    def test_retries_and_backoff(self, mock_random, mock_sleep):
+        mock_random.uniform.return_value = 0.25
+        MockRateLimitedConnection.requests[0] = 0
+        self.client._connect = lambda: MockRateLimitedConnection()
+        self.client.json_api_call('GET', '/foo/bar', {})
+        timing = self.hook.events[1][1]
+        self.assertEqual(timing.attempts, 2)
+        self.assertEqual(timing.retries, 1)
+        self.assertEqual(timing.rate_limited, 1)
+        self.assertEqual(timing.backoff_time, 1.25)
+        self.assertEqual(timing.status, 200)
+
+    def test_error(self):
+        class FailingConnection(util.MockHTTPConnection):
+            def request(self, *args):
+                raise ConnectionResetError()
+        self.client._connect = lambda: FailingConnection()
+        with self.assertRaises(ConnectionResetError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual([event for (event, _) in self.hook.events],
+                         ['start', 'end'])
+        timing = self.hook.events[1][1]
+        self.assertIsInstance(timing.error, ConnectionResetError)
+        self.assertIsNone(timing.status)
+
+    def test_parse_error_reported(self):
+        class ErrorConnection(util.MockHTTPConnection):
+            status = 400
+            reason = 'Bad Request'
+        self.client._connect = lambda: ErrorConnection()
+        with self.assertRaises(RuntimeError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual([event for (event, _) in self.hook.events],
+                         ['start', 'end', 'parsed'])
+        self.assertEqual(self.hook.events[2][1].status, 400)
+
+    def test_no_hooks_no_timing(self):
+        self.client.request_hooks = []
+        with mock.patch('duo_client.client.RequestTiming') as timing_class:
+            self.client.json_api_call('GET', '/foo/bar', {})
+        timing_class.assert_not_called()
+
+    def test_add_request_hook(self):
+        other = RecordingHook()
+        self.client.add_request_hook(other)
+        self.client.api_call('GET', '/foo/bar', {})
+        self.assertEqual(len(other.events), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import unittest
+
+import duo_client.client
+from duo_client.json_codec import (
+    JSONCodec,
+    OrjsonCodec,
+    UJSONCodec,
+    get_json_codec,
+    orjson,
+    ujson,
+)
+from . import util
+
+AUTHLOG_PAGE = {
+    'stat': 'OK',
+    'response': {
+        'authlogs': [{
+            'access_device': {'ip': '192.0.2.%d' % i, 'location': {'city': 'Zürich'}},
+            'factor': 'duo_push',
+            'result': 'success',
+            'timestamp': 1700000000 + i,
+            'txid': 'a7b8c9d0-%04d' % i,
+            'user': {'name': 'user€%d' % i, 'groups': []},
+            'score': 0.5,
+            'flag': True,
+            'missing': None,
+        } for i in range(50)],
+        'metadata': {'next_offset': ['1700000049000', 'a7b8c9d0-0049']},
+    },
+}
+
+
+class MockResponse(object):
+    def __init__(self, status=200, reason='OK'):
+        self.status = status
+        self.reason = reason
+
+
+class TestGetJSONCodec(unittest.TestCase):
+    def test_default(self):
+        self.assertIs(type(get_json_codec()), JSONCodec)
+        self.assertIs(type(get_json_codec('json')), JSONCodec)
+
+    def test_instance_returned(self):
+        codec = JSONCodec()
+        self.assertIs(get_json_codec(codec), codec)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_json_codec('yaml')
+
+    def test_auto(self):
+        codec = get_json_codec('auto')
+        if orjson is not None:
+            self.assertEqual(codec.name, 'orjson')
+        elif ujson is not None:
+            self.assertEqual(codec.name, 'ujson')
+        else:
+            self.assertEqual(codec.name, 'json')
+
+    @unittest.skipIf(orjson is not None, 'orjson is installed')
+    def test_missing_orjson(self):
+        with self.assertRaises(RuntimeError):
+            OrjsonCodec()
+
+    @unittest.skipIf(ujson is not None, 'ujson is installed')
+    def test_missing_ujson(self):
+        with self.assertRaises(RuntimeError):
+            UJSONCodec()
+
+
+class TestCodecs(unittest.TestCase):
+    def codecs(self):
+        codecs = [JSONCodec()]
+        if orjson is not None:
+            codecs.append(OrjsonCodec())
+        if ujson is not None:
+            codecs.append(UJSONCodec())
+        return codecs
+
+    def test_loads_bytes_and_str(self):
+        text = json.dumps(AUTHLOG_PAGE)
+        raw = json.dumps(AUTHLOG_PAGE, ensure_ascii=False).encode('utf-8')
+        for codec in self.codecs():
+            self.assertEqual(codec.loads(raw), AUTHLOG_PAGE, codec.name)
+            self.assertEqual(codec.loads(text), AUTHLOG_PAGE, codec.name)
+
+    def test_invalid_raises_value_error(self):
+        for codec in self.codecs():
+            with self.assertRaises(ValueError):
+                codec.loads(b'{"stat": ')
+
+
+class TestClientJSONCodec(unittest.TestCase):
+    def make_client(self, json_codec=None):
+        return duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com', json_codec=json_codec)
+
+    def test_parse_bytes(self):
+        raw = json.dumps(AUTHLOG_PAGE, ensure_ascii=False).encode('utf-8')
+        for codec in ('json', 'auto'):
+            client = self.make_client(codec)
+            (response, metadata) = client.parse_json_response_and_metadata(
+                MockResponse(), raw)
+            self.assertEqual(response, AUTHLOG_PAGE['response'])
+            self.assertEqual(metadata, AUTHLOG_PAGE['response']['metadata'])
+
+    def test_bad_response_data_is_text(self):
+        client = self.make_client()
+        with self.assertRaises(RuntimeError) as ctx:
+            client.parse_json_response(MockResponse(), b'not json')
+        self.assertEqual(ctx.exception.data, 'not json')
+        self.assertIn('not json', str(ctx.exception))
+
+    def test_error_response(self):
+        client = self.make_client()
+        with self.assertRaises(RuntimeError) as ctx:
+            client.parse_json_response(
+                MockResponse(400, 'Bad Request'),
+                b'{"stat": "FAIL", "code": 40002, "message": "Invalid request"}')
+        self.assertEqual(str(ctx.exception), 'Received 400 Invalid request')
+
+    def test_custom_codec_used(self):
+        class CountingCodec(JSONCodec):
+            calls = 0
+
+            def loads(self, data):
+                self.calls += 1
+                return super(CountingCodec, self).loads(data)
+        codec = CountingCodec()
+        client = self.make_client(codec)
+        client._connect = lambda: util.MockHTTPConnection()
+        client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(codec.calls, 1)
+
+    def test_canon_json_unchanged(self):
+        params = {'b': [1, 2.5, None], 'a': {'z': '€', 'y': True}}
+        for codec in ('json', 'auto'):
+            client = self.make_client(codec)
+            (_, body, _) = client._prepare_request('POST', '/foo', params)
+            self.assertEqual(
+                body, json.dumps(params, sort_keys=True, separators=(',', ':')))
+
+
+if __name__ == '__main__':
+    unittest.main()
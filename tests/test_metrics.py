@@ -0,0 +1,101 @@
+import threading
+import unittest
+
+import duo_client.client
+from duo_client.instrumentation import RequestTiming
+from duo_client.metrics import ClientMetrics
+from . import util
+
+
+def make_timing(status=200, total_time=0.2, **kwargs):
+    timing = RequestTiming('GET', '/admin/v1/users/DU012345', 'api-x.duosecurity.com')
+    timing.status = status
+    timing.attempts = 1
+    timing.total_time = total_time
+    for (k, v) in kwargs.items():
+        setattr(timing, k, v)
+    return timing
+
+
+class TestClientMetrics(unittest.TestCase):
+    LABELS = 'host="api-x.duosecurity.com",method="GET",endpoint="/admin/v1/users/{id}"'
+
+    def setUp(self):
+        self.metrics = ClientMetrics(latency_buckets=(0.1, 1.0))
+
+    def test_render(self):
+        self.metrics.on_request_end(make_timing(
+            request_bytes=10, response_bytes=100))
+        self.metrics.on_request_end(make_timing(
+            status=429, total_time=3.5, attempts=3, rate_limited=3,
+            backoff_time=3.0))
+        lines = self.metrics.render().splitlines()
+        for expected in [
+                '# TYPE duo_client_requests_total counter',
+                'duo_client_requests_total{%s,status="200"} 1' % self.LABELS,
+                'duo_client_requests_total{%s,status="429"} 1' % self.LABELS,
+                'duo_client_request_errors_total{%s} 1' % self.LABELS,
+                'duo_client_rate_limited_total{%s} 3' % self.LABELS,
+                'duo_client_retries_total{%s} 2' % self.LABELS,
+                'duo_client_backoff_seconds_total{%s} 3.0' % self.LABELS,
+                'duo_client_request_bytes_total{%s} 10' % self.LABELS,
+                'duo_client_response_bytes_total{%s} 100' % self.LABELS,
+                '# TYPE duo_client_request_duration_seconds histogram',
+                'duo_client_request_duration_seconds_bucket{%s,le="0.1"} 0' % self.LABELS,
+                'duo_client_request_duration_seconds_bucket{%s,le="1.0"} 1' % self.LABELS,
+                'duo_client_request_duration_seconds_bucket{%s,le="+Inf"} 2' % self.LABELS,
+                'duo_client_request_duration_seconds_sum{%s} 3.7' % self.LABELS,
+                'duo_client_request_duration_seconds_count{%s} 2' % self.LABELS,
+        ]:
+            self.assertIn(expected, lines)
+
+    def test_error_without_status(self):
+        self.metrics.on_request_end(make_timing(
+            status=None, error=ConnectionResetError()))
+        output = self.metrics.render()
+        self.assertIn(
+            'duo_client_requests_total{%s,status="error"} 1' % self.LABELS,
+            output)
+        self.assertIn(
+            'duo_client_request_errors_total{%s} 1' % self.LABELS, output)
+
+    def test_label_escaping(self):
+        timing = make_timing()
+        timing.host = 'a"b\\c\nd'
+        self.metrics.on_request_end(timing)
+        self.assertIn('host="a\\"b\\\\c\\nd"', self.metrics.render())
+
+    def test_prefix_and_clear(self):
+        metrics = ClientMetrics(prefix='myapp_duo')
+        metrics.on_request_end(make_timing())
+        self.assertIn('myapp_duo_requests_total{', metrics.render())
+        metrics.clear()
+        self.assertNotIn('myapp_duo_requests_total{', metrics.render())
+
+    def test_threads(self):
+        def worker():
+            for _ in range(100):
+                self.metrics.on_request_end(make_timing())
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(
+            'duo_client_requests_total{%s,status="200"} 400' % self.LABELS,
+            self.metrics.render())
+
+    def test_client_integration(self):
+        client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com',
+            request_hooks=[self.metrics])
+        client._connect = lambda: util.MockHTTPConnection()
+        client.json_api_call('GET', '/admin/v1/users/DU012345', {})
+        self.assertIn(
+            'duo_client_requests_total{host="example.com",method="GET",'
+            'endpoint="/admin/v1/users/{id}",status="200"} 1',
+            self.metrics.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
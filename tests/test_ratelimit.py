@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import duo_client.client
+from duo_client.ratelimit import FileTokenBucket, TokenBucket, fcntl
+from . import util
+
+
+class TestTokenBucket(unittest.TestCase):
+    @mock.patch('duo_client.ratelimit.time.monotonic')
+    def test_burst_then_rate(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.take(), 0.5)
+        mock_monotonic.return_value = 100.5
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0.5)
+
+    @mock.patch('duo_client.ratelimit.time.monotonic')
+    def test_refill_capped_at_burst(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        bucket = TokenBucket(rate=10, burst=2)
+        mock_monotonic.return_value = 60
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0.1])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=1, burst=0)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=1, burst=1).take(2)
+
+    def test_default_burst(self):
+        self.assertEqual(TokenBucket(rate=5).burst, 5)
+        self.assertEqual(TokenBucket(rate=0.5).burst, 1)
+
+    @mock.patch('duo_client.ratelimit.time.sleep')
+    @mock.patch('duo_client.ratelimit.time.monotonic')
+    def test_acquire_sleeps(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 0
+
+        def sleep(secs):
+            mock_monotonic.return_value += secs
+        mock_sleep.side_effect = sleep
+        bucket = TokenBucket(rate=4, burst=1)
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        mock_sleep.assert_called_once_with(0.25)
+
+    @mock.patch('duo_client.ratelimit.time.monotonic')
+    def test_acquire_timeout(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.take()
+        self.assertFalse(bucket.acquire(timeout=0.5))
+
+    def test_threads_share_bucket(self):
+        bucket = TokenBucket(rate=0.001, burst=50)
+        taken = []
+
+        def worker():
+            for _ in range(20):
+                if not bucket.take():
+                    taken.append(1)
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(taken), 50)
+
+
+@unittest.skipIf(fcntl is None, 'requires fcntl')
+class TestFileTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'bucket')
+
+    @mock.patch('duo_client.ratelimit.time.time')
+    def test_buckets_share_state(self, mock_time):
+        mock_time.return_value = 1000
+        first = FileTokenBucket(self.path, rate=1, burst=2)
+        second = FileTokenBucket(self.path, rate=1, burst=2)
+        self.assertEqual(first.take(), 0)
+        self.assertEqual(second.take(), 0)
+        self.assertEqual(first.take(), 1)
+        mock_time.return_value = 1001
+        self.assertEqual(second.take(), 0)
+        self.assertEqual(first.take(), 1)
+
+    def test_processes_share_state(self):
+        bucket = FileTokenBucket(self.path, rate=0.001, burst=10)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for _ in range(5):
+                    bucket.take()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(
+            [bucket.take() == 0 for _ in range(6)], [True] * 5 + [False])
+
+
+class TestClientRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.bucket = mock.Mock()
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com',
+            rate_limiter=self.bucket)
+        self.client._connect = lambda: util.MockHTTPConnection()
+
+    @mock.patch('duo_client.client.sleep')
+    def test_request_takes_token(self, mock_sleep):
+        self.bucket.take.return_value = 0
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.bucket.take.assert_called_once_with()
+        mock_sleep.assert_not_called()
+
+    @mock.patch('duo_client.client.sleep')
+    def test_request_waits_and_is_resigned(self, mock_sleep):
+        self.bucket.take.side_effect = [0.5, 0]
+        dates = ['Tue, 04 Jul 2017 14:12:00 -0000',
+                 'Tue, 04 Jul 2017 14:12:01 -0000']
+        with mock.patch.object(self.client.get_signer(), 'date',
+                               side_effect=dates):
+            response = self.client.json_api_call('GET', '/foo/bar', {})
+        mock_sleep.assert_called_once_with(0.5)
+        self.assertEqual(response['headers']['Date'], dates[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
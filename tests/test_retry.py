@@ -0,0 +1,221 @@
+import email.utils
+import http.client
+import unittest
+from unittest import mock
+
+import duo_client.client
+from duo_client.retry import (
+    RetryPolicy,
+    parse_rate_limit_reset,
+    parse_retry_after,
+)
+
+
+class MockResponse(object):
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+class MockRetryConnection(object):
+    """
+    Mock connection that plays back a list of outcomes, one per request.
+    Each outcome is either an exception to raise or a (status, headers)
+    response.
+    """
+    will_close = False
+    reason = 'Error'
+
+    def __init__(self, outcomes, sent):
+        self.outcomes = outcomes
+        self.sent = sent
+
+    def request(self, method, uri, body, headers):
+        self.sent.append(dict(headers))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        (self.status, self.headers) = outcome
+
+    def getresponse(self):
+        return self
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self):
+        if self.status == 200:
+            return b'{"stat": "OK", "response": {}}'
+        return b'{"stat": "FAIL", "code": 50000, "message": "error"}'
+
+    def close(self):
+        pass
+
+
+class TestParseHeaders(unittest.TestCase):
+    def test_retry_after_seconds(self):
+        self.assertEqual(parse_retry_after('7'), 7.0)
+        self.assertEqual(parse_retry_after(' 1.5 '), 1.5)
+        self.assertEqual(parse_retry_after('-3'), 0.0)
+
+    def test_retry_after_date(self):
+        now = 1500000000
+        value = email.utils.formatdate(now + 30, usegmt=True)
+        self.assertEqual(parse_retry_after(value, now=now), 30.0)
+        value = email.utils.formatdate(now - 30, usegmt=True)
+        self.assertEqual(parse_retry_after(value, now=now), 0.0)
+
+    def test_retry_after_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+    def test_rate_limit_reset(self):
+        self.assertEqual(parse_rate_limit_reset('12'), 12.0)
+        self.assertEqual(
+            parse_rate_limit_reset('1500000020', now=1500000000), 20.0)
+        self.assertIsNone(parse_rate_limit_reset('later'))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    @mock.patch('duo_client.retry.random')
+    def test_default_backoff(self, mock_random):
+        mock_random.uniform.return_value = 0.5
+        policy = RetryPolicy()
+        response = MockResponse(429)
+        delays = [policy.get_delay('GET', attempt, 0, response=response)
+                  for attempt in range(1, 8)]
+        self.assertEqual(delays, [1.5, 2.5, 4.5, 8.5, 16.5, 32.5, None])
+
+    def test_retry_after_honored(self):
+        policy = RetryPolicy()
+        response = MockResponse(429, {'Retry-After': '3'})
+        self.assertEqual(policy.get_delay('POST', 1, 0, response=response), 3.0)
+        response = MockResponse(429, {'X-RateLimit-Reset': '4'})
+        self.assertEqual(policy.get_delay('POST', 1, 0, response=response), 4.0)
+
+    def test_retry_after_capped(self):
+        response = MockResponse(429, {'Retry-After': '86400'})
+        self.assertEqual(
+            RetryPolicy().get_delay('GET', 1, 0, response=response), 32)
+        policy = RetryPolicy(max_retry_after=120)
+        self.assertEqual(policy.get_delay('GET', 1, 0, response=response), 120)
+        client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com')
+        self.assertEqual(client.get_retry_policy().get_delay(
+            'GET', 1, 0, response=response), 32)
+
+    def test_retry_after_ignored(self):
+        policy = RetryPolicy(respect_retry_after=False, jitter=0)
+        response = MockResponse(429, {'Retry-After': '30'})
+        self.assertEqual(policy.get_delay('GET', 1, 0, response=response), 1)
+
+    def test_success_not_retried(self):
+        policy = RetryPolicy(retry_server_errors=True)
+        self.assertIsNone(
+            policy.get_delay('GET', 1, 0, response=MockResponse(200)))
+
+    def test_server_errors_idempotent_only(self):
+        response = MockResponse(503)
+        self.assertIsNone(RetryPolicy().get_delay('GET', 1, 0, response=response))
+        policy = RetryPolicy(retry_server_errors=True)
+        self.assertIsNotNone(policy.get_delay('GET', 1, 0, response=response))
+        self.assertIsNone(policy.get_delay('POST', 1, 0, response=response))
+
+    def test_connection_errors_idempotent_only(self):
+        error = ConnectionResetError()
+        self.assertIsNone(RetryPolicy().get_delay('GET', 1, 0, error=error))
+        policy = RetryPolicy(retry_connection_errors=True)
+        self.assertIsNotNone(policy.get_delay('GET', 1, 0, error=error))
+        self.assertIsNone(policy.get_delay('DELETE', 1, 0, error=error))
+        self.assertIsNone(policy.get_delay('GET', 1, 0, error=ValueError()))
+
+    def test_deadline(self):
+        policy = RetryPolicy(deadline=10, jitter=0)
+        response = MockResponse(429)
+        self.assertEqual(policy.get_delay('GET', 1, 5, response=response), 1)
+        self.assertIsNone(policy.get_delay('GET', 1, 9.5, response=response))
+        response = MockResponse(429, {'Retry-After': '60'})
+        self.assertIsNone(policy.get_delay('GET', 1, 0, response=response))
+
+
+class TestClientRetry(unittest.TestCase):
+    def setUp(self):
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_akey', 'example.com')
+        self.sent = []
+        self.outcomes = []
+        self.connections = 0
+
+        def connect():
+            self.connections += 1
+            return MockRetryConnection(self.outcomes, self.sent)
+        self.client._connect = connect
+
+    @mock.patch('duo_client.client.sleep')
+    def test_retry_after_used_for_sleep(self, mock_sleep):
+        self.outcomes.extend([(429, {'Retry-After': '5'}), (200, {})])
+        self.client.json_api_call('POST', '/foo/bar', {})
+        mock_sleep.assert_called_once_with(5.0)
+        self.assertEqual(len(self.sent), 2)
+
+    @mock.patch('duo_client.client.sleep')
+    def test_retries_are_resigned(self, mock_sleep):
+        self.outcomes.extend([(429, {'Retry-After': '0'}), (200, {})])
+        dates = ['Tue, 04 Jul 2017 14:12:00 -0000',
+                 'Tue, 04 Jul 2017 14:12:01 -0000']
+        with mock.patch.object(self.client.get_signer(), 'date',
+                               side_effect=dates):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual([sent[b'Date'] for sent in self.sent],
+                         [date.encode('ascii') for date in dates])
+        self.assertNotEqual(self.sent[0][b'Authorization'],
+                            self.sent[1][b'Authorization'])
+
+    @mock.patch('duo_client.client.sleep')
+    def test_server_error_retried(self, mock_sleep):
+        self.client.retry_policy = RetryPolicy(retry_server_errors=True)
+        self.outcomes.extend([(503, {}), (502, {}), (200, {})])
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @mock.patch('duo_client.client.sleep')
+    def test_server_error_not_retried_by_default(self, mock_sleep):
+        self.outcomes.append((503, {}))
+        with self.assertRaises(RuntimeError):
+            self.client.json_api_call('GET', '/foo/bar', {})
+        mock_sleep.assert_not_called()
+
+    @mock.patch('duo_client.client.sleep')
+    def test_connection_error_reconnects(self, mock_sleep):
+        self.client.retry_policy = RetryPolicy(retry_connection_errors=True)
+        self.outcomes.extend([ConnectionResetError(), (200, {})])
+        self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(self.connections, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    @mock.patch('duo_client.client.sleep')
+    def test_connection_error_raised_when_not_retryable(self, mock_sleep):
+        self.client.retry_policy = RetryPolicy(retry_connection_errors=True)
+        self.outcomes.append(http.client.RemoteDisconnected('closed'))
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.client.json_api_call('POST', '/foo/bar', {})
+        mock_sleep.assert_not_called()
+
+    @mock.patch('duo_client.client.sleep')
+    @mock.patch('duo_client.client.time.monotonic')
+    def test_deadline_stops_retries(self, mock_monotonic, mock_sleep):
+        self.client.retry_policy = RetryPolicy(deadline=10, jitter=0)
+        mock_monotonic.side_effect = [0, 1, 12]
+        self.outcomes.extend([(429, {}), (429, {}), (200, {})])
+        with self.assertRaises(RuntimeError) as ctx:
+            self.client.json_api_call('GET', '/foo/bar', {})
+        self.assertEqual(ctx.exception.status, 429)
+        self.assertEqual(len(self.sent), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
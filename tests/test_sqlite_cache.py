@@ -0,0 +1,107 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from duo_client.cache import MISS
+from duo_client.sqlite_cache import SQLiteCache, main
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'cache.db')
+        self.store = SQLiteCache(self.path)
+        self.addCleanup(self.store.close)
+
+    def test_put_get(self):
+        self.assertIs(self.store.get('ns', 'k'), MISS)
+        self.store.put('ns', 'k', {'a': [1, 2]})
+        self.assertEqual(self.store.get('ns', 'k'), {'a': [1, 2]})
+        self.assertIs(self.store.get('other', 'k'), MISS)
+        self.store.put('ns', 'k', None)
+        self.assertIsNone(self.store.get('ns', 'k'))
+
+    @mock.patch('duo_client.sqlite_cache.time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 1000
+        self.store.put('ns', 'short', 1, ttl=10)
+        self.store.put('ns', 'forever', 2)
+        self.assertEqual(self.store.get_entry('ns', 'short'), (1, 1000, 1010))
+        mock_time.return_value = 1010
+        self.assertIs(self.store.get('ns', 'short'), MISS)
+        self.assertEqual(self.store.get_entry('ns', 'forever'),
+                         (2, 1000, None))
+        self.assertEqual(self.store.stats()['expired'], 1)
+        self.assertEqual(self.store.compact(), 1)
+        self.assertEqual(self.store.stats()['entries'], 1)
+
+    def test_delete(self):
+        for key in ('a', 'b'):
+            self.store.put('ns', key, key)
+        self.store.put('other', 'a', 'a')
+        self.store.delete('ns', 'a')
+        self.assertIs(self.store.get('ns', 'a'), MISS)
+        self.assertEqual(self.store.get('ns', 'b'), 'b')
+        self.store.delete('ns')
+        self.assertIs(self.store.get('ns', 'b'), MISS)
+        self.assertEqual(self.store.get('other', 'a'), 'a')
+        self.store.clear()
+        self.assertEqual(self.store.stats()['entries'], 0)
+
+    def test_shared_between_connections(self):
+        other = SQLiteCache(self.path)
+        self.addCleanup(other.close)
+        self.store.put('ns', 'k', 'v')
+        self.assertEqual(other.get('ns', 'k'), 'v')
+        (journal_mode,) = other._connection().execute(
+            'PRAGMA journal_mode').fetchone()
+        self.assertEqual(journal_mode, 'wal')
+
+    def test_threads(self):
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    self.store.put('ns', '%d-%d' % (n, i), i)
+                    self.assertEqual(self.store.get('ns', '%d-%d' % (n, i)), i)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.store.stats()['entries'], 200)
+
+    def test_dead_thread_connections_closed(self):
+        for i in range(10):
+            thread = threading.Thread(
+                target=self.store.put, args=('ns', str(i), i))
+            thread.start()
+            thread.join()
+        # The main thread's, and the last thread's until another opens.
+        self.assertEqual(len(self.store._connections), 2)
+        self.assertEqual(self.store.stats()['entries'], 10)
+
+    def test_main(self):
+        self.store.put('ns', 'k', 'v', ttl=-1)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(main(['stats', self.path]), 0)
+            self.assertEqual(main(['compact', self.path]), 0)
+        self.assertIn('expired: 1', out.getvalue())
+        self.assertIn('Deleted 1 expired entries', out.getvalue())
+        self.assertEqual(self.store.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import json
 import collections
+import threading
 import urllib.parse
 
 from json import JSONEncoder
@@ -42,6 +43,9 @@ class MockHTTPConnection(object):
 
     _connect = _disconnect = close = getresponse = dummy
 
+    def getheader(self, name, default=None):
+        return default
+
     def read(self):
         response = self.__dict__
 
@@ -163,3 +167,64 @@ class MockMultipleRequestHTTPConnection(MockHTTPConnection):
         self.status = next(self.status_iterator)
         super(MockMultipleRequestHTTPConnection, self).request(
             method, uri, body, headers)
+
+
+class MockAuthlogServer(object):
+    """
+    Serves v2 authentication logs from events, dicts with a txid and a
+    timestamp in seconds, as the Admin API does: filtered by mintime and
+    maxtime in ms, and paged by limit and a [timestamp in ms, txid]
+    next_offset.
+
+    Set a client's _connect to connect. The params of each request are
+    kept in requests, and its uri in uris. A request with mintime equal
+    to fail_mintime is answered with a 500.
+    """
+
+    def __init__(self, events=()):
+        self.events = list(events)
+        self.requests = []
+        self.uris = []
+        self.fail_mintime = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        return MockAuthlogConnection(self)
+
+    def respond(self, conn):
+        params = params_to_dict(conn.uri.split('?')[1])
+        with self.lock:
+            self.uris.append(conn.uri)
+            self.requests.append(params)
+        mintime = int(params['mintime'][0])
+        if mintime == self.fail_mintime:
+            conn.status = 500
+            conn.reason = 'Internal Server Error'
+            return json.dumps({'stat': 'FAIL', 'code': 50000,
+                               'message': 'oops'})
+        maxtime = int(params['maxtime'][0])
+        window = [e for e in self.events
+                  if mintime <= e['timestamp'] * 1000 <= maxtime]
+        if params.get('sort') != ['ts:asc']:
+            window.reverse()
+        start = 0
+        if 'next_offset' in params:
+            (_, txid) = params['next_offset'][0].split(',')
+            start = [e['txid'] for e in window].index(txid) + 1
+        limit = int(params['limit'][0])
+        page = [dict(e) for e in window[start:start + limit]]
+        metadata = {'total_objects': len(window)}
+        if start + limit < len(window):
+            metadata['next_offset'] = [
+                str(page[-1]['timestamp'] * 1000), page[-1]['txid']]
+        return json.dumps({'stat': 'OK', 'response': {
+            'authlogs': page, 'metadata': metadata}})
+
+
+class MockAuthlogConnection(MockHTTPConnection):
+    def __init__(self, server):
+        super(MockAuthlogConnection, self).__init__()
+        self.server = server
+
+    def read(self):
+        return self.server.respond(self)